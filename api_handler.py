@@ -1,103 +1,606 @@
-import requests
-import io
-import os
 import json
-import base64
-from dotenv import load_dotenv
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import get_settings
+from encoded_image import EncodedImage
+from strategy_registry import default_registry
+from prediction_cache import PredictionCache, image_digest
+from singleflight import default_coalescer
+import metrics
+from metrics import debug
+from resilience import RetryPolicy, get_breaker, is_transient_status, parse_retry_after
+from lazy_import import lazy_import
+from history_store import EXACT_CACHE, NEAR_DUPLICATE, UPSTREAM
+
+# Loaded on first use: preprocessing-only callers never pay for the HTTP stack
+requests = lazy_import("requests")
+asyncio = lazy_import("asyncio")
+
+# Default Hugging Face Inference API endpoint
+DEFAULT_API_BASE_URL = "https://api-inference.huggingface.co/models"
+
+# Process-wide pooled sessions, shared by every APIHandler with the same pool
+# settings so connections survive Streamlit reruns and are reused across threads
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+
+def get_session(pool_connections=10, pool_maxsize=10, keep_alive=True):
+    """
+    Get a shared, connection-pooled HTTP session
+    
+    Args:
+        pool_connections (int): Number of per-host connection pools to cache
+        pool_maxsize (int): Maximum number of open connections kept per host
+        keep_alive (bool): Keep connections open between requests
+    
+    Returns:
+        requests.Session: Session shared by all callers with the same settings
+    """
+    key = (pool_connections, pool_maxsize, keep_alive)
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(key)
+        if session is None:
+            session = requests.Session()
+            # pool_block caps the number of connections per host at pool_maxsize;
+            # extra threads wait for a free connection instead of opening new ones
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+                pool_block=True
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Connection"] = "keep-alive" if keep_alive else "close"
+            _SESSIONS[key] = session
+        return session
+
+
+def close_sessions():
+    """Close all shared sessions and drop their pooled connections"""
+    with _SESSIONS_LOCK:
+        for session in _SESSIONS.values():
+            session.close()
+        _SESSIONS.clear()
+
+
+def parse_response(status_code, headers, text):
+    """
+    Validate an inference API response and turn it into results or an error
+    
+    Shared by the blocking and asyncio clients.
+    
+    Args:
+        status_code (int): HTTP status code
+        headers (Mapping): Response headers
+        text (str): Response body
+    
+    Returns:
+        list or dict: Validated [{"label", "score"}] results or an error dict
+    """
+    # Check for successful response
+    if status_code != 200:
+        try:
+            error_detail = json.loads(text)
+        except json.JSONDecodeError:
+            error_detail = text[:200] + "..." if len(text) > 200 else text
+        # Tell temporary failures (cold start, rate limit) apart from rejected requests
+        return {
+            "error": f"API Error: {error_detail}",
+            "status_code": status_code,
+            "transient": is_transient_status(status_code),
+            "retry_after": parse_retry_after(headers, error_detail)
+        }
+    
+    # Parse and return results
+    try:
+        results = json.loads(text)
+        
+        # Verify the results have the expected format
+        if not isinstance(results, list) and isinstance(results, dict):
+            # Some models return a dict with prediction info
+            if "error" in results:
+                return {"error": f"API Error: {results['error']}"}
+            # Try to convert to compatible format
+            return [results]
+        elif not isinstance(results, list):
+            return {"error": f"Unexpected API response format: {results}"}
+        
+        # Validate each item in the results
+        validated_results = []
+        for item in results:
+            if isinstance(item, dict) and "label" in item and item["label"] is not None:
+                validated_results.append(item)
+            else:
+                debug(f"Skipping invalid result item: {item}")
+        
+        if not validated_results:
+            return {"error": "API returned no valid classification results"}
+        
+        return validated_results
+    
+    except json.JSONDecodeError:
+        return {"error": f"Failed to parse API response: {text[:100]}..."}
+
 
 class APIHandler:
     """
     Class for handling API requests to image classification services
     """
     
-    def __init__(self, model_id="microsoft/resnet-50", api_token=None):
+    # Upload strategies in their default probing order
+    STRATEGIES = {
+        "binary": "_try_binary_upload",
+        "base64": "_try_base64_upload",
+        "simple_base64": "_try_simple_base64",
+        "form": "_try_form_upload"
+    }
+    
+    def __init__(self, model_id="microsoft/resnet-50", api_token=None,
+                 api_base_url=DEFAULT_API_BASE_URL, pool_connections=10, pool_maxsize=10,
+                 connect_timeout=5.0, read_timeout=60.0, keep_alive=True, session=None,
+                 image_format="JPEG", quality=75, subsampling=None, strategy_registry=None,
+                 cache=None, backend=None, retry_policy=None, circuit_breaker=None,
+                 coalesce=True, coalescer=None, near_duplicates=None, history=None):
         """
         Initialize the API handler
         
         Args:
             model_id (str): The Hugging Face model ID to use
             api_token (str): Hugging Face API token, if provided directly
+            api_base_url (str): Base URL of the inference API
+            pool_connections (int): Number of per-host connection pools to cache
+            pool_maxsize (int): Maximum number of pooled connections per host
+            connect_timeout (float): Seconds to wait for a connection to open
+            read_timeout (float): Seconds to wait for the server to respond
+            keep_alive (bool): Reuse connections between requests
+            session (requests.Session): Custom session to use instead of the shared pool
+            image_format (str): Payload encoding (JPEG, PNG or WEBP)
+            quality (int): Encoder quality for JPEG and WebP payloads (1-100)
+            subsampling (int): JPEG chroma subsampling (0=4:4:4, 1=4:2:2, 2=4:2:0, None=encoder default)
+            strategy_registry (StrategyRegistry): Per-model record of working upload strategies
+            cache (PredictionCache): Cache of successful results, None to disable caching
+            backend: Inference backend with classify_image(image) and is_configured()
+                methods (e.g. LocalBackend); None sends requests to the remote API
+            retry_policy (RetryPolicy): Backoff used for transient failures
+            circuit_breaker (CircuitBreaker): Breaker guarding the model, shared per model by default
+            coalesce (bool): Share one upstream request between concurrent identical calls
+            coalescer (SingleFlight): Coalescer to use instead of the process-wide one
+            near_duplicates (NearDuplicateCache): Reuses predictions of perceptually
+                near-identical images, None to only reuse exact matches
+            history (HistoryStore): Records every successful prediction, None to keep no history
         """
-        # Load environment variables
-        load_dotenv('env.example')
-        
-        # Get API token from parameter, environment variable, or default token
-        self.api_token = api_token or os.getenv("HUGGINGFACE_API_TOKEN") or ""
+        # Get API token from parameter, or the settings loaded once per process
+        self.api_token = api_token or get_settings().api_token or ""
         
         # Set the API URL based on the model ID
-        self.api_url = f"https://api-inference.huggingface.co/models/{model_id}"
-        print(f"API URL: {self.api_url}")
-        print(f"Using token: {self.api_token[:5]}...{self.api_token[-4:]}" if len(self.api_token) > 10 else "Token too short or empty")
+        self.model_id = model_id
+        self.api_url = f"{api_base_url.rstrip('/')}/{model_id}"
+        
+        # Pooled keep-alive session and (connect, read) timeouts for all requests
+        self.session = session or self._default_session(pool_connections, pool_maxsize, keep_alive)
+        self.timeout = (connect_timeout, read_timeout)
+        
+        # Payload encoding settings, trading upload size against accuracy
+        self.image_format = image_format.upper()
+        self.quality = quality
+        self.subsampling = subsampling
+        
+        # Remembers which upload strategy each model accepts
+        self.strategy_registry = strategy_registry or default_registry
+        
+        # Optional content-addressed cache of successful predictions
+        self.cache = cache
+        
+        # Optional in-process backend replacing the remote API
+        self.backend = backend
+        
+        # Retries for transient failures and a per-model circuit breaker
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker or get_breaker(model_id)
+        
+        # Deduplicates concurrent classifications of the same image
+        self.coalescer = (coalescer or default_coalescer) if coalesce else None
+        
+        # Optional perceptual-hash index of earlier predictions
+        self.near_duplicates = near_duplicates
+        
+        # Optional persistent log of predictions
+        self.history = history
+        debug(f"API URL: {self.api_url}")
+    
+    @staticmethod
+    def _default_session(pool_connections, pool_maxsize, keep_alive):
+        """Session used when none is passed in: the shared pool for these settings"""
+        return get_session(pool_connections, pool_maxsize, keep_alive)
+    
+    def encode(self, image):
+        """
+        Encode an image once with this handler's payload settings
+        
+        Args:
+            image (PIL.Image or EncodedImage): The preprocessed image
+        
+        Returns:
+            EncodedImage: Payload shared by every upload strategy
+        """
+        if isinstance(image, EncodedImage):
+            return image
+        with metrics.span("encode", model=self.model_id, format=self.image_format):
+            return EncodedImage.from_image(
+                image,
+                image_format=self.image_format,
+                quality=self.quality,
+                subsampling=self.subsampling
+            )
     
     def classify_image(self, image):
         """
         Send an image to the Hugging Face API for classification
         
         Args:
-            image (PIL.Image): The preprocessed image to classify
-            
+            image (PIL.Image or EncodedImage): The preprocessed image to classify
+        
+        Returns:
+            dict: Classification results or error message
+        """
+        flow = self._classify_flow(image, self._classify_uncached)
+        try:
+            key, request = next(flow)
+            # Identical requests already in flight share one upstream call
+            if self.coalescer is not None:
+                flow.send(self.coalescer.do(key, request))
+            else:
+                flow.send(request())
+        except StopIteration as done:
+            return done.value
+    
+    async def classify_image_async(self, image):
+        """
+        Classify an image from a running event loop
+        
+        The blocking request runs in the loop's default executor; concurrent
+        identical calls from threads and coroutines share one upstream request.
+        
+        Args:
+            image (PIL.Image or EncodedImage): The preprocessed image to classify
+        
         Returns:
             dict: Classification results or error message
         """
+        loop = asyncio.get_running_loop()
+        
+        def request(image, key):
+            return loop.run_in_executor(None, self._classify_uncached, image, key)
+        
+        return await self._classify_flow_async(image, request)
+    
+    async def _classify_flow_async(self, image, request):
+        """Run _classify_flow() from an event loop; request returns an awaitable"""
+        flow = self._classify_flow(image, request)
+        try:
+            key, request = next(flow)
+            if self.coalescer is not None:
+                flow.send(await self.coalescer.do_async(key, request))
+            else:
+                flow.send(await request())
+        except StopIteration as done:
+            return done.value
+    
+    def _classify_flow(self, image, request):
+        """
+        Answer from the caches or ask upstream, and record where the result came from
+        
+        Generator shared by the blocking and asyncio clients: when the caches
+        cannot answer it yields (coalesce_key, call), where call() runs
+        request(image, key) and the caller coalesces it on coalesce_key; it
+        then receives the upstream result and finally returns the result for
+        the caller.
+        
+        Args:
+            image (PIL.Image or EncodedImage): The preprocessed image to classify
+            request (callable): request(image, key) classifies the image upstream
+                and caches the result; blocking or returning an awaitable
+        """
         # Check if token is configured
         if not self.is_configured():
             return {"error": "API token is not configured correctly"}
-            
-        # First, try with direct binary data (standard approach)
-        result = self._try_binary_upload(image)
-        if "error" not in result:
-            return result
-            
-        # If binary upload fails, try with base64 encoding
-        print("Binary upload failed, trying base64 encoding...")
-        result = self._try_base64_upload(image)
-        if "error" not in result:
-            return result
-            
-        # If base64 encoding fails, try simple base64
-        print("Base64 upload failed, trying simple base64...")
-        result = self._try_simple_base64(image)
-        if "error" not in result:
-            return result
-            
-        # If base64 encoding fails, try form upload
-        print("Simple base64 upload failed, trying form upload...")
-        result = self._try_form_upload(image)
+        started = time.perf_counter()
+        
+        # Serve repeated images from the cache; the digest is hashed once and
+        # shared by the cache key and the history record
+        digest = key = None
+        if self.cache is not None or self.coalescer is not None or self.history is not None:
+            digest = image_digest(image)
+            key = self.cache_key(image, digest)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self._record_history(digest, cached, EXACT_CACHE, started)
+                return cached
+        
+        # Recompressed or slightly cropped copies of earlier images
+        fingerprint, reused = self._find_near_duplicate(image)
+        if reused is not None:
+            self._record_history(digest, reused, NEAR_DUPLICATE, started)
+            return reused
+        looked_up = time.perf_counter()
+        
+        coalesce_key = self.coalesce_key(key) if self.coalescer is not None else None
+        result = yield coalesce_key, lambda: request(image, key)
+        self._remember_near_duplicate(fingerprint, result)
+        self._record_history(digest, result, UPSTREAM, started, looked_up)
+        return result
+    
+    def _find_near_duplicate(self, image):
+        """
+        Look for the prediction of a near-identical image
+        
+        Returns:
+            tuple: (fingerprint, stored prediction or None); both None when
+                near-duplicate reuse is disabled or the image cannot be hashed
+        """
+        if self.near_duplicates is None:
+            return None, None
+        try:
+            fingerprint = self.near_duplicates.fingerprint(image)
+        except Exception as e:
+            debug(f"Could not fingerprint image: {str(e)}")
+            return None, None
+        return fingerprint, self.near_duplicates.get(self.model_id, fingerprint)
+    
+    def _remember_near_duplicate(self, fingerprint, result):
+        """Store a successful prediction under the image's fingerprint"""
+        if fingerprint is not None and isinstance(result, list):
+            self.near_duplicates.put(self.model_id, fingerprint, result)
+    
+    def _record_history(self, digest, result, source, started, looked_up=None):
+        """
+        Queue a successful prediction for the history store
+        
+        Args:
+            digest (str): image_digest() of the classified image
+            result: Result returned to the caller; only lists are recorded
+            source (int): UPSTREAM, EXACT_CACHE or NEAR_DUPLICATE
+            started (float): perf_counter() at the start of classify_image
+            looked_up (float): perf_counter() after the cache lookups, None if they answered
+        """
+        if self.history is None or not isinstance(result, list):
+            return
+        now = time.perf_counter()
+        timings = {"lookup": (looked_up or now) - started, "total": now - started}
+        if looked_up is not None:
+            timings["classify"] = now - looked_up
+        try:
+            self.history.record(digest, self.model_id, result, timings=timings, source=source)
+        except Exception as e:
+            debug(f"Could not record prediction history: {str(e)}")
+    
+    def _classify_uncached(self, image, key=None):
+        """Classify with the backend or the remote API and cache a successful result"""
+        with metrics.span("classify", model=self.model_id):
+            result = self._classify_upstream(image)
+        if self.cache is not None and key is not None:
+            self.cache.put(key, result)
         return result
     
-    def _try_binary_upload(self, image):
+    def _classify_upstream(self, image):
+        """Run one classification on the backend or the remote API"""
+        if self.backend is not None:
+            result = self.backend.classify_image(image)
+        else:
+            # Encode once and reuse the same bytes for every upload strategy
+            try:
+                payload = self.encode(image)
+            except Exception as e:
+                return {"error": f"Image encoding failed: {str(e)}"}
+            result = self._classify_payload(payload)
+        return result
+    
+    def classify_many(self, images, max_concurrency=8, backend="thread"):
+        """
+        Classify a batch of images with a bounded number of requests in flight
+        
+        The shared session blocks when its per-host pool is exhausted, so
+        pool_maxsize should be at least max_concurrency.
+        
+        Args:
+            images (iterable): Preprocessed images (PIL.Image or EncodedImage)
+            max_concurrency (int): Maximum number of requests in flight
+            backend (str): "thread" for a thread pool, "asyncio" for an event loop
+        
+        Returns:
+            list: One result per image, in input order; failed items are error dicts
+        """
+        images = list(images)
+        if backend == "thread":
+            with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+                return list(pool.map(self._classify_safely, images))
+        if backend == "asyncio":
+            return asyncio.run(self.classify_many_async(images, max_concurrency))
+        raise ValueError(f"Unknown backend: {backend}")
+    
+    async def classify_many_async(self, images, max_concurrency=8):
+        """
+        Classify a batch of images from a running event loop
+        
+        Args:
+            images (iterable): Preprocessed images (PIL.Image or EncodedImage)
+            max_concurrency (int): Maximum number of requests in flight
+        
+        Returns:
+            list: One result per image, in input order; failed items are error dicts
+        """
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(max_concurrency)
+        executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        
+        async def classify(image):
+            async with semaphore:
+                return await loop.run_in_executor(executor, self._classify_safely, image)
+        
+        try:
+            return await asyncio.gather(*(classify(image) for image in images))
+        finally:
+            executor.shutdown(wait=False)
+    
+    def _classify_safely(self, image):
+        """Classify one image, turning unexpected exceptions into an error result"""
+        try:
+            return self.classify_image(image)
+        except Exception as e:
+            return {"error": f"Classification failed: {str(e)}"}
+    
+    def cache_key(self, image, digest=None):
+        """
+        Build the prediction cache key for an image
+        
+        Args:
+            image (PIL.Image or EncodedImage): The preprocessed image
+            digest (str): image_digest(image) if already computed
+        
+        Returns:
+            str: Key combining model ID, pixel digest and encoding parameters
+        """
+        params = {
+            "format": self.image_format,
+            "quality": self.quality,
+            "subsampling": self.subsampling
+        }
+        if digest is None:
+            digest = image_digest(image)
+        return PredictionCache.make_key(self.model_id, digest, params)
+    
+    def coalesce_key(self, key):
+        """
+        Build the key that identical in-flight requests are coalesced on
+        
+        The coalescer is shared by every handler in the process, so besides
+        the cache key it names where the request goes: a local backend and
+        the remote API, or two API endpoints, must not answer for each other.
+        
+        Args:
+            key (str): cache_key() of the image
+        
+        Returns:
+            tuple: Cache key, endpoint URL and backend identity
+        """
+        # Backends are shared per model (get_local_backend), so identity is enough
+        backend = None if self.backend is None else (type(self.backend).__name__, id(self.backend))
+        return (key, self.api_url, backend)
+    
+    def _classify_payload(self, payload):
+        """Send an encoded payload, walking the upload strategies until one succeeds"""
+        walk = self._walk_strategies()
+        try:
+            name = next(walk)
+            while True:
+                name = walk.send(self._send_with_retry(name, payload))
+        except StopIteration as done:
+            return done.value
+    
+    def _walk_strategies(self):
+        """
+        Decide which upload strategies to try and record how they went
+        
+        Generator shared by the blocking and asyncio clients: it yields the
+        name of the next strategy to send, receives that strategy's result and
+        finally returns the overall result.
+        """
+        # Fail fast while the model is known to be unavailable
+        if not self.circuit_breaker.allow():
+            retry_in = self.circuit_breaker.retry_in()
+            return {
+                "error": f"Model {self.model_id} is temporarily unavailable, retry in {retry_in:.1f}s",
+                "transient": True,
+                "retry_after": retry_in
+            }
+        
+        # Start with the strategy known to work for this model; the rest are
+        # only probed when it fails (default order: binary, base64, simple base64, form)
+        known_good = self.strategy_registry.preferred(self.model_id) is not None
+        order = self.strategy_registry.order(self.model_id, list(self.STRATEGIES))
+        result = None
+        for attempt, name in enumerate(order):
+            if attempt:
+                debug(f"{order[attempt - 1]} upload failed, trying {name} upload...")
+                metrics.inc("fallbacks_total", model=self.model_id, from_strategy=order[attempt - 1], to_strategy=name)
+            result = yield name
+            if "error" not in result:
+                self.circuit_breaker.record_success()
+                self.strategy_registry.record_success(self.model_id, name)
+                self.strategy_registry.record_lookup(hit=known_good and attempt == 0)
+                return result
+            if result.get("transient"):
+                # Cold start, rate limit or network trouble: another payload
+                # format would fail the same way, so stop here
+                self.circuit_breaker.record_failure(open_for=result.get("retry_after"))
+                self.strategy_registry.record_lookup(hit=False)
+                return result
+            self.strategy_registry.record_failure(self.model_id, name)
+        
+        # The model answered but rejected every format, so it is reachable
+        self.circuit_breaker.release()
+        self.strategy_registry.record_lookup(hit=False)
+        return result
+    
+    def _send_with_retry(self, name, payload):
+        """Run one upload strategy, retrying transient failures with backoff"""
+        strategy = getattr(self, self.STRATEGIES[name])
+        attempt = 0
+        while True:
+            result = strategy(payload)
+            delay = self._retry_delay(name, attempt, result)
+            if delay is None:
+                return result
+            self.retry_policy.sleep(delay)
+            attempt += 1
+    
+    def _retry_delay(self, name, attempt, result):
+        """
+        Decide whether a strategy's result should be retried
+        
+        Args:
+            name (str): Upload strategy that produced the result
+            attempt (int): Number of the attempt, starting at 0
+            result: The strategy's result
+        
+        Returns:
+            float: Seconds to wait before retrying, or None to keep the result
+        """
+        if "error" not in result or not result.get("transient"):
+            return None
+        if attempt >= self.retry_policy.max_retries:
+            return None
+        delay = self.retry_policy.delay(attempt, result.get("retry_after"))
+        debug(f"{name} upload hit a transient error, retrying in {delay:.2f}s...")
+        metrics.inc("retries_total", model=self.model_id, strategy=name)
+        return delay
+    
+    def _try_binary_upload(self, payload):
         """Try uploading image as binary data"""
         try:
-            # Convert image to bytes
-            img_byte_arr = io.BytesIO()
-            image.save(img_byte_arr, format='JPEG')
-            img_byte_arr = img_byte_arr.getvalue()
-            
             # Set headers with authorization
             headers = {
                 "Authorization": f"Bearer {self.api_token}",
                 "Content-Type": "application/octet-stream"
             }
             
-            print(f"Sending binary request to: {self.api_url}")
+            debug(f"Sending binary request to: {self.api_url}")
             
             # Make API request
-            response = requests.post(self.api_url, headers=headers, data=img_byte_arr)
+            response = self._post("binary", headers=headers, data=payload.data)
             
-            print(f"Binary response status code: {response.status_code}")
+            debug(f"Binary response status code: {response.status_code}")
             
             return self._process_response(response)
         except Exception as e:
-            return {"error": f"Binary upload failed: {str(e)}"}
+            return self._upload_error("Binary", e)
     
-    def _try_base64_upload(self, image):
+    def _try_base64_upload(self, payload):
         """Try uploading image as base64 encoded JSON"""
         try:
-            # Convert image to base64
-            img_byte_arr = io.BytesIO()
-            image.save(img_byte_arr, format='JPEG')
-            encoded_img = base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
-            
             # Set headers with authorization
             headers = {
                 "Authorization": f"Bearer {self.api_token}",
@@ -105,31 +608,26 @@ class APIHandler:
             }
             
             # Create payload with base64 image
-            payload = {
+            body = {
                 "inputs": {
-                    "image": encoded_img
+                    "image": payload.base64
                 }
             }
             
-            print(f"Sending base64 request to: {self.api_url}")
+            debug(f"Sending base64 request to: {self.api_url}")
             
             # Make API request
-            response = requests.post(self.api_url, headers=headers, json=payload)
+            response = self._post("base64", headers=headers, json=body)
             
-            print(f"Base64 response status code: {response.status_code}")
+            debug(f"Base64 response status code: {response.status_code}")
             
             return self._process_response(response)
         except Exception as e:
-            return {"error": f"Base64 upload failed: {str(e)}"}
+            return self._upload_error("Base64", e)
     
-    def _try_simple_base64(self, image):
+    def _try_simple_base64(self, payload):
         """Try uploading image as simple base64 string (alternate format)"""
         try:
-            # Convert image to base64
-            img_byte_arr = io.BytesIO()
-            image.save(img_byte_arr, format='JPEG')
-            encoded_img = base64.b64encode(img_byte_arr.getvalue()).decode('utf-8')
-            
             # Set headers with authorization
             headers = {
                 "Authorization": f"Bearer {self.api_token}",
@@ -137,93 +635,76 @@ class APIHandler:
             }
             
             # Create simpler payload (just the base64 string)
-            payload = {"inputs": encoded_img}
+            body = {"inputs": payload.base64}
             
-            print(f"Sending simple base64 request to: {self.api_url}")
+            debug(f"Sending simple base64 request to: {self.api_url}")
             
             # Make API request
-            response = requests.post(self.api_url, headers=headers, json=payload)
+            response = self._post("simple_base64", headers=headers, json=body)
             
-            print(f"Simple base64 response status code: {response.status_code}")
+            debug(f"Simple base64 response status code: {response.status_code}")
             
             return self._process_response(response)
         except Exception as e:
-            return {"error": f"Simple base64 upload failed: {str(e)}"}
+            return self._upload_error("Simple base64", e)
     
-    def _try_form_upload(self, image):
+    def _try_form_upload(self, payload):
         """Try uploading image as multipart form data"""
         try:
-            # Convert image to bytes for form upload
-            img_byte_arr = io.BytesIO()
-            image.save(img_byte_arr, format='JPEG')
-            img_byte_arr.seek(0)
-            
             # Set headers with authorization
             headers = {
                 "Authorization": f"Bearer {self.api_token}"
             }
             
-            # Create form data
+            # Create form data from a zero-copy view of the encoded bytes
             files = {
-                'file': ('image.jpg', img_byte_arr, 'image/jpeg')
+                'file': (payload.filename, payload.view, payload.mime_type)
             }
             
-            print(f"Sending form request to: {self.api_url}")
+            debug(f"Sending form request to: {self.api_url}")
             
             # Make API request
-            response = requests.post(self.api_url, headers=headers, files=files)
+            response = self._post("form", headers=headers, files=files)
             
-            print(f"Form response status code: {response.status_code}")
+            debug(f"Form response status code: {response.status_code}")
             
             return self._process_response(response)
         except Exception as e:
-            return {"error": f"Form upload failed: {str(e)}"}
+            return self._upload_error("Form", e)
+    
+    def _post(self, strategy, **kwargs):
+        """POST to the inference endpoint, recording upload and server round-trip time"""
+        with metrics.span("upload", model=self.model_id, strategy=strategy):
+            response = self.session.post(self.api_url, timeout=self.timeout, **kwargs)
+        # Time from sending the request until the response headers arrived
+        elapsed = getattr(response, "elapsed", None)
+        if elapsed is not None:
+            metrics.observe("roundtrip_seconds", elapsed.total_seconds(), model=self.model_id, strategy=strategy)
+        metrics.inc("responses_total", model=self.model_id, strategy=strategy, status=response.status_code)
+        return response
+    
+    @staticmethod
+    def _upload_error(strategy, error):
+        """Build the error result of a request that raised, flagging network failures as transient"""
+        transient = isinstance(error, (requests.ConnectionError, requests.Timeout))
+        return {"error": f"{strategy} upload failed: {str(error)}", "transient": transient}
     
     def _process_response(self, response):
         """Process API response and handle errors"""
-        # Check for successful response
-        if response.status_code != 200:
-            try:
-                error_detail = response.json()
-            except json.JSONDecodeError:
-                error_detail = response.text[:200] + "..." if len(response.text) > 200 else response.text
-            return {"error": f"API Error: {error_detail}"}
-        
-        # Parse and return results
-        try:
-            results = response.json()
-            
-            # Verify the results have the expected format
-            if not isinstance(results, list) and isinstance(results, dict):
-                # Some models return a dict with prediction info
-                if "error" in results:
-                    return {"error": f"API Error: {results['error']}"}
-                # Try to convert to compatible format
-                return [results]
-            elif not isinstance(results, list):
-                return {"error": f"Unexpected API response format: {results}"}
-                
-            # Validate each item in the results
-            validated_results = []
-            for item in results:
-                if isinstance(item, dict) and "label" in item and item["label"] is not None:
-                    validated_results.append(item)
-                else:
-                    print(f"Skipping invalid result item: {item}")
-                    
-            if not validated_results:
-                return {"error": "API returned no valid classification results"}
-                
-            return validated_results
-            
-        except json.JSONDecodeError:
-            return {"error": f"Failed to parse API response: {response.text[:100]}..."}
+        with metrics.span("parse", model=self.model_id):
+            return self._parse_response(response)
+    
+    def _parse_response(self, response):
+        """Validate the response body and turn it into results or an error"""
+        return parse_response(response.status_code, response.headers, response.text)
     
     def is_configured(self):
         """
         Check if the API is properly configured with a token
         
         Returns:
-            bool: True if API token is set, False otherwise
+            bool: True if API token is set (or the backend is ready), False otherwise
         """
+        if self.backend is not None:
+            return self.backend.is_configured()
         return self.api_token is not None and len(self.api_token) > 10 and self.api_token.startswith("hf_") 
\ No newline at end of file
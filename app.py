@@ -1,68 +1,83 @@
 import streamlit as st
-from PIL import Image
-from image_processor import ImageProcessor
-from api_handler import APIHandler
-import os
-from dotenv import load_dotenv
+from image_processor import ImageProcessor, InvalidImageError
+from config import get_settings
+from handler_registry import get_handler, peek_model_info
+from prediction_cache import PredictionCache
+from fruits import MODELS, match_fruit, turkish_name
+from local_backend import get_local_backend
+from ensemble import EnsembleClassifier
+from near_duplicate import NearDuplicateCache
+from scheduler import INTERACTIVE, SHED, EXPIRED, RequestScheduler
+from history_store import HistoryStore
 from pathlib import Path
+import os
+import metrics
 
-# Load environment variables from env.example file
-load_dotenv('env.example')
+# Get API token from env.example (loaded once per process) or use empty string as default
+default_token = get_settings().api_token
 
-# Get API token from environment variables or use empty string as default
-default_token = os.getenv("HUGGINGFACE_API_TOKEN", "")
+# Tahmin önbelleğinin diskteki konumu (yeniden başlatmalarda korunur)
+CACHE_DIR = Path(".cache")
 
-# Kullanılabilecek modeller listesi
-MODELS = {
-    "ResNet-50": "microsoft/resnet-50",
-    "ViT Base": "google/vit-base-patch16-224",
-    "DeiT Base": "facebook/deit-base-distilled-patch16-224",
-    "ConvNeXT": "facebook/convnext-base-224-22k-1k",
-    "CLIP": "openai/clip-vit-base-patch32"
-}
+@st.cache_resource
+def get_prediction_cache():
+    """
+    Tüm oturumlar arasında paylaşılan tahmin önbelleğini döndürür
+    """
+    CACHE_DIR.mkdir(exist_ok=True)
+    return PredictionCache(max_entries=512, disk_path=str(CACHE_DIR / "predictions.sqlite"))
 
-# Meyve listesi - model bu meyveleri tanıyabilir
-MEYVELER = [
-    "apple", "apricot", "avocado", "banana", "bell pepper", "blackberry", "blueberry", 
-    "cantaloupe", "cherry", "coconut", "cucumber", "grape", "grapefruit", "kiwi", 
-    "lemon", "lime", "mango", "orange", "papaya", "peach", "pear", "pineapple", 
-    "plum", "pomegranate", "raspberry", "strawberry", "tomato", "watermelon"
-]
+@st.cache_resource
+def get_history():
+    """
+    Tüm tahminlerin (model, etiketler, eşleşen meyve, süreler) diske
+    toplu halde yazıldığı geçmiş deposunu döndürür
+    """
+    CACHE_DIR.mkdir(exist_ok=True)
+    return HistoryStore(str(CACHE_DIR / "history"))
 
-# Meyve alt-türleri için eşleştirme tablosu
-ALT_TURLER = {
-    # Elma türleri
-    "granny smith": "apple", 
-    "red delicious": "apple",
-    "golden delicious": "apple",
-    "honeycrisp": "apple",
-    "mcintosh": "apple",
-    "braeburn": "apple",
-    "gala": "apple",
-    "pink lady": "apple",
-    "fuji": "apple",
-    # Portakal türleri
-    "mandarin": "orange",
-    "tangerine": "orange",
-    "clementine": "orange",
-    "satsuma": "orange",
-    # Üzüm türleri
-    "wine": "grape",
-    "raisin": "grape",
-    "sultana": "grape"
-}
+@st.cache_resource
+def get_near_duplicates():
+    """
+    Yeniden sıkıştırılmış veya hafifçe kırpılmış aynı fotoğrafların tahminini
+    yeniden kullanan algısal özet (pHash) önbelleğini döndürür
+    """
+    return NearDuplicateCache(max_distance=6)
 
-# Meyve Türkçe isim çevirileri
-MEYVE_CEVIRILERI = {
-    "apple": "Elma", "apricot": "Kayısı", "avocado": "Avokado", "banana": "Muz",
-    "bell pepper": "Biber", "blackberry": "Böğürtlen", "blueberry": "Yaban Mersini",
-    "cantaloupe": "Kavun", "cherry": "Kiraz", "coconut": "Hindistan Cevizi",
-    "cucumber": "Salatalık", "grape": "Üzüm", "grapefruit": "Greyfurt",
-    "kiwi": "Kivi", "lemon": "Limon", "lime": "Misket Limonu", "mango": "Mango",
-    "orange": "Portakal", "papaya": "Papaya", "peach": "Şeftali", "pear": "Armut",
-    "pineapple": "Ananas", "plum": "Erik", "pomegranate": "Nar", "raspberry": "Ahududu",
-    "strawberry": "Çilek", "tomato": "Domates", "watermelon": "Karpuz"
-}
+@st.cache_resource
+def get_scheduler():
+    """
+    Tüm oturumların isteklerini önceliklendiren ve API kotasını paylaştıran
+    zamanlayıcıyı döndürür (FRUIT_RATE_LIMIT ayarlıysa model başına istek/sn sınırı)
+    """
+    rate = os.getenv("FRUIT_RATE_LIMIT")
+    return RequestScheduler(max_in_flight=16, max_wait=30.0, default_rate=float(rate) if rate else None)
+
+@st.cache_resource
+def start_metrics_server():
+    """
+    FRUIT_METRICS_PORT ayarlıysa metrikleri /metrics adresinde bir kez yayınlar
+    """
+    port = os.getenv("FRUIT_METRICS_PORT")
+    return metrics.serve_metrics(int(port)) if port else None
+
+@st.cache_resource
+def get_ensemble(api_token):
+    """
+    Tüm modelleri aynı anda sorgulayan ensemble sınıflandırıcıyı döndürür
+    """
+    # Her model kendi giriş boyutunu alır; görüntü tek geçişte tüm boyutlara küçültülür.
+    # Boyutlar Hub'dan arka planda okundukça main() bu sözlüğü günceller
+    return EnsembleClassifier(
+        list(MODELS.values()),
+        api_token=api_token,
+        min_agreement=3,
+        latency_budget=20.0,
+        input_sizes={model_id: peek_model_info(model_id, fetch=False).input_size for model_id in MODELS.values()},
+        cache=get_prediction_cache(),
+        near_duplicates=get_near_duplicates(),
+        history=get_history()
+    )
 
 def main():
     """
@@ -77,6 +92,7 @@ def main():
     
     # Başlık
     st.title("🍎 Meyve Tanımlayıcı")
+    start_metrics_server()
     st.write("Bir meyve resmi yükleyin ve yapay zeka hangi meyve olduğunu tahmin etsin!")
     
     # Model seçimi
@@ -86,21 +102,79 @@ def main():
     )
     selected_model_id = MODELS[selected_model_name]
     
-    # API işleyicisini başlat (seçilen model ve token ile)
-    api_handler = APIHandler(model_id=selected_model_id, api_token=default_token)
+    # Çıkarım yöntemi: uzak API veya diskteki ağırlıklarla yerel model
+    inference_mode = st.radio(
+        "Çıkarım yöntemi:",
+        ["Hugging Face API", "Yerel (CPU)"],
+        horizontal=True
+    )
+    use_local = inference_mode == "Yerel (CPU)"
+    
+    # Ensemble modu: görüntü tüm modellere aynı anda gönderilir
+    use_ensemble = st.checkbox(
+        "Tüm modelleri birlikte kullan (ensemble)",
+        disabled=use_local,
+        help="En az 3 model aynı meyvede anlaştığında sonuç hemen gösterilir; geciken modeller beklenmez."
+    )
+    backend = get_local_backend(selected_model_id) if use_local else None
+    
+    # Model bilgisi (giriş boyutu, etiketler) Hub'dan arka planda okunur; arayüz
+    # beklemez, hazır olana kadar varsayılanlar kullanılır. Yerel modelde Hub'a gidilmez
+    model_info = peek_model_info(selected_model_id, fetch=not use_local)
+    
+    # API işleyicisini al (seçilen model ve token ile); yeniden çalıştırmalar
+    # arasında aynı işleyici ve bağlantı havuzu kullanılır
+    prediction_cache = get_prediction_cache()
+    near_duplicates = get_near_duplicates()
+    api_handler = get_handler(selected_model_id, api_token=default_token,
+                              cache=prediction_cache, near_duplicates=near_duplicates,
+                              history=get_history(), backend=backend)
     
     # API yapılandırmasını kontrol et
     if not api_handler.is_configured():
-        st.warning("⚠️ Hugging Face API anahtarı ayarlanmamış. Lütfen env.example dosyasına geçerli bir token ekleyin.")
+        if use_local:
+            st.warning("⚠️ Model ağırlıkları diskte bulunamadı. Önce `python -c \"from local_backend import download_model; download_model('" + selected_model_id + "')\"` komutunu çalıştırın.")
+        else:
+            st.warning("⚠️ Hugging Face API anahtarı ayarlanmamış. Lütfen env.example dosyasına geçerli bir token ekleyin.")
     
     # Debug bilgisi göster
     with st.expander("Teknik Bilgiler"):
         st.info(f"Seçilen model: {selected_model_name} ({selected_model_id})")
         st.info(f"API Endpoint: {api_handler.api_url}")
+        st.info(
+            f"Giriş boyutu: {model_info.input_size[0]}x{model_info.input_size[1]}, "
+            f"etiket sayısı: {len(model_info.labels) if model_info.labels else 'bilinmiyor'}, "
+            f"tercih edilen gönderim: {model_info.preferred_strategy or 'henüz belirlenmedi'}"
+        )
         if len(default_token) > 10:
             st.info(f"Token: {default_token[:5]}...{default_token[-4:]}")
         else:
             st.warning("Token ayarlanmamış veya geçersiz")
+        
+        cache_stats = prediction_cache.stats()
+        st.info(
+            f"Önbellek: {cache_stats['memory_entries']} bellekte, {cache_stats['disk_entries']} diskte, "
+            f"isabet oranı %{cache_stats['hit_ratio'] * 100:.1f}, "
+            f"ortalama arama {cache_stats['mean_lookup_ms']:.2f} ms"
+        )
+        duplicate_stats = near_duplicates.stats()
+        st.info(
+            f"Benzer görüntü eşleşmesi: {duplicate_stats['hits']} isabet, "
+            f"{duplicate_stats['misses']} ıska, isabet oranı %{duplicate_stats['hit_ratio'] * 100:.1f}"
+        )
+        history = get_history()
+        top_fruits = list(history.fruit_counts(model=selected_model_id).items())[:3]
+        st.info(
+            f"Tahmin geçmişi: {len(history)} kayıt; bu modelin en sık bulduğu meyveler: "
+            + (", ".join(f"{turkish_name(fruit)} ({count})" for fruit, count in top_fruits) or "henüz yok")
+        )
+        scheduler_stats = get_scheduler().stats()
+        st.info(
+            f"İstek kuyruğu: {sum(scheduler_stats['queued'].values())} bekliyor, "
+            f"{sum(scheduler_stats['in_flight'].values())} işleniyor, "
+            f"ortalama bekleme {scheduler_stats['mean_queue_wait_ms']['interactive']:.1f} ms, "
+            f"reddedilen {scheduler_stats['rejected'][SHED] + scheduler_stats['rejected'][EXPIRED]}"
+        )
     
     # İki sütun oluştur
     col1, col2 = st.columns([1, 1])
@@ -112,8 +186,9 @@ def main():
         
         if uploaded_file is not None:
             try:
-                # Yüklenen resmi göster
-                image = Image.open(uploaded_file)
+                # Resmi tek geçişte doğrula ve çöz (bozuk veya aşırı büyük dosyalar
+                # piksel çözülmeden reddedilir), ardından göster
+                image = ImageProcessor.load_image(uploaded_file)
                 st.image(image, caption="Yüklenen Meyve", use_column_width=True)
                 
                 with st.expander("Görüntü Bilgileri"):
@@ -124,30 +199,77 @@ def main():
                 # Tahmin butonu ekle
                 if st.button("Meyveyi Tanımla", type="primary"):
                     if not api_handler.is_configured():
-                        st.error("Lütfen önce API anahtarınızı env.example dosyasında yapılandırın.")
+                        if use_local:
+                            st.error("Lütfen önce model ağırlıklarını indirin.")
+                        else:
+                            st.error("Lütfen önce API anahtarınızı env.example dosyasında yapılandırın.")
                     else:
                         with st.spinner(f"{selected_model_name} modeli ile analiz ediliyor..."):
-                            # Resmi ön işle
-                            processor = ImageProcessor()
-                            processed_image = processor.preprocess(image)
-                            
-                            st.info("Görüntü işlendi ve API'ye gönderiliyor...")
-                            
-                            # Tahmin yap
-                            prediction = api_handler.classify_image(processed_image)
+                            # Tahmin yap (ensemble görüntüyü her modelin boyutuna kendisi hazırlar)
+                            if use_ensemble:
+                                st.info("Görüntü tüm modellere gönderiliyor...")
+                                ensemble = get_ensemble(default_token)
+                                ensemble.input_sizes.update(
+                                    {model_id: peek_model_info(model_id).input_size for model_id in MODELS.values()}
+                                )
+                                ensemble_result = ensemble.classify_image(image)
+                            else:
+                                # Resmi ön işle
+                                processor = ImageProcessor()
+                                processed_image = processor.preprocess(image, model_info.input_size)
+                                
+                                st.info("Görüntü işlendi ve API'ye gönderiliyor...")
+                                # Etkileşimli istekler toplu işlerin önüne alınır
+                                prediction = get_scheduler().classify(api_handler, processed_image, priority=INTERACTIVE)
                             
                             # Debug bilgisi
                             with st.expander("API Cevabı (Ham)"):
-                                st.json(prediction)
+                                st.json(ensemble_result if use_ensemble else prediction)
+            except InvalidImageError as e:
+                st.error(f"Geçersiz veya çok büyük resim: {str(e)}")
             except Exception as e:
                 st.error(f"Resim yüklenirken hata oluştu: {str(e)}")
     
     # İkinci sütunda sonuçlar
     with col2:
+        if uploaded_file is not None and 'ensemble_result' in locals():
+            st.subheader("Ensemble Sonuçları")
+            
+            if ensemble_result["fruits"]:
+                top = ensemble_result["fruits"][0]
+                st.success("Meyve başarıyla tanımlandı!")
+                st.table([
+                    {
+                        "Meyve": turkish_name(item["fruit"]),
+                        "Skor": f"{item['score'] * 100:.2f}%",
+                        "Modeller": len(item["models"])
+                    }
+                    for item in ensemble_result["fruits"][:5]
+                ])
+                st.markdown(f"### Bu bir **{turkish_name(top['fruit'])}** olabilir! ({top['score'] * 100:.2f}%)")
+            else:
+                st.warning("Modeller bu resimde bilinen bir meyve tespit edemedi.")
+            
+            # Model bazında durum ve gecikme
+            model_names = {model_id: name for name, model_id in MODELS.items()}
+            st.table([
+                {
+                    "Model": model_names.get(model_id, model_id),
+                    "Durum": info["status"],
+                    "Gecikme": f"{info['latency']:.2f} sn",
+                    "Meyve": turkish_name(info["top_fruit"]) if info.get("top_fruit") else "-"
+                }
+                for model_id, info in ensemble_result["models"].items()
+            ])
+            if ensemble_result["early_exit"]:
+                st.info("Yeterli sayıda model anlaştığı için geciken modeller beklenmedi.")
+        
         if uploaded_file is not None and 'prediction' in locals():
             st.subheader("Meyve Tanımlama Sonuçları")
             
-            if isinstance(prediction, dict) and "error" in prediction:
+            if isinstance(prediction, dict) and prediction.get("status") in (SHED, EXPIRED):
+                st.warning("Sunucu şu anda çok yoğun. Lütfen birkaç saniye sonra tekrar deneyin.")
+            elif isinstance(prediction, dict) and "error" in prediction:
                 st.error(prediction["error"])
                 st.warning("API hatası oluştu. Lütfen token'ın doğru olduğundan emin olun ve tekrar deneyin.")
                 
@@ -183,32 +305,12 @@ def main():
                         label = original_label.lower()
                         score = result.get("score", 0) * 100
                         
-                        # Eşleşen meyveyi bul
-                        matched_fruit = None
-                        
-                        # 1. Önce alt türleri kontrol et
-                        for alt_tur, ana_meyve in ALT_TURLER.items():
-                            if alt_tur in label:
-                                matched_fruit = ana_meyve
-                                break
-                                
-                        # 2. Eğer alt tür bulunamadıysa, direkt meyve listesinde ara
-                        if not matched_fruit:
-                            for meyve in MEYVELER:
-                                if meyve in label:
-                                    matched_fruit = meyve
-                                    break
-                        
-                        # 3. Eğer hala bulunamadıysa, bu kez etiketin meyve adı içerip içermediğini kontrol et
-                        if not matched_fruit:
-                            for meyve in MEYVELER:
-                                if label in meyve:  # Örn: "apple" içinde "red" olabilir
-                                    matched_fruit = meyve
-                                    break
+                        # Eşleşen meyveyi bul (alt tür, meyve adı, kısmi eşleşme sırasıyla)
+                        matched_fruit = match_fruit(label)
                         
                         # Eğer bir meyve bulunduysa, sonuçlara ekle
                         if matched_fruit:
-                            turkce_isim = MEYVE_CEVIRILERI.get(matched_fruit, matched_fruit.capitalize())
+                            turkce_isim = turkish_name(matched_fruit)
                             meyve_sonuclari.append({
                                 "Meyve": turkce_isim, 
                                 "Eşleşme": f"{score:.2f}%", 
@@ -0,0 +1,238 @@
+import asyncio
+
+import aiohttp
+
+import metrics
+from api_handler import APIHandler, DEFAULT_API_BASE_URL, parse_response
+from metrics import debug
+
+
+class AsyncAPIHandler(APIHandler):
+    """
+    Asyncio-native client for the inference API
+    
+    Uploads run on one pooled aiohttp session inside the event loop, so
+    thousands of requests can be in flight without a thread each. Strategy
+    fallback, retries, the circuit breaker, caching, coalescing and response
+    validation behave exactly as in APIHandler.
+    
+    The coroutines are classify_image_async() and classify_many_async().
+    The synchronous methods inherited from APIHandler keep working on the
+    shared requests pool, so the handler can be passed anywhere an
+    APIHandler is expected. Await close(), or use the handler as an async
+    context manager, before the event loop that used it ends.
+    """
+    
+    def __init__(self, model_id="microsoft/resnet-50", api_token=None,
+                 api_base_url=DEFAULT_API_BASE_URL, max_concurrency=256, connect_timeout=5.0,
+                 read_timeout=60.0, request_timeout=None, keep_alive=True, client_session=None, **kwargs):
+        """
+        Initialize the async API handler
+        
+        Args:
+            model_id (str): The Hugging Face model ID to use
+            api_token (str): Hugging Face API token, if provided directly
+            api_base_url (str): Base URL of the inference API
+            max_concurrency (int): Maximum number of requests in flight; also the
+                size of the connection pool
+            connect_timeout (float): Seconds to wait for a connection to open
+            read_timeout (float): Seconds to wait between reads from the server
+            request_timeout (float): Upper bound for a whole request, None for no limit
+            keep_alive (bool): Reuse connections between requests
+            client_session (aiohttp.ClientSession): Custom session instead of the handler's own
+            **kwargs: Other APIHandler arguments (encoding, cache, retry policy, ...)
+        """
+        super().__init__(model_id=model_id, api_token=api_token, api_base_url=api_base_url,
+                         connect_timeout=connect_timeout, read_timeout=read_timeout,
+                         keep_alive=keep_alive, **kwargs)
+        self.max_concurrency = max_concurrency
+        self.keep_alive = keep_alive
+        self.client_timeout = aiohttp.ClientTimeout(total=request_timeout, connect=connect_timeout,
+                                                    sock_read=read_timeout)
+        # aiohttp sessions belong to an event loop, so ours is opened on first use
+        self.client_session = client_session
+        self._owns_session = client_session is None
+        self._semaphore = None
+        self._loop = None
+    
+    async def _ensure_session(self):
+        """Open the pooled session and semaphore for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            previous = None
+            if self._owns_session:
+                previous = self.client_session
+                connector = aiohttp.TCPConnector(limit=self.max_concurrency, force_close=not self.keep_alive)
+                self.client_session = aiohttp.ClientSession(connector=connector, timeout=self.client_timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+            # A session opened on an earlier loop cannot be reused; close it so
+            # its connector does not leak. Other requests already see the new one
+            await self._close_session(previous)
+        return self.client_session
+    
+    @staticmethod
+    async def _close_session(session):
+        if session is None:
+            return
+        try:
+            await session.close()
+        except Exception as e:
+            debug(f"Could not close aiohttp session: {str(e)}")
+    
+    async def close(self):
+        """Close the handler's own aiohttp session and its pooled connections"""
+        if self._owns_session:
+            session, self.client_session = self.client_session, None
+            self._loop = None
+            await self._close_session(session)
+    
+    async def __aenter__(self):
+        await self._ensure_session()
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.close()
+    
+    async def classify_image_async(self, image):
+        """
+        Send an image to the Hugging Face API for classification
+        
+        Args:
+            image (PIL.Image or EncodedImage): The preprocessed image to classify
+        
+        Returns:
+            dict: Classification results or error message
+        """
+        return await self._classify_flow_async(image, self._classify_uncached_async)
+    
+    async def _classify_uncached_async(self, image, key=None):
+        """Classify with the backend or the remote API and cache a successful result"""
+        with metrics.span("classify", model=self.model_id):
+            if self.backend is not None:
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(None, self.backend.classify_image, image)
+            else:
+                try:
+                    payload = self.encode(image)
+                except Exception as e:
+                    return {"error": f"Image encoding failed: {str(e)}"}
+                result = await self._classify_payload_async(payload)
+        if self.cache is not None and key is not None:
+            self.cache.put(key, result)
+        return result
+    
+    async def classify_many_async(self, images, max_concurrency=None):
+        """
+        Classify a batch of images concurrently
+        
+        At most max_concurrency requests are in flight; the rest wait on the
+        handler's semaphore.
+        
+        Args:
+            images (iterable): Preprocessed images (PIL.Image or EncodedImage)
+            max_concurrency (int): Lower limit for this batch, None for the handler's own
+        
+        Returns:
+            list: One result per image, in input order; failed items are error dicts
+        """
+        limit = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        
+        async def classify(image):
+            if limit is None:
+                return await self._classify_safely_async(image)
+            async with limit:
+                return await self._classify_safely_async(image)
+        
+        return await asyncio.gather(*(classify(image) for image in images))
+    
+    def classify_many(self, images, max_concurrency=8, backend="thread"):
+        """
+        Classify a batch of images with a bounded number of requests in flight
+        
+        The "asyncio" backend runs the native coroutines on a private event
+        loop and closes the handler's session before that loop ends.
+        
+        Args:
+            images (iterable): Preprocessed images (PIL.Image or EncodedImage)
+            max_concurrency (int): Maximum number of requests in flight
+            backend (str): "thread" for a thread pool, "asyncio" for an event loop
+        
+        Returns:
+            list: One result per image, in input order; failed items are error dicts
+        """
+        if backend != "asyncio":
+            return super().classify_many(images, max_concurrency, backend)
+        
+        async def run():
+            try:
+                return await self.classify_many_async(images, max_concurrency)
+            finally:
+                await self.close()
+        
+        return asyncio.run(run())
+    
+    async def _classify_safely_async(self, image):
+        try:
+            return await self.classify_image_async(image)
+        except Exception as e:
+            return {"error": f"Classification failed: {str(e)}"}
+    
+    async def _classify_payload_async(self, payload):
+        """Send an encoded payload, walking the upload strategies until one succeeds"""
+        walk = self._walk_strategies()
+        try:
+            name = next(walk)
+            while True:
+                name = walk.send(await self._send_with_retry_async(name, payload))
+        except StopIteration as done:
+            return done.value
+    
+    async def _send_with_retry_async(self, name, payload):
+        """Run one upload strategy, retrying transient failures with backoff"""
+        attempt = 0
+        while True:
+            result = await self._upload_async(name, payload)
+            delay = self._retry_delay(name, attempt, result)
+            if delay is None:
+                return result
+            await asyncio.sleep(delay)
+            attempt += 1
+    
+    def _request_options(self, name, payload):
+        """Headers and body of one upload strategy, matching APIHandler's _try_* methods"""
+        headers = {"Authorization": f"Bearer {self.api_token}"}
+        if name == "binary":
+            headers["Content-Type"] = "application/octet-stream"
+            return {"headers": headers, "data": payload.data}
+        if name == "base64":
+            return {"headers": headers, "json": {"inputs": {"image": payload.base64}}}
+        if name == "simple_base64":
+            return {"headers": headers, "json": {"inputs": payload.base64}}
+        form = aiohttp.FormData()
+        form.add_field("file", payload.data, filename=payload.filename, content_type=payload.mime_type)
+        return {"headers": headers, "data": form}
+    
+    async def _upload_async(self, name, payload):
+        """Send one request with the given strategy and validate the response"""
+        session = await self._ensure_session()
+        label = name.replace("_", " ").capitalize()
+        try:
+            async with self._semaphore:
+                debug(f"Sending {name} request to: {self.api_url}")
+                with metrics.span("upload", model=self.model_id, strategy=name):
+                    async with session.post(self.api_url, timeout=self.client_timeout,
+                                            **self._request_options(name, payload)) as response:
+                        text = await response.text()
+            metrics.inc("responses_total", model=self.model_id, strategy=name, status=response.status)
+            debug(f"{label} response status code: {response.status}")
+            with metrics.span("parse", model=self.model_id):
+                return parse_response(response.status, response.headers, text)
+        except Exception as e:
+            return self._client_error(label, e)
+    
+    @staticmethod
+    def _client_error(strategy, error):
+        """Build the error result of a request that raised, flagging network failures as transient"""
+        transient = isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+        return {"error": f"{strategy} upload failed: {str(error) or type(error).__name__}", "transient": transient}
@@ -0,0 +1,135 @@
+"""
+Benchmark high-concurrency classification: AsyncAPIHandler vs APIHandler threads
+
+The mock server runs in its own process with a fixed per-request latency,
+so throughput is bounded by how many requests each client keeps in flight.
+
+Usage:
+    python benchmarks/bench_async.py --concurrency 100 1000 2000 --latency 0.2
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from api_handler import APIHandler  # noqa: E402
+from async_api_handler import AsyncAPIHandler  # noqa: E402
+from bench_decode import peak_rss_mb  # noqa: E402
+from mock_server import MockInferenceServer  # noqa: E402
+from resilience import CircuitBreaker  # noqa: E402
+
+BENCH_TOKEN = "hf_benchmark_token"
+
+
+def serve(latency, ready):
+    """Run the mock server in a child process until it is terminated"""
+    server = MockInferenceServer(latency=latency)
+    ready.put(server.base_url)
+    server.serve_forever()
+
+
+def summarize(name, concurrency, latencies, elapsed, errors, threads):
+    samples = np.array(latencies) * 1000
+    p50, p99 = np.percentile(samples, [50, 99])
+    print(f"  {name:<7} concurrency={concurrency:<5} {len(samples) / elapsed:8.1f} req/s  "
+          f"p50 {p50:7.1f} ms  p99 {p99:7.1f} ms  errors {errors:<4} threads {threads:<5} "
+          f"peak RSS {peak_rss_mb():6.1f} MB")
+
+
+def run_async(base_url, payload, concurrency, total):
+    async def main():
+        handler = AsyncAPIHandler(api_token=BENCH_TOKEN, api_base_url=base_url, coalesce=False,
+                                  max_concurrency=concurrency, circuit_breaker=CircuitBreaker())
+        latencies = []
+        threads = 0
+        
+        async def one():
+            nonlocal threads
+            start = time.perf_counter()
+            result = await handler.classify_image_async(payload)
+            latencies.append(time.perf_counter() - start)
+            threads = max(threads, threading.active_count())
+            return result
+        
+        async with handler:
+            start = time.perf_counter()
+            results = await asyncio.gather(*(one() for _ in range(total)))
+            elapsed = time.perf_counter() - start
+        errors = sum(1 for r in results if isinstance(r, dict) and "error" in r)
+        summarize("async", concurrency, latencies, elapsed, errors, threads)
+    
+    asyncio.run(main())
+
+
+def run_threads(base_url, payload, concurrency, total):
+    handler = APIHandler(api_token=BENCH_TOKEN, api_base_url=base_url, coalesce=False,
+                         pool_maxsize=concurrency, circuit_breaker=CircuitBreaker())
+    latencies = []
+    threads = 0
+    
+    def one(_):
+        nonlocal threads
+        start = time.perf_counter()
+        result = handler._classify_safely(payload)
+        latencies.append(time.perf_counter() - start)
+        threads = max(threads, threading.active_count())
+        return result
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for r in results if isinstance(r, dict) and "error" in r)
+    summarize("threads", concurrency, latencies, elapsed, errors, threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[100, 1000, 2000],
+                        help="Requests in flight")
+    parser.add_argument("--requests-per-slot", type=int, default=3,
+                        help="Requests per unit of concurrency")
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated server latency")
+    parser.add_argument("--clients", nargs="+", choices=["async", "threads"], default=["async", "threads"],
+                        help="Clients to measure")
+    parser.add_argument("--worker", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    payload = APIHandler(api_token=BENCH_TOKEN).encode(Image.new("RGB", (224, 224), (120, 200, 80)))
+    
+    if args.worker:
+        # Each measurement runs in a fresh process so thread and memory peaks are its own
+        client, base_url = args.worker
+        for concurrency in args.concurrency:
+            total = concurrency * args.requests_per_slot
+            (run_async if client == "async" else run_threads)(base_url, payload, concurrency, total)
+        return
+    
+    ready = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(args.latency, ready), daemon=True)
+    server.start()
+    base_url = ready.get()
+    print(f"server latency {args.latency * 1000:.0f} ms, {args.requests_per_slot} requests per slot")
+    try:
+        for client in args.clients:
+            for concurrency in args.concurrency:
+                subprocess.run([sys.executable, __file__, "--worker", client, base_url,
+                                "--concurrency", str(concurrency),
+                                "--requests-per-slot", str(args.requests_per_slot)], check=True)
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
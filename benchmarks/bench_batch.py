@@ -0,0 +1,49 @@
+"""
+Benchmark APIHandler.classify_many throughput against the concurrency limit
+
+Usage:
+    python benchmarks/bench_batch.py --images 400 --latency 0.02 --limits 1 2 4 8 16 32
+"""
+import argparse
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_handler import APIHandler  # noqa: E402
+from mock_server import MockInferenceServer  # noqa: E402
+
+BENCH_TOKEN = "hf_benchmark_token"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=400, help="Images per run")
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated server latency (s)")
+    parser.add_argument("--limits", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32],
+                        help="Concurrency limits to measure")
+    parser.add_argument("--backends", nargs="+", default=["thread", "asyncio"],
+                        choices=["thread", "asyncio"])
+    args = parser.parse_args()
+    
+    # Distinct images so no layer can short-circuit repeated inputs
+    images = [Image.new("RGB", (224, 224), (i % 256, (i // 256) % 256, 90)) for i in range(args.images)]
+    
+    with MockInferenceServer(latency=args.latency) as server:
+        print(f"{'backend':>8} {'limit':>6} {'img/s':>9} {'errors':>7}")
+        for backend in args.backends:
+            for limit in args.limits:
+                handler = APIHandler(api_token=BENCH_TOKEN, api_base_url=server.base_url,
+                                     pool_maxsize=max(args.limits))
+                start = time.perf_counter()
+                results = handler.classify_many(images, max_concurrency=limit, backend=backend)
+                elapsed = time.perf_counter() - start
+                errors = sum(1 for r in results if isinstance(r, dict) and "error" in r)
+                print(f"{backend:>8} {limit:>6} {len(images) / elapsed:9.1f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark ImageProcessor.preprocess per mode: ms/image and peak RSS
+
+Each mode runs in its own subprocess so peak RSS is measured in isolation.
+Before timing, every mode is checked on images in modes Pillow cannot
+reduce (palette, bilevel, 16-bit); the script exits non-zero if one fails.
+
+Usage:
+    python benchmarks/bench_decode.py --repeat 5 --sizes 1920x1080 4032x3024
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from image_processor import BatchPreprocessor, ImageProcessor  # noqa: E402
+
+# Image modes that need converting before reduce() or a bilinear resize
+UNREDUCIBLE_MODES = ("P", "1", "I;16")
+
+
+def make_synthetic(directory, sizes):
+    """Write a detailed synthetic JPEG photo for every requested size"""
+    paths = []
+    for width, height in sizes:
+        image = Image.effect_mandelbrot((width, height), (-2.0, -1.2, 0.8, 1.2), 200)
+        image = Image.merge("RGB", (image, image.rotate(180), image.transpose(Image.FLIP_LEFT_RIGHT)))
+        path = os.path.join(directory, f"synthetic_{width}x{height}.jpg")
+        image.save(path, "JPEG", quality=90)
+        paths.append(path)
+    return paths
+
+
+def check_modes(directory):
+    """
+    Preprocess large palette, bilevel and 16-bit PNGs in every mode
+    
+    Returns:
+        list: Failure messages, empty when every image came out as 224x224 RGB
+    """
+    failures = []
+    for image_mode in UNREDUCIBLE_MODES:
+        path = os.path.join(directory, f"mode_{image_mode.replace(';', '_')}.png")
+        Image.effect_mandelbrot((1600, 1200), (-2.0, -1.2, 0.8, 1.2), 100).convert(image_mode).save(path)
+        for mode in (ImageProcessor.QUALITY, ImageProcessor.FAST):
+            try:
+                with Image.open(path) as image:
+                    result = ImageProcessor.preprocess(image, (224, 224), mode=mode)
+                with Image.open(path) as image:
+                    batch = BatchPreprocessor(1, layout="NHWC", dtype="uint8", mode=mode)([image])
+            except Exception as e:
+                failures.append(f"{image_mode} image, {mode} mode: {str(e)}")
+                continue
+            if result.mode != "RGB" or result.size != (224, 224) or batch.shape != (1, 224, 224, 3):
+                failures.append(f"{image_mode} image, {mode} mode: got {result.mode} {result.size}, "
+                                f"batch {batch.shape}")
+    return failures
+
+
+def run_worker(mode, paths, repeat):
+    """Preprocess every image `repeat` times and print timings as JSON"""
+    # Read files up front so disk I/O is not part of the measurement
+    blobs = {path: open(path, "rb").read() for path in paths}
+    timings = {}
+    
+    # Silence the processor's progress prints
+    sys.stdout = open(os.devnull, "w")
+    for path, data in blobs.items():
+        start = time.perf_counter()
+        for _ in range(repeat):
+            image = ImageProcessor.load_image(data, target_size=(224, 224), mode=mode)
+            ImageProcessor.preprocess(image, mode=mode)
+        timings[os.path.basename(path)] = 1000 * (time.perf_counter() - start) / repeat
+    sys.stdout = sys.__stdout__
+    
+    print(json.dumps({"mode": mode, "ms_per_image": timings, "peak_rss_mb": peak_rss_mb()}))
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB"""
+    # VmHWM belongs to the current address space; ru_maxrss on Linux also
+    # counts the parent's memory from before exec()
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per image")
+    parser.add_argument("--sizes", nargs="+", default=["1920x1080", "4032x3024"],
+                        help="Synthetic image sizes as WIDTHxHEIGHT")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("paths", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        run_worker(args.worker, args.paths, args.repeat)
+        return
+    
+    sizes = [tuple(int(v) for v in size.split("x")) for size in args.sizes]
+    with tempfile.TemporaryDirectory() as tmp:
+        failures = check_modes(tmp)
+        for failure in failures:
+            print(f"FAIL {failure}")
+        if failures:
+            sys.exit(1)
+        print(f"image modes {', '.join(UNREDUCIBLE_MODES)}: ok in every mode")
+        
+        paths = sorted(glob.glob(os.path.join(ROOT, "test_image", "*"))) + make_synthetic(tmp, sizes)
+        for mode in (ImageProcessor.QUALITY, ImageProcessor.FAST):
+            output = subprocess.run(
+                [sys.executable, __file__, "--worker", mode, "--repeat", str(args.repeat)] + paths,
+                check=True, capture_output=True, text=True
+            ).stdout
+            report = json.loads(output.strip().splitlines()[-1])
+            print(f"mode={report['mode']}  peak RSS={report['peak_rss_mb']:.1f} MB")
+            for name, ms in report["ms_per_image"].items():
+                print(f"  {name:<40} {ms:8.2f} ms/image")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+End-to-end benchmark of the classification pipeline against a mock inference server
+
+Every scenario starts a local MockInferenceServer with its own latency,
+failure rate and response format, then runs the real ImageProcessor and
+APIHandler code on the test_image/ screenshots plus generated photos in a
+separate worker process. For each stage (decode, preprocess, encode,
+classify and the whole pipeline) the report has p50/p95/p99 latency,
+throughput, CPU time and peak memory. Results are saved as JSON and can be
+compared with an earlier run to catch regressions.
+
+Usage:
+    python benchmarks/bench_e2e.py --repeat 3 -o benchmarks/results/baseline.json
+    python benchmarks/bench_e2e.py --scenarios baseline flaky --compare benchmarks/results/baseline.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import metrics  # noqa: E402
+from api_handler import APIHandler  # noqa: E402
+from bench_decode import make_synthetic, peak_rss_mb  # noqa: E402
+from image_processor import ImageProcessor  # noqa: E402
+from mock_server import MockInferenceServer  # noqa: E402
+from resilience import CircuitBreaker  # noqa: E402
+
+BENCH_TOKEN = "hf_benchmark_token"
+
+# Server behaviour per scenario (MockInferenceServer arguments)
+SCENARIOS = {
+    "baseline": {"latency": 0.005},
+    "slow": {"latency": 0.05, "latency_jitter": 0.05},
+    "flaky": {"latency": 0.005, "failure_rate": 0.1, "failure_status": 503},
+    "rate_limited": {"latency": 0.005, "failure_rate": 0.2, "failure_status": 429},
+    "single": {"latency": 0.005, "response_format": "single"},
+    "padded": {"latency": 0.005, "response_format": "padded"},
+    "full": {"latency": 0.005, "response_format": "full"}
+}
+
+STAGES = ("decode", "preprocess", "encode", "classify", "end_to_end")
+
+# Statistics compared between runs; higher is worse for all but throughput
+COMPARED = ("p50_ms", "p95_ms", "cpu_ms_per_item", "peak_rss_mb", "throughput_per_s")
+
+# Absolute changes below these are treated as noise
+NOISE_FLOOR = {"p50_ms": 0.2, "p95_ms": 0.5, "cpu_ms_per_item": 0.2, "peak_rss_mb": 2.0}
+
+
+class StageRecorder:
+    """
+    Collects wall time, CPU time and peak RSS of every pipeline stage
+    
+    Peak RSS is reset before each stage through /proc/self/clear_refs so that
+    every stage reports its own high-water mark, along with how far it rose
+    above the resident size at the start of the stage. Where resetting is not
+    supported the process-wide peak is reported for all stages.
+    """
+    
+    def __init__(self):
+        self.wall = {stage: [] for stage in STAGES}
+        self.cpu = {stage: 0.0 for stage in STAGES}
+        self.peak = {stage: 0.0 for stage in STAGES}
+        self.growth = {stage: 0.0 for stage in STAGES}
+        self.per_stage_peak = self._reset_peak()
+    
+    @staticmethod
+    def _reset_peak():
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+            return True
+        except OSError:
+            return False
+    
+    def run(self, stage, func, *args):
+        """Run one stage and record its cost"""
+        if self.per_stage_peak:
+            self._reset_peak()
+        rss_before = rss_mb()
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        result = func(*args)
+        self.wall[stage].append(time.perf_counter() - start)
+        self.cpu[stage] += time.process_time() - cpu_start
+        peak = peak_rss_mb()
+        self.peak[stage] = max(self.peak[stage], peak)
+        self.growth[stage] = max(self.growth[stage], peak - rss_before)
+        return result
+    
+    def summary(self):
+        """Per-stage statistics as plain data"""
+        report = {}
+        for stage in STAGES:
+            samples = np.array(self.wall[stage]) * 1000
+            if not len(samples):
+                continue
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+            report[stage] = {
+                "count": len(samples),
+                "mean_ms": float(samples.mean()),
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+                "throughput_per_s": float(len(samples) / (samples.sum() / 1000)),
+                "cpu_ms_per_item": 1000 * self.cpu[stage] / len(samples),
+                "peak_rss_mb": self.peak[stage],
+                "peak_growth_mb": self.growth[stage]
+            }
+        return report
+
+
+def rss_mb():
+    """Current resident memory of this process in MB"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+
+
+def run_worker(scenario, base_url, paths, repeat, mode, concurrency):
+    """Run the pipeline over every image and print the scenario report as JSON"""
+    random.seed(0)
+    blobs = [open(path, "rb").read() for path in paths]
+    handler = APIHandler(api_token=BENCH_TOKEN, api_base_url=base_url, coalesce=False,
+                         circuit_breaker=CircuitBreaker(failure_threshold=10, reset_timeout=0.1))
+    recorder = StageRecorder()
+    
+    # One untimed pass warms up imports, codecs and the connection pool
+    for data in blobs[:1]:
+        handler.classify_image(handler.encode(ImageProcessor.preprocess(ImageProcessor.load_image(data), mode=mode)))
+    metrics.registry.reset()
+    
+    errors = 0
+    payloads = []
+    for _ in range(repeat):
+        for data in blobs:
+            start = time.perf_counter()
+            cpu_start = time.process_time()
+            image = recorder.run("decode", ImageProcessor.load_image, data, (224, 224), mode)
+            processed = recorder.run("preprocess", ImageProcessor.preprocess, image, (224, 224), mode)
+            payload = recorder.run("encode", handler.encode, processed)
+            prediction = recorder.run("classify", handler.classify_image, payload)
+            recorder.wall["end_to_end"].append(time.perf_counter() - start)
+            recorder.cpu["end_to_end"] += time.process_time() - cpu_start
+            errors += isinstance(prediction, dict) and "error" in prediction
+            payloads.append(payload)
+    recorder.peak["end_to_end"] = max(recorder.peak.values())
+    recorder.growth["end_to_end"] = max(recorder.growth.values())
+    
+    # Concurrent throughput of the network stage alone
+    start = time.perf_counter()
+    results = handler.classify_many(payloads, max_concurrency=concurrency)
+    concurrent_rate = len(payloads) / (time.perf_counter() - start)
+    
+    counters = {}
+    for counter in metrics.registry.to_dict()["counters"]:
+        if counter["name"] in ("retries_total", "fallbacks_total"):
+            counters[counter["name"]] = counters.get(counter["name"], 0) + counter["value"]
+    
+    print(json.dumps({
+        "scenario": scenario,
+        "stages": recorder.summary(),
+        "per_stage_peak_rss": recorder.per_stage_peak,
+        "images": len(payloads),
+        "errors": errors,
+        "concurrent": {
+            "concurrency": concurrency,
+            "throughput_per_s": concurrent_rate,
+            "errors": sum(1 for r in results if isinstance(r, dict) and "error" in r)
+        },
+        "counters": counters,
+        "process_peak_rss_mb": peak_rss_mb()
+    }))
+
+
+def git_commit():
+    """Short hash of the checked-out commit, or None outside a git checkout"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, threshold):
+    """
+    Find statistics that got worse by more than `threshold` since the baseline
+    
+    Args:
+        current (dict): Report of this run
+        baseline (dict): Report of an earlier run
+        threshold (float): Allowed relative change, e.g. 0.15 for 15%
+    
+    Returns:
+        list: (scenario, stage, statistic, old, new) for every regression
+    """
+    regressions = []
+    for scenario, report in current["scenarios"].items():
+        old_report = baseline.get("scenarios", {}).get(scenario)
+        if old_report is None:
+            continue
+        for stage, stats in report["stages"].items():
+            old_stats = old_report["stages"].get(stage, {})
+            for name in COMPARED:
+                old, new = old_stats.get(name), stats.get(name)
+                if not old or new is None:
+                    continue
+                change = (old - new) / old if name == "throughput_per_s" else (new - old) / old
+                if change > threshold and abs(new - old) >= NOISE_FLOOR.get(name, 0.0):
+                    regressions.append((scenario, stage, name, old, new))
+    return regressions
+
+
+def print_report(report):
+    for scenario, result in report["scenarios"].items():
+        server = result["server"]
+        print(f"\n[{scenario}] {result['images']} images, {result['errors']} errors, "
+              f"retries={result['counters'].get('retries_total', 0)}, "
+              f"server statuses={server['status_counts']}, "
+              f"concurrent={result['concurrent']['throughput_per_s']:.1f} img/s")
+        print(f"  {'stage':<11} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'items/s':>9} "
+              f"{'cpu ms':>8} {'peak MB':>8} {'+MB':>6}")
+        for stage, stats in result["stages"].items():
+            print(f"  {stage:<11} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f} {stats['p99_ms']:9.2f} "
+                  f"{stats['throughput_per_s']:9.1f} {stats['cpu_ms_per_item']:8.2f} {stats['peak_rss_mb']:8.1f} {stats['peak_growth_mb']:6.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help="Scenarios to run")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the image set")
+    parser.add_argument("--sizes", nargs="+", default=["640x480", "1920x1080", "4032x3024"],
+                        help="Generated image sizes as WIDTHxHEIGHT")
+    parser.add_argument("--mode", choices=[ImageProcessor.QUALITY, ImageProcessor.FAST],
+                        default=ImageProcessor.QUALITY, help="Preprocessing mode")
+    parser.add_argument("--concurrency", type=int, default=8, help="Callers in the concurrent phase")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for the server's random failures")
+    parser.add_argument("-o", "--output", help="Write the JSON report to this file")
+    parser.add_argument("--compare", help="Earlier JSON report to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="Relative slowdown reported as a regression")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    parser.add_argument("paths", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        run_worker(args.worker, args.base_url, args.paths, args.repeat, args.mode, args.concurrency)
+        return 0
+    
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {"repeat": args.repeat, "sizes": args.sizes, "mode": args.mode,
+                     "concurrency": args.concurrency, "seed": args.seed},
+        "scenarios": {}
+    }
+    
+    sizes = [tuple(int(v) for v in size.split("x")) for size in args.sizes]
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = sorted(glob.glob(os.path.join(ROOT, "test_image", "*"))) + make_synthetic(tmp, sizes)
+        for scenario in args.scenarios:
+            # The server runs in this process so its CPU time and memory are
+            # not charged to the worker
+            with MockInferenceServer(seed=args.seed, **SCENARIOS[scenario]) as server:
+                output = subprocess.run(
+                    [sys.executable, __file__, "--worker", scenario, "--base-url", server.base_url,
+                     "--repeat", str(args.repeat), "--mode", args.mode,
+                     "--concurrency", str(args.concurrency)] + paths,
+                    check=True, capture_output=True, text=True
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                result["server"] = {"requests": server.requests_served,
+                                    "status_counts": server.status_counts,
+                                    "settings": SCENARIOS[scenario]}
+            report["scenarios"][scenario] = result
+    
+    print_report(report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved report to {args.output}")
+    
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        print(f"\nCompared with {args.compare} (commit {baseline.get('commit')}): "
+              f"{len(regressions)} regressions over {args.threshold:.0%}")
+        for scenario, stage, name, old, new in regressions:
+            print(f"  {scenario}/{stage} {name}: {old:.2f} -> {new:.2f}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
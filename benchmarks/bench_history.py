@@ -0,0 +1,152 @@
+"""
+Benchmark the prediction history store: request-path cost, write throughput and queries at scale
+
+Part one times HistoryStore.record() as the request path sees it and how
+fast the background writer persists rows. Part two bulk-loads --rows
+synthetic predictions (every image classified by each model) and times
+aggregate queries on a freshly opened store.
+
+Usage:
+    python benchmarks/bench_history.py --rows 20000000
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fruits import MEYVELER, MODELS, match_fruit  # noqa: E402
+from history_store import COLUMNS, STAGES, TOP_K, HistoryStore  # noqa: E402
+
+# Labels a model might return: fruits, sub-varieties and unrelated ImageNet classes
+LABELS = MEYVELER + ["Granny Smith", "custard apple", "fig", "jackfruit", "zucchini", "acorn squash",
+                     "broccoli", "cauliflower", "head cabbage", "mushroom", "bagel", "pizza", "plate",
+                     "grocery store", "tray", "bucket", "hamper", "wooden spoon", "honeycomb", "sea urchin"]
+
+
+def prediction(rng):
+    labels = rng.choice(LABELS, TOP_K, replace=False)
+    scores = np.sort(rng.dirichlet(np.ones(TOP_K)))[::-1]
+    return [{"label": str(label), "score": float(score)} for label, score in zip(labels, scores)]
+
+
+def bench_record(path, count):
+    rng = np.random.default_rng(0)
+    predictions = [prediction(rng) for _ in range(256)]
+    digests = [f"{int(v):016x}" + "0" * 48 for v in rng.integers(0, 2 ** 63, 256)]
+    models = list(MODELS.values())
+    store = HistoryStore(path, flush_interval=0.5)
+    timings = np.empty(count)
+    for i in range(count):
+        start = time.perf_counter()
+        store.record(digests[i % 256], models[i % len(models)], predictions[i % 256],
+                     timings={"lookup": 0.0002, "classify": 0.25, "total": 0.2502})
+        timings[i] = time.perf_counter() - start
+    start = time.perf_counter()
+    store.close()
+    drain = time.perf_counter() - start
+    stats = store.stats()
+    timings *= 1e6
+    print(f"record(): p50 {np.percentile(timings, 50):.2f} us  p99 {np.percentile(timings, 99):.2f} us  "
+          f"({count} calls, {count / timings.sum() * 1e6:,.0f} calls/s)")
+    print(f"background writer: {stats['rows']} rows in {stats['segments']} segments; "
+          f"final drain {drain * 1000:.0f} ms; {stats['bytes'] / stats['rows']:.1f} bytes/row on disk")
+    record = {"source": "x.jpg", "model_id": models[0], "predictions": predictions[0], "fruit": "mango",
+              "score": 0.5, "digest": digests[0], "timings_ms": {stage: 1.0 for stage in STAGES}}
+    print(f"  (the same row as JSONL would take ~{len(json.dumps(record))} bytes)")
+
+
+def bulk_load(path, rows, segment_rows, seed=0):
+    """Write `rows` synthetic predictions with append_columns; every image is seen by each model"""
+    rng = np.random.default_rng(seed)
+    store = HistoryStore(path, segment_rows=segment_rows)
+    models = [store.intern("model", model_id) for model_id in MODELS.values()]
+    labels = np.array([store.intern("label", label) for label in LABELS])
+    fruit_of_label = np.array([store.intern("fruit", match_fruit(label)) if match_fruit(label) else -1
+                               for label in LABELS])
+    start_time = time.time() - 365 * 24 * 3600
+    written = 0
+    while written < rows:
+        count = min(segment_rows, rows - written)
+        images = np.arange(written, written + count) // len(models)
+        top = rng.integers(0, len(LABELS), (count, TOP_K))
+        scores = np.sort(rng.dirichlet(np.ones(TOP_K), count), axis=1)[:, ::-1]
+        fruit = fruit_of_label[top[:, 0]]
+        store.append_columns({
+            "time": start_time + np.arange(written, written + count) * (365 * 24 * 3600 / rows),
+            "digest": images.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15),
+            "model": np.array(models)[np.arange(written, written + count) % len(models)],
+            "source": rng.integers(0, 3, count),
+            "fruit": fruit,
+            "fruit_score": np.where(fruit >= 0, scores[:, 0], 0),
+            "labels": labels[top],
+            "scores": scores,
+            "timings": rng.gamma(2.0, 60.0, (count, len(STAGES)))
+        })
+        written += count
+    store.close()
+    return start_time
+
+
+def timed(name, fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    preview = result if not isinstance(result, (dict, list)) else f"{len(result)} groups"
+    print(f"  {name:<44} {best * 1000:8.1f} ms  -> {preview}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000_000, help="Rows to bulk-load for the query test")
+    parser.add_argument("--records", type=int, default=200_000, help="record() calls for the write test")
+    parser.add_argument("--segment-rows", type=int, default=1 << 20, help="Rows per segment")
+    parser.add_argument("--dir", help="Keep the store in this directory instead of a temporary one")
+    args = parser.parse_args()
+    
+    workdir = args.dir or tempfile.mkdtemp(prefix="history_bench_")
+    try:
+        bench_record(os.path.join(workdir, "record"), args.records)
+        
+        path = os.path.join(workdir, "bulk")
+        start = time.perf_counter()
+        start_time = bulk_load(path, args.rows, args.segment_rows)
+        load = time.perf_counter() - start
+        store = HistoryStore(path)
+        stats = store.stats()
+        print(f"\nbulk load: {stats['rows']:,} rows in {load:.1f} s, {stats['segments']} segments, "
+              f"{stats['bytes'] / 2 ** 20:,.0f} MB ({stats['bytes'] / stats['rows']:.1f} bytes/row; "
+              f"{sum(np.dtype(d).itemsize * w for d, w in COLUMNS.values())} bytes of columns)")
+        
+        vit, resnet = MODELS["ViT Base"], MODELS["ResNet-50"]
+        month = (start_time + 180 * 24 * 3600, start_time + 210 * 24 * 3600)
+        print("queries (best of 3, fresh store, page cache warm):")
+        timed("count()", store.count)
+        timed("count(model=vit)", lambda: store.count(model=vit))
+        timed("count(model=vit, fruit=papaya)", lambda: store.count(model=vit, fruit="papaya"))
+        timed("count(fruit=mango, one month)", lambda: store.count(fruit="mango", since=month[0], until=month[1]))
+        timed("fruit_counts(model=vit)", lambda: store.fruit_counts(model=vit))
+        timed("model_fruit_counts()", store.model_fruit_counts)
+        timed("label_counts(model=vit, fruit=mango)", lambda: store.label_counts(model=vit, fruit="mango"))
+        timed("confusion(vit, resnet, one month)", lambda: store.confusion(vit, resnet, *month))
+        timed("confusion(vit, resnet) [all rows]", lambda: store.confusion(vit, resnet), repeat=1)
+        timed("rows(fruit=papaya, limit=20)", lambda: store.rows(fruit="papaya", limit=20))
+        confusion = store.confusion(vit, resnet)
+        print(f"  ViT said papaya where ResNet said mango: {confusion.get(('papaya', 'mango'), 0):,} images")
+        store.close()
+    finally:
+        if not args.dir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark label-to-fruit matching: original nested loops vs FruitMatcher
+
+Uses ImageNet labels from --labels (one per line), from a locally cached
+model config, or a generated stand-in list of 1000 labels.
+
+Usage:
+    python benchmarks/bench_matcher.py --predictions 2000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fruits import ALT_TURLER, MEYVELER, FruitMatcher  # noqa: E402
+
+# Words used to build stand-in labels when no ImageNet label list is available
+_WORDS = [
+    "tabby", "cat", "golden", "retriever", "sports", "car", "espresso", "maker", "bell",
+    "pepper", "head", "cabbage", "custard", "apple", "jackfruit", "fig", "hip", "acorn",
+    "wine", "bottle", "red", "wine", "lemon", "shark", "orange", "pomegranate", "strawberry",
+    "granny", "smith", "banana", "pineapple", "ananas", "corn", "ear", "mushroom", "dough",
+    "pretzel", "bagel", "trifle", "grocery", "store", "market", "tray", "plate", "pear"
+]
+
+
+def legacy_match(label):
+    """The original three-pass matching loop from app.py"""
+    label = label.lower()
+    for alt_tur, ana_meyve in ALT_TURLER.items():
+        if alt_tur in label:
+            return ana_meyve
+    for meyve in MEYVELER:
+        if meyve in label:
+            return meyve
+    for meyve in MEYVELER:
+        if label in meyve:
+            return meyve
+    return None
+
+
+def load_labels(path):
+    """ImageNet labels from a file, a cached model config, or a stand-in list"""
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    try:
+        from huggingface_hub import try_to_load_from_cache
+        config_path = try_to_load_from_cache("microsoft/resnet-50", "config.json")
+        if isinstance(config_path, str):
+            with open(config_path, encoding="utf-8") as f:
+                id2label = json.load(f)["id2label"]
+            return [id2label[str(i)] for i in range(len(id2label))]
+    except Exception:
+        pass
+    rng = random.Random(0)
+    return [", ".join(" ".join(rng.sample(_WORDS, rng.randint(1, 3))) for _ in range(rng.randint(1, 3)))
+            for _ in range(1000)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--labels", help="File with one label per line")
+    parser.add_argument("--predictions", type=int, default=2000,
+                        help="Prediction lists of top-5 labels to match")
+    args = parser.parse_args()
+    
+    labels = load_labels(args.labels)
+    rng = random.Random(1)
+    predictions = [rng.sample(labels, 5) for _ in range(args.predictions)]
+    
+    # Every label must match exactly as before
+    matcher = FruitMatcher()
+    mismatches = [label for label in labels if matcher.match(label) != legacy_match(label)]
+    print(f"{len(labels)} labels, {len(mismatches)} mismatches")
+    
+    timings = {}
+    for name, match in (("legacy", legacy_match), ("compiled (cold)", FruitMatcher().match),
+                        ("compiled (warm)", matcher.match)):
+        start = time.perf_counter()
+        for prediction in predictions:
+            for label in prediction:
+                match(label)
+        timings[name] = time.perf_counter() - start
+    
+    total = args.predictions * 5
+    for name, seconds in timings.items():
+        print(f"{name:>16}: {1e6 * seconds / total:7.2f} us/label  ({total / seconds:,.0f} labels/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Benchmark the near-duplicate index: lookup latency at scale and false reuse
+
+Part one fills a HammingIndex with up to 1M hashes and times lookups
+against a brute-force NumPy scan. Part two builds a set of distinct
+synthetic "fruit photos" plus the test_image/ screenshots, derives edited
+copies of each (recompression, small crops, brightness, resizing) and
+reports, for every distance threshold, how many copies reuse the right
+prediction and how often a different image would be reused by mistake.
+
+Usage:
+    python benchmarks/bench_near_duplicate.py --sizes 10000 100000 1000000 --scenes 200
+"""
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from image_processor import ImageProcessor  # noqa: E402
+from near_duplicate import HASHES, HammingIndex  # noqa: E402
+
+
+def bench_lookup(sizes, queries, max_distance, seed=0):
+    rng = np.random.default_rng(seed)
+    print(f"lookup latency (max distance {max_distance}, {queries} queries, half of them near a stored hash)")
+    for size in sizes:
+        hashes = rng.integers(0, 2 ** 63, size, dtype=np.uint64) | (rng.integers(0, 2, size, dtype=np.uint64) << np.uint64(63))
+        index = HammingIndex()
+        start = time.perf_counter()
+        index.add_many(hashes)
+        build = time.perf_counter() - start
+        
+        probes = []
+        for i in range(queries):
+            value = int(hashes[rng.integers(size)])
+            if i % 2:
+                for bit in rng.choice(64, rng.integers(1, max_distance + 1), replace=False):
+                    value ^= 1 << int(bit)
+            else:
+                value = int(rng.integers(0, 2 ** 63, dtype=np.uint64))
+            probes.append(value)
+        
+        timings = []
+        for value in probes:
+            start = time.perf_counter()
+            index.search(value, max_distance)
+            timings.append(time.perf_counter() - start)
+        scans = []
+        for value in probes[:20]:
+            start = time.perf_counter()
+            HammingIndex._distances(hashes, value).min()
+            scans.append(time.perf_counter() - start)
+        
+        timings = np.array(timings) * 1e6
+        print(f"  {size:>8} hashes: build {build:6.2f} s  lookup p50 {np.percentile(timings, 50):7.1f} us  "
+              f"p99 {np.percentile(timings, 99):7.1f} us  brute-force scan {np.mean(scans) * 1e6:9.1f} us")
+
+
+def synthetic_scene(rng, size=640):
+    """A random still life: coloured blobs on a textured background"""
+    background = tuple(int(v) for v in rng.integers(60, 230, 3))
+    image = Image.new("RGB", (size, size), background)
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.integers(1, 5)):
+        color = tuple(int(v) for v in rng.integers(0, 256, 3))
+        x, y = rng.integers(0, size, 2)
+        radius = int(rng.integers(size // 10, size // 3))
+        draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=color)
+    noise = rng.normal(0, 12, (size, size, 3))
+    pixels = np.clip(np.asarray(image, dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels).filter(ImageFilter.GaussianBlur(2))
+
+
+def edits(image, rng):
+    """Edited copies a user might upload again"""
+    width, height = image.size
+    copies = []
+    for quality in (40, 70):
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=quality)
+        copies.append(Image.open(buffer).convert("RGB"))
+    for fraction in (0.03, 0.08):
+        dx, dy = int(width * fraction), int(height * fraction)
+        copies.append(image.crop((dx, dy, width - dx // 2, height - dy // 2)))
+    copies.append(ImageEnhance.Brightness(image).enhance(float(rng.uniform(0.85, 1.15))))
+    copies.append(image.resize((width // 2, height // 2)).resize((width, height)))
+    return copies
+
+
+def bench_reuse(scenes, thresholds, seed=0):
+    rng = np.random.default_rng(seed)
+    originals = [ImageProcessor.load_image(path).convert("RGB")
+                 for path in sorted(glob.glob(os.path.join(ROOT, "test_image", "*")))]
+    originals += [synthetic_scene(rng) for _ in range(scenes)]
+    
+    def prepare(image):
+        return ImageProcessor.preprocess(image)
+    
+    for method, hash_image in HASHES.items():
+        start = time.perf_counter()
+        stored = np.array([hash_image(prepare(image)) for image in originals], dtype=np.uint64)
+        hash_ms = 1000 * (time.perf_counter() - start) / len(originals)
+        # Each edited copy should match its own original
+        copies = [(owner, hash_image(prepare(copy))) for owner, image in enumerate(originals)
+                  for copy in edits(image, rng)]
+        
+        print(f"\n{method}: {len(originals)} distinct images, {len(copies)} edited copies, "
+              f"{hash_ms:.2f} ms per hash (incl. preprocess)")
+        print(f"  {'distance':>8} {'reused':>8} {'false reuse':>12}")
+        for threshold in thresholds:
+            index = HammingIndex()
+            index.add_many(stored)
+            reused = wrong = 0
+            for owner, value in copies:
+                match = index.search(value, threshold)
+                if match is not None:
+                    if match[0] == owner:
+                        reused += 1
+                    else:
+                        wrong += 1
+            # A new, unrelated image must not reuse anything: leave-one-out over originals
+            false_new = 0
+            for position, value in enumerate(stored):
+                others = HammingIndex()
+                others.add_many(np.delete(stored, position))
+                false_new += others.search(int(value), threshold) is not None
+            print(f"  {threshold:>8} {reused / len(copies):8.1%} "
+                  f"{(wrong + false_new) / (len(copies) + len(stored)):12.2%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="Stored hashes for the latency test")
+    parser.add_argument("--queries", type=int, default=1000, help="Lookups per size")
+    parser.add_argument("--max-distance", type=int, default=6, help="Threshold for the latency test")
+    parser.add_argument("--scenes", type=int, default=200, help="Distinct synthetic images")
+    parser.add_argument("--thresholds", type=int, nargs="+", default=[2, 4, 6, 8, 10, 12],
+                        help="Distance thresholds for the reuse test")
+    args = parser.parse_args()
+    
+    bench_lookup(args.sizes, args.queries, args.max_distance)
+    bench_reuse(args.scenes, args.thresholds)
+
+
+if __name__ == "__main__":
+    main()
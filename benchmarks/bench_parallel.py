@@ -0,0 +1,92 @@
+"""
+Benchmark preprocessing throughput from 1 to N worker processes
+
+Compares the in-process cli.preprocess_stream with ParallelPreprocessor at
+each worker count, and checks that the source is never read more than
+max_pending images ahead of the consumer.
+
+Usage:
+    python benchmarks/bench_parallel.py --images 96 --max-workers 8
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_decode import make_synthetic  # noqa: E402
+from cli import preprocess_stream  # noqa: E402
+from image_processor import ImageProcessor  # noqa: E402
+from parallel_preprocess import ParallelPreprocessor  # noqa: E402
+
+
+class CountingSource:
+    """(name, read) entries that track how far reading runs ahead of consumption"""
+    
+    def __init__(self, blobs, total):
+        self.blobs = blobs
+        self.total = total
+        self.read_count = 0
+        self.max_ahead = 0
+    
+    def __iter__(self):
+        for index in range(self.total):
+            yield f"image_{index}", self._reader(index)
+    
+    def _reader(self, index):
+        def read():
+            self.read_count += 1
+            return self.blobs[index % len(self.blobs)]
+        return read
+    
+    def consumed(self, count):
+        self.max_ahead = max(self.max_ahead, self.read_count - count)
+
+
+def run(stream, source):
+    start = time.perf_counter()
+    count = 0
+    for _, image, error in stream:
+        if error:
+            raise RuntimeError(error)
+        count += 1
+        source.consumed(count)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=96, help="Images per run")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1, help="Largest pool size")
+    parser.add_argument("--sizes", nargs="+", default=["1920x1080"],
+                        help="Synthetic image sizes as WIDTHxHEIGHT, mixed with test_image/")
+    parser.add_argument("--mode", choices=[ImageProcessor.QUALITY, ImageProcessor.FAST],
+                        default=ImageProcessor.QUALITY, help="Preprocessing mode")
+    args = parser.parse_args()
+    
+    sizes = [tuple(int(v) for v in size.split("x")) for size in args.sizes]
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = sorted(glob.glob(os.path.join(ROOT, "test_image", "*"))) + make_synthetic(tmp, sizes)
+        blobs = [open(path, "rb").read() for path in paths]
+    
+    print(f"{args.images} images, mode={args.mode}, {os.cpu_count()} CPUs")
+    source = CountingSource(blobs, args.images)
+    serial = run(preprocess_stream(source, args.mode), source)
+    print(f"  in-process        {serial:7.1f} img/s")
+    
+    for workers in range(1, args.max_workers + 1):
+        source = CountingSource(blobs, args.images)
+        with ParallelPreprocessor(workers, mode=args.mode) as pool:
+            # Warm the pool up so process start-up is not measured
+            list(pool.map(CountingSource(blobs, workers)))
+            rate = run(pool.map(source), source)
+            print(f"  {workers:2d} worker(s)      {rate:7.1f} img/s  speedup {rate / serial:4.2f}x  "
+                  f"read ahead <= {source.max_ahead} (max_pending {pool.max_pending})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark requests/sec of APIHandler with and without connection pooling
+
+Usage:
+    python benchmarks/bench_pooling.py --requests 500 --threads 4
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_handler import APIHandler  # noqa: E402
+from mock_server import MockInferenceServer  # noqa: E402
+
+BENCH_TOKEN = "hf_benchmark_token"
+
+
+class _UnpooledSession:
+    """Session stand-in that opens a fresh connection for every request"""
+    
+    def post(self, url, **kwargs):
+        return requests.post(url, **kwargs)
+
+
+def run(handler, image, total, threads):
+    """Classify the image `total` times and return requests/sec"""
+    # Coalescing is disabled on the handlers so every call reaches the server
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda _: handler.classify_image(image), range(total)))
+    elapsed = time.perf_counter() - start
+    
+    errors = sum(1 for r in results if isinstance(r, dict) and "error" in r)
+    if errors:
+        print(f"  warning: {errors} requests failed")
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500, help="Requests per mode")
+    parser.add_argument("--threads", type=int, default=4, help="Concurrent callers")
+    args = parser.parse_args()
+    
+    image = Image.new("RGB", (224, 224), (120, 200, 80))
+    
+    with MockInferenceServer() as server:
+        modes = {
+            "unpooled": APIHandler(api_token=BENCH_TOKEN, api_base_url=server.base_url,
+                                   session=_UnpooledSession(), coalesce=False),
+            "pooled": APIHandler(api_token=BENCH_TOKEN, api_base_url=server.base_url,
+                                 pool_maxsize=args.threads, coalesce=False)
+        }
+        
+        for name, handler in modes.items():
+            server.connections.clear()
+            rate = run(handler, image, args.requests, args.threads)
+            print(f"{name:>9}: {rate:8.1f} req/s, {len(server.connections)} connections opened")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark multi-size preprocessing: one preprocess() per size vs preprocess_sizes()
+
+Usage:
+    python benchmarks/bench_pyramid.py --repeat 5 --sizes 1920x1080 4032x3024
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_decode import make_synthetic  # noqa: E402
+from image_processor import ImageProcessor  # noqa: E402
+
+# The sizes preprocess_standard_sizes() produces, minus the original
+STANDARD_SIZES = [(224, 224), (256, 256), (384, 384), (224, 224)]
+
+
+def per_size(image, sizes, mode):
+    """Old approach: a full preprocess() from the source for every size"""
+    return {size: ImageProcessor.preprocess(image, size, mode) for size in sizes}
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return 1000 * (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per image")
+    parser.add_argument("--sizes", nargs="+", default=["1920x1080", "4032x3024"],
+                        help="Synthetic image sizes as WIDTHxHEIGHT")
+    args = parser.parse_args()
+    
+    sizes = [tuple(int(v) for v in size.split("x")) for size in args.sizes]
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = sorted(glob.glob(os.path.join(ROOT, "test_image", "*"))) + make_synthetic(tmp, sizes)
+        images = {os.path.basename(path): ImageProcessor.load_image(path) for path in paths}
+    
+    for mode in (ImageProcessor.QUALITY, ImageProcessor.FAST):
+        print(f"mode={mode}")
+        for name, image in images.items():
+            old_ms, old = timed(lambda: per_size(image, STANDARD_SIZES, mode), args.repeat)
+            new_ms, new = timed(lambda: ImageProcessor.preprocess_sizes(image, STANDARD_SIZES, mode), args.repeat)
+            shared_ms, _ = timed(
+                lambda: ImageProcessor.preprocess_sizes(image, STANDARD_SIZES, mode, shared_buffer=True),
+                args.repeat
+            )
+            # Mean absolute pixel difference caused by resizing from a smaller level
+            diff = max(
+                np.abs(np.asarray(old[size], dtype=np.int16) - np.asarray(new[size], dtype=np.int16)).mean()
+                for size in new
+            )
+            print(f"  {name:<36} per-size {old_ms:8.2f} ms  pyramid {new_ms:8.2f} ms  "
+                  f"shared {shared_ms:8.2f} ms  speedup {old_ms / new_ms:4.1f}x  max mean diff {diff:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark time-to-first-result for a Streamlit-style rerun
+
+Compares building a fresh APIHandler (and re-reading env.example) on every
+rerun against reusing handlers and settings from the process-wide registry.
+
+Usage:
+    python benchmarks/bench_rerun.py --reruns 50
+"""
+import argparse
+import contextlib
+import os
+import statistics
+import sys
+import time
+
+import requests
+from dotenv import load_dotenv
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_handler import APIHandler  # noqa: E402
+from config import ENV_FILE, get_settings  # noqa: E402
+from handler_registry import get_handler, invalidate  # noqa: E402
+from mock_server import MockInferenceServer  # noqa: E402
+
+BENCH_TOKEN = "hf_benchmark_token"
+
+
+def fresh_rerun(base_url, image):
+    """What every rerun did before: reload settings, build handler and session"""
+    load_dotenv(ENV_FILE)
+    handler = APIHandler(model_id="bench/model", api_token=BENCH_TOKEN, api_base_url=base_url,
+                         session=requests.Session(), coalesce=False)
+    return handler.classify_image(image)
+
+
+def cached_rerun(base_url, image):
+    """Rerun with settings and handler taken from the process-wide registry"""
+    get_settings()
+    handler = get_handler("bench/model", api_token=BENCH_TOKEN, api_base_url=base_url, coalesce=False)
+    return handler.classify_image(image)
+
+
+def measure(rerun, base_url, reruns):
+    timings = []
+    for index in range(reruns):
+        # A different image each time so nothing is served from a cache
+        image = Image.new("RGB", (224, 224), (index % 256, 100, 50))
+        start = time.perf_counter()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            rerun(base_url, image)
+        timings.append(1000 * (time.perf_counter() - start))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--reruns", type=int, default=50, help="Reruns per mode")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated server latency (s)")
+    args = parser.parse_args()
+    
+    with MockInferenceServer(latency=args.latency) as server:
+        invalidate()
+        for name, rerun in (("fresh handler", fresh_rerun), ("registry", cached_rerun)):
+            timings = measure(rerun, server.base_url, args.reruns)
+            print(f"{name:>14}: first {timings[0]:7.2f} ms, "
+                  f"median rerun {statistics.median(timings[1:]):7.2f} ms, "
+                  f"connections {len(server.connections)}")
+            server.connections.clear()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Replay scripted failure sequences against APIHandler and check what it did
+
+Each scenario starts a fresh stub server and handler state, prints the
+number of upstream requests, the status codes served and the outcomes, and
+compares them, the breaker state and the minimum time spent backing off
+with what the retry policy should produce. The script exits non-zero if
+any scenario differs.
+
+Usage:
+    python benchmarks/bench_retry.py
+"""
+import contextlib
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_handler import APIHandler  # noqa: E402
+from mock_server import MockInferenceServer  # noqa: E402
+from resilience import CircuitBreaker, RetryPolicy  # noqa: E402
+from strategy_registry import StrategyRegistry  # noqa: E402
+
+BENCH_TOKEN = "hf_benchmark_token"
+
+# (name, server options, calls to make, expected outcome). Outcomes are "ok"
+# or the start of the error message; min_elapsed is the least time the
+# backoff must take (503 hints 0.05 s, 429 sends Retry-After: 0.05, plain
+# backoff waits at least half of 0.01 s doubled per retry)
+SCENARIOS = [
+    ("cold start: 503 twice, then ready", {"script": [503, 503]}, 1,
+     {"statuses": {503: 2, 200: 1}, "outcomes": ["ok"], "breaker": "closed", "min_elapsed": 0.1}),
+    ("rate limited: 429 with Retry-After", {"script": [429]}, 1,
+     {"statuses": {429: 1, 200: 1}, "outcomes": ["ok"], "breaker": "closed", "min_elapsed": 0.05}),
+    ("server error outlasting retries", {"script": [500] * 4}, 1,
+     {"statuses": {500: 4}, "outcomes": ["error: API Error"], "breaker": "closed", "min_elapsed": 0.035}),
+    ("permanent 400 on binary, form accepted", {"accept": {"form"}}, 1,
+     {"statuses": {400: 3, 200: 1}, "outcomes": ["ok"], "breaker": "closed", "min_elapsed": 0.0}),
+    ("breaker opens after repeated cold starts", {"script": [503] * 20}, 4,
+     {"statuses": {503: 8}, "outcomes": ["error: API Error"] * 2 + ["error: Model bench/model is temporarily"] * 2,
+      "breaker": "open", "min_elapsed": 0.3})
+]
+
+
+def run_scenario(name, options, calls, expected):
+    """
+    Run one scenario
+    
+    Returns:
+        tuple: (report lines, list of differences from the expected outcome)
+    """
+    image = Image.new("RGB", (224, 224), (200, 40, 40))
+    with MockInferenceServer(**options) as server:
+        handler = APIHandler(
+            model_id="bench/model", api_token=BENCH_TOKEN, api_base_url=server.base_url,
+            strategy_registry=StrategyRegistry(),
+            retry_policy=RetryPolicy(max_retries=3, base_delay=0.01, max_delay=0.2),
+            circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=5.0)
+        )
+        start = time.perf_counter()
+        outcomes = []
+        for _ in range(calls):
+            result = handler.classify_image(image)
+            outcomes.append("error: " + result["error"][:70] if isinstance(result, dict) else "ok")
+        elapsed = time.perf_counter() - start
+    
+    lines = [
+        name,
+        f"  requests={server.requests_served} statuses={server.status_counts} "
+        f"elapsed={elapsed * 1000:.0f} ms breaker={handler.circuit_breaker.state}"
+    ]
+    lines += [f"  -> {outcome}" for outcome in outcomes]
+    
+    problems = []
+    if dict(server.status_counts) != expected["statuses"]:
+        problems.append(f"statuses {dict(server.status_counts)}, expected {expected['statuses']}")
+    if server.requests_served != sum(expected["statuses"].values()):
+        problems.append(f"{server.requests_served} requests, expected {sum(expected['statuses'].values())}")
+    if len(outcomes) != len(expected["outcomes"]) or \
+            not all(outcome.startswith(prefix) for outcome, prefix in zip(outcomes, expected["outcomes"])):
+        problems.append(f"outcomes {outcomes}, expected {expected['outcomes']}")
+    if handler.circuit_breaker.state != expected["breaker"]:
+        problems.append(f"breaker {handler.circuit_breaker.state}, expected {expected['breaker']}")
+    if elapsed < expected["min_elapsed"]:
+        problems.append(f"took {elapsed * 1000:.0f} ms, backoff needs at least {expected['min_elapsed'] * 1000:.0f} ms")
+    return lines, problems
+
+
+def main():
+    failed = 0
+    for name, options, calls, expected in SCENARIOS:
+        # Silence the handler's progress prints while the scenario runs
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            lines, problems = run_scenario(name, options, calls, expected)
+        print("\n".join(lines))
+        for problem in problems:
+            print(f"  FAIL {problem}")
+        failed += bool(problems)
+    print(f"\n{len(SCENARIOS) - failed}/{len(SCENARIOS)} scenarios behaved as expected")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark interactive tail latency under bulk pressure, with and without RequestScheduler
+
+A bulk job floods the mock server while an interactive client sends one
+request every --interactive-every seconds. Both share an upstream quota
+of --in-flight concurrent requests (the pooled session blocks beyond it).
+Without the scheduler, interactive requests queue behind bulk ones for a
+connection. With it, they jump the queue and bulk work cannot use the
+reserved slots. Shedding and per-model rate limiting are measured in
+separate runs.
+
+Usage:
+    python benchmarks/bench_scheduler.py --latency 0.1 --bulk 2000 --in-flight 16
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import metrics  # noqa: E402
+from api_handler import APIHandler  # noqa: E402
+from mock_server import MockInferenceServer  # noqa: E402
+from resilience import CircuitBreaker  # noqa: E402
+from scheduler import BULK, INTERACTIVE, SHED, RequestScheduler  # noqa: E402
+
+BENCH_TOKEN = "hf_benchmark_token"
+
+
+def make_handler(base_url, in_flight):
+    handler = APIHandler(api_token=BENCH_TOKEN, api_base_url=base_url, coalesce=False,
+                         pool_maxsize=in_flight, circuit_breaker=CircuitBreaker())
+    payload = handler.encode(Image.new("RGB", (224, 224), (120, 200, 80)))
+    return handler, payload
+
+
+def interactive_client(classify, every, stop):
+    """Send one request every `every` seconds until `stop` is set; returns latencies"""
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        classify()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(max(0.0, every - (time.perf_counter() - start)))
+    return latencies
+
+
+def report(name, latencies, bulk_done, elapsed, extra=""):
+    samples = np.array(latencies) * 1000
+    p50, p99, worst = np.percentile(samples, [50, 99, 100])
+    print(f"  {name:<18} interactive n={len(samples):<4} p50 {p50:7.1f} ms  p99 {p99:7.1f} ms  "
+          f"max {worst:7.1f} ms  bulk {bulk_done / elapsed:6.1f} req/s{extra}")
+
+
+def run_direct(base_url, args):
+    """Bulk threads and interactive calls go straight to APIHandler"""
+    handler, payload = make_handler(base_url, args.in_flight)
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as interactive:
+        future = interactive.submit(interactive_client, lambda: handler.classify_image(payload),
+                                    args.interactive_every, stop)
+        start = time.perf_counter()
+        handler.classify_many([payload] * args.bulk, max_concurrency=args.bulk_threads)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        report("direct", future.result(), args.bulk, elapsed)
+
+
+def run_scheduled(base_url, args):
+    """Both clients go through one RequestScheduler with the same in-flight quota"""
+    handler, payload = make_handler(base_url, args.in_flight)
+    metrics.registry.reset()
+    stop = threading.Event()
+    with RequestScheduler(max_in_flight=args.in_flight, interactive_reserve=args.reserve,
+                          max_batch_size=args.batch_size, max_queue_depth=args.bulk) as scheduler:
+        with ThreadPoolExecutor(max_workers=1) as interactive:
+            future = interactive.submit(interactive_client,
+                                        lambda: scheduler.classify(handler, payload, INTERACTIVE),
+                                        args.interactive_every, stop)
+            start = time.perf_counter()
+            bulk = [scheduler.submit(handler, payload, BULK, defer=60.0) for _ in range(args.bulk)]
+            for item in bulk:
+                item.result()
+            elapsed = time.perf_counter() - start
+            stop.set()
+            latencies = future.result()
+        stats = scheduler.stats()
+    waits = {name: f"{ms:.1f}" for name, ms in stats["mean_queue_wait_ms"].items()}
+    report("scheduler", latencies, args.bulk, elapsed,
+           f"  batches {stats['batches']} fill {stats['batch_fill_ratio']:.0%} mean queue wait ms {waits}")
+
+
+def run_shedding(base_url, args):
+    """Bulk submits without deferring into a short queue; the excess is shed"""
+    handler, payload = make_handler(base_url, args.in_flight)
+    depth = args.in_flight * 4
+    with RequestScheduler(max_in_flight=args.in_flight, interactive_reserve=args.reserve,
+                          max_queue_depth=depth) as scheduler:
+        start = time.perf_counter()
+        bulk = [scheduler.submit(handler, payload, BULK) for _ in range(args.bulk)]
+        submit_ms = (time.perf_counter() - start) * 1000
+        interactive = scheduler.classify(handler, payload, INTERACTIVE)
+        results = [item.result() for item in bulk]
+    shed = sum(1 for r in results if isinstance(r, dict) and r.get("status") == SHED)
+    print(f"  queue depth {depth}: {args.bulk} bulk submitted in {submit_ms:.1f} ms, {shed} shed "
+          f"({len(results) - shed} served); interactive during overload "
+          f"{'served' if isinstance(interactive, list) else interactive}")
+
+
+def run_rate_limit(base_url, args):
+    """A per-model token bucket caps bulk throughput below the in-flight quota"""
+    handler, payload = make_handler(base_url, args.in_flight)
+    count = int(args.rate * 3)
+    with RequestScheduler(max_in_flight=args.in_flight, interactive_reserve=args.reserve,
+                          max_queue_depth=count, rate_limits={handler.model_id: (args.rate, 1)}) as scheduler:
+        start = time.perf_counter()
+        for item in [scheduler.submit(handler, payload, BULK) for _ in range(count)]:
+            item.result()
+        elapsed = time.perf_counter() - start
+    print(f"  limit {args.rate:.0f} req/s: {count} requests took {elapsed:.2f} s "
+          f"-> {count / elapsed:.1f} req/s achieved")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.1, help="Simulated server latency")
+    parser.add_argument("--bulk", type=int, default=2000, help="Bulk requests per run")
+    parser.add_argument("--bulk-threads", type=int, default=64,
+                        help="Threads of the direct bulk client (more than --in-flight, like a busy CLI)")
+    parser.add_argument("--in-flight", type=int, default=16, help="Upstream concurrency quota")
+    parser.add_argument("--reserve", type=int, default=2, help="Slots reserved for interactive requests")
+    parser.add_argument("--batch-size", type=int, default=8, help="Scheduler micro-batch size")
+    parser.add_argument("--interactive-every", type=float, default=0.05, help="Seconds between interactive requests")
+    parser.add_argument("--rate", type=float, default=40.0, help="Per-model rate limit for the rate-limit run")
+    args = parser.parse_args()
+    
+    with MockInferenceServer(latency=args.latency) as server:
+        print(f"server latency {args.latency * 1000:.0f} ms, quota {args.in_flight} in flight, "
+              f"{args.bulk} bulk requests, interactive every {args.interactive_every * 1000:.0f} ms")
+        run_direct(server.base_url, args)
+        run_scheduled(server.base_url, args)
+        print("load shedding")
+        run_shedding(server.base_url, args)
+        print("rate limiting")
+        run_rate_limit(server.base_url, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Check import-time startup cost of the entry points against a budget
+
+Each entry module is imported in a fresh interpreter under
+`python -X importtime`; the median cumulative import time over several
+runs is compared with benchmarks/startup_budget.json. The budget also lists
+heavy modules an entry point must not load at import (they are imported
+lazily on first use). Exits with status 1 when any budget is exceeded, so
+it can guard against regressions before scaling out short-lived workers.
+
+Usage:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --repeats 9 --update
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_FILE = os.path.join(ROOT, "benchmarks", "startup_budget.json")
+
+# Prints which of the given modules were actually imported; lazy stand-ins
+# from lazy_import() stay out of sys.modules until first use
+PROBE = """
+import sys
+import {module}
+print(",".join(name for name in {watch!r} if name in sys.modules))
+"""
+
+
+def measure(module, watch):
+    """Import `module` once in a fresh interpreter; returns (import ms, wall ms, loaded heavy modules)"""
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE.format(module=module, watch=watch)],
+                          cwd=ROOT, capture_output=True, text=True)
+    wall = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    cumulative = None
+    for line in proc.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module and not parts[2].startswith("  "):
+            cumulative = int(parts[1]) / 1000
+    loaded = [name for name in proc.stdout.strip().split(",") if name]
+    return cumulative, wall, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget", default=BUDGET_FILE, help="Budget JSON file")
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument("--update", action="store_true",
+                        help="Rewrite the time budgets as the measured medians times --headroom")
+    parser.add_argument("--headroom", type=float, default=2.0, help="Budget multiplier used by --update")
+    args = parser.parse_args()
+    
+    with open(args.budget, encoding="utf-8") as f:
+        budget = json.load(f)
+    watch = budget["heavy_modules"]
+    
+    print(f"{'entry point':<20} {'import ms':>10} {'budget':>8} {'process ms':>11}  heavy modules loaded")
+    failures = []
+    for module, limits in budget["entry_points"].items():
+        samples = [measure(module, watch) for _ in range(args.repeats)]
+        import_ms = statistics.median(sample[0] for sample in samples)
+        wall_ms = statistics.median(sample[1] for sample in samples)
+        loaded = samples[-1][2]
+        forbidden = sorted(set(loaded) & set(limits.get("forbid", [])))
+        if args.update:
+            limits["max_import_ms"] = round(import_ms * args.headroom)
+        over = import_ms > limits["max_import_ms"]
+        if over:
+            failures.append(f"{module}: {import_ms:.1f} ms > {limits['max_import_ms']} ms")
+        if forbidden:
+            failures.append(f"{module}: loads {', '.join(forbidden)} at import")
+        flag = " OVER" if over or forbidden else ""
+        print(f"{module:<20} {import_ms:10.1f} {limits['max_import_ms']:8} {wall_ms:11.1f}  "
+              f"{', '.join(loaded) or '-'}{flag}")
+    
+    if args.update:
+        with open(args.budget, "w", encoding="utf-8") as f:
+            json.dump(budget, f, indent=2)
+            f.write("\n")
+        print(f"budget written to {args.budget}")
+        return 0
+    if failures:
+        print("\nstartup budget exceeded:\n  " + "\n  ".join(failures))
+        return 1
+    print("\nall entry points within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
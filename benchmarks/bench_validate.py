@@ -0,0 +1,95 @@
+"""
+Benchmark ImageProcessor.load_image against the old open/verify/load path
+
+Measures how long valid, malformed and oversized uploads take to be decoded
+or rejected, including PNG decompression bombs that are a few hundred KB on
+disk but decode to hundreds of MB.
+
+Usage:
+    python benchmarks/bench_validate.py --repeat 5
+"""
+import argparse
+import glob
+import io
+import os
+import struct
+import sys
+import tempfile
+import time
+import warnings
+import zlib
+
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_decode import make_synthetic  # noqa: E402
+from image_processor import ImageProcessor, InvalidImageError  # noqa: E402
+
+
+def png_bomb(width, height):
+    """Build a valid grayscale PNG of zeros that compresses to almost nothing"""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    
+    compressor = zlib.compressobj(9)
+    row = b"\0" * (width + 1)  # filter byte + pixels
+    idat = b"".join(compressor.compress(row) for _ in range(height)) + compressor.flush()
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", idat) + chunk(b"IEND", b"")
+
+
+def legacy_load(data):
+    """Open, verify() and then reopen and decode, as the processor used to"""
+    image = Image.open(io.BytesIO(data))
+    image.verify()
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+
+def measure(func, data, repeat):
+    """Return (ms per call, outcome) for a loader"""
+    outcome = "decoded"
+    start = time.perf_counter()
+    for _ in range(repeat):
+        try:
+            func(data)
+        except InvalidImageError:
+            outcome = "rejected"
+        except Exception as e:
+            outcome = f"failed ({type(e).__name__})"
+    return 1000 * (time.perf_counter() - start) / repeat, outcome
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case")
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        photo = open(make_synthetic(tmp, [(4032, 3024)])[0], "rb").read()
+    screenshot = open(sorted(glob.glob(os.path.join(ROOT, "test_image", "*")))[0], "rb").read()
+    
+    cases = {
+        "screenshot (PNG)": screenshot,
+        "photo 4032x3024 (JPEG)": photo,
+        "random bytes (1 MB)": os.urandom(1024 * 1024),
+        "truncated JPEG": photo[:len(photo) // 2],
+        "PNG bomb 20000x4000": png_bomb(20000, 4000),
+        "PNG bomb 12000x12000": png_bomb(12000, 12000)
+    }
+    
+    # The legacy path would warn about the larger bomb and decode it anyway
+    warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+    print(f"{'case':<24} {'size':>9} {'legacy ms':>10} {'legacy':>26} {'load_image ms':>14} {'load_image':>10}")
+    for name, data in cases.items():
+        legacy_ms, legacy_outcome = measure(legacy_load, data, args.repeat)
+        new_ms, new_outcome = measure(ImageProcessor.load_image, data, args.repeat)
+        print(f"{name:<24} {len(data) // 1024:>6} KB {legacy_ms:10.3f} {legacy_outcome:>26} "
+              f"{new_ms:14.3f} {new_outcome:>10}")
+
+
+if __name__ == "__main__":
+    main()
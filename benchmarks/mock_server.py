@@ -0,0 +1,203 @@
+"""
+Local stub of the Hugging Face Inference API used by the benchmarks
+"""
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Response returned for every classification request
+DEFAULT_PREDICTIONS = [
+    {"label": "Granny Smith", "score": 0.82},
+    {"label": "orange", "score": 0.07},
+    {"label": "banana", "score": 0.04},
+    {"label": "lemon", "score": 0.02},
+    {"label": "pomegranate", "score": 0.01}
+]
+
+# Bodies and headers the real API sends with common failures
+DEFAULT_FAILURES = {
+    400: ({"error": "Bad request: could not read the image"}, {}),
+    429: ({"error": "Rate limit reached. Please slow down."}, {"Retry-After": "0.05"}),
+    500: ({"error": "Internal server error"}, {}),
+    503: ({"error": "Model microsoft/resnet-50 is currently loading", "estimated_time": 0.05}, {})
+}
+
+
+# Shapes of successful responses the real API has been seen to return
+RESPONSE_FORMATS = ("list", "single", "padded", "full")
+
+
+def format_predictions(predictions, response_format):
+    """
+    Shape a prediction list like one of the API's response variants
+    
+    Args:
+        predictions (list): [{"label", "score"}] best first
+        response_format (str): "list" (as is), "single" (top result as a bare
+            dict), "padded" (mixed with malformed items) or "full" (a
+            1000-class score list, as ImageNet models return without top_k)
+    
+    Returns:
+        list or dict: Response body
+    """
+    if response_format == "list":
+        return predictions
+    if response_format == "single":
+        return predictions[0]
+    if response_format == "padded":
+        return [{"label": None, "score": 0.0}, "unexpected"] + list(predictions) + [{"score": 0.0}]
+    if response_format == "full":
+        rest = [{"label": f"class_{index}", "score": 1e-6} for index in range(1000 - len(predictions))]
+        return list(predictions) + rest
+    raise ValueError(f"Unknown response format: {response_format}")
+
+
+class _InferenceHandler(BaseHTTPRequestHandler):
+    """Request handler answering POSTs with scripted failures or predictions"""
+    
+    # HTTP/1.1 so clients can keep connections alive
+    protocol_version = "HTTP/1.1"
+    # Avoid Nagle/delayed-ACK stalls on kept-alive connections
+    disable_nagle_algorithm = True
+    
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length:
+            self.rfile.read(length)
+        self.server.count_request(self)
+        latency = self.server.request_latency()
+        if latency:
+            time.sleep(latency)
+        
+        status, payload, headers = self.server.next_response(self.headers.get("Content-Type", ""))
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+
+class MockInferenceServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server that mimics the inference endpoint on localhost
+    """
+    
+    daemon_threads = True
+    # Room for thousands of simultaneous connects from concurrency benchmarks
+    request_queue_size = 4096
+    
+    def __init__(self, host="127.0.0.1", port=0, predictions=None, latency=0.0, script=None,
+                 accept=None, failure_rate=0.0, failure_status=503, response_format="list",
+                 latency_jitter=0.0, seed=0):
+        """
+        Create the server
+        
+        Args:
+            host (str): Interface to bind
+            port (int): Port to bind, 0 picks a free port
+            predictions (list): Predictions returned for every successful request
+            latency (float): Seconds of simulated inference time per request
+            script (list): Responses for the next requests, in order; each entry is a
+                status code or a (status, body, headers) tuple. Once the script is
+                used up, requests succeed.
+            accept (set): Payload kinds the model accepts ("binary", "json", "form");
+                others get a 400. None accepts everything.
+            failure_rate (float): Probability (0-1) that an unscripted request fails
+            failure_status (int): Status code of those random failures
+            response_format (str): Shape of successful responses, see format_predictions
+            latency_jitter (float): Extra random latency of up to this many seconds
+            seed (int): Seed for random failures and jitter, so runs are repeatable
+        """
+        if response_format not in RESPONSE_FORMATS:
+            raise ValueError(f"Unknown response format: {response_format}")
+        super().__init__((host, port), _InferenceHandler)
+        self.predictions = predictions or DEFAULT_PREDICTIONS
+        self.latency = latency
+        self.accept = accept
+        self.script = deque(script or [])
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.response_format = response_format
+        self.latency_jitter = latency_jitter
+        self._random = random.Random(seed)
+        self.requests_served = 0
+        self.status_counts = {}
+        self.connections = set()
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    @property
+    def base_url(self):
+        """Base URL to pass to APIHandler as api_base_url"""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/models"
+    
+    def count_request(self, handler):
+        """Record a served request and the client connection it arrived on"""
+        with self._lock:
+            self.requests_served += 1
+            self.connections.add(handler.client_address)
+    
+    def request_latency(self):
+        """Simulated inference time of the next request"""
+        if not self.latency_jitter:
+            return self.latency
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.latency_jitter)
+    
+    def next_response(self, content_type):
+        """
+        Pick the response for the next request
+        
+        Args:
+            content_type (str): Content-Type header of the request
+            
+        Returns:
+            tuple: (status, body, headers)
+        """
+        with self._lock:
+            entry = self.script.popleft() if self.script else None
+            failed = entry is None and self.failure_rate and self._random.random() < self.failure_rate
+        
+        if failed:
+            entry = self.failure_status
+        elif entry is None:
+            kind = "json" if "json" in content_type else "form" if "multipart" in content_type else "binary"
+            entry = 200 if self.accept is None or kind in self.accept else 400
+        if isinstance(entry, int):
+            if entry == 200:
+                entry = (200, format_predictions(self.predictions, self.response_format), {})
+            else:
+                body, headers = DEFAULT_FAILURES.get(entry, ({"error": f"HTTP {entry}"}, {}))
+                entry = (entry, body, headers)
+        
+        with self._lock:
+            self.status_counts[entry[0]] = self.status_counts.get(entry[0], 0) + 1
+        return entry
+    
+    def start(self):
+        """Serve requests on a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        """Stop serving and close the socket"""
+        self.shutdown()
+        self.server_close()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,274 @@
+"""
+Command-line fruit classifier for bulk offline jobs
+
+Usage:
+    python cli.py test_image/ -o results.jsonl
+    python cli.py "photos/*.jpg" -o results.jsonl --model "ViT Base" --concurrency 8
+    python cli.py shelf_photos.tar.gz -o results.jsonl
+"""
+import argparse
+import glob
+import itertools
+import json
+import os
+import sys
+import tarfile
+import time
+
+import metrics
+from api_handler import APIHandler, DEFAULT_API_BASE_URL
+from fruits import MODELS, match_fruit, turkish_name
+from image_processor import ImageProcessor, InvalidImageError
+from history_store import HistoryStore
+from near_duplicate import NearDuplicateCache
+from parallel_preprocess import ParallelPreprocessor
+from scheduler import BULK, RequestScheduler
+
+# File extensions picked up when walking directories and archives
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+# Number of predictions written per image
+TOP_K = 5
+
+
+def _is_image(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def iter_sources(source):
+    """
+    Lazily list the images of a directory, tar archive or glob pattern
+
+    Args:
+        source (str): Directory path, .tar/.tar.gz/.tgz file or glob pattern
+
+    Yields:
+        tuple: (name, read) where read() returns the raw image bytes
+    """
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for filename in sorted(files):
+                if _is_image(filename):
+                    path = os.path.join(root, filename)
+                    yield path, lambda path=path: _read_file(path)
+    elif os.path.isfile(source) and tarfile.is_tarfile(source):
+        # Stream mode reads members sequentially without loading the index,
+        # so each member must be read before moving on to the next one
+        with tarfile.open(source, mode="r|*") as archive:
+            for member in archive:
+                if member.isfile() and _is_image(member.name):
+                    data = archive.extractfile(member).read()
+                    yield f"{source}:{member.name}", lambda data=data: data
+    else:
+        for path in sorted(glob.iglob(source, recursive=True)):
+            if os.path.isfile(path) and _is_image(path):
+                yield path, lambda path=path: _read_file(path)
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def load_done(output_path):
+    """
+    Collect the sources already classified successfully in an output file
+
+    Args:
+        output_path (str): JSONL output file
+
+    Returns:
+        set: Source names to skip
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line from an interrupted run
+                continue
+            if "error" not in record:
+                done.add(record["source"])
+    return done
+
+
+def preprocess_stream(entries, mode=ImageProcessor.QUALITY):
+    """
+    Decode and preprocess images one at a time
+
+    Args:
+        entries (iterable): (name, read) pairs from iter_sources
+        mode (str): ImageProcessor.QUALITY or ImageProcessor.FAST
+
+    Yields:
+        tuple: (name, preprocessed PIL.Image or None, error message or None)
+    """
+    for name, read in entries:
+        try:
+            with metrics.span("read"):
+                data = read()
+            # Validate and decode in one pass; fast mode decodes at reduced scale
+            image = ImageProcessor.load_image(data, target_size=(224, 224), mode=mode)
+            yield name, ImageProcessor.preprocess(image, mode=mode), None
+        except InvalidImageError as e:
+            yield name, None, f"Invalid image: {str(e)}"
+        except Exception as e:
+            yield name, None, f"Preprocessing failed: {str(e)}"
+
+
+def build_record(name, model_id, prediction):
+    """
+    Turn a prediction into an output record with the best fruit match
+
+    Args:
+        name (str): Source name of the image
+        model_id (str): Model used for classification
+        prediction (list or dict): Result of APIHandler.classify_image
+
+    Returns:
+        dict: JSON-serializable record
+    """
+    record = {"source": name, "model_id": model_id}
+    if isinstance(prediction, dict) and "error" in prediction:
+        record["error"] = prediction["error"]
+        return record
+
+    record["predictions"] = prediction[:TOP_K]
+    for result in prediction:
+        fruit = match_fruit(result["label"])
+        if fruit:
+            record["fruit"] = fruit
+            record["fruit_tr"] = turkish_name(fruit)
+            record["score"] = result.get("score", 0)
+            break
+    return record
+
+
+def classify_stream(preprocessed, handler, concurrency, scheduler=None):
+    """
+    Classify preprocessed images in bounded chunks
+
+    Only one chunk of `concurrency` images is held in memory at a time.
+
+    Args:
+        preprocessed (iterable): Output of preprocess_stream
+        handler (APIHandler): Handler used for classification
+        concurrency (int): Images classified in parallel
+        scheduler (RequestScheduler): Send images as bulk requests through this
+            scheduler instead of calling the handler directly
+
+    Yields:
+        dict: Output record for each image, in input order
+    """
+    while True:
+        chunk = list(itertools.islice(preprocessed, concurrency))
+        if not chunk:
+            return
+
+        valid = [image for _, image, error in chunk if error is None]
+        if scheduler is not None:
+            # Wait for queue space rather than dropping images of the job
+            futures = [scheduler.submit(handler, image, BULK, defer=60.0) for image in valid]
+            predictions = (future.result() for future in futures)
+        else:
+            predictions = iter(handler.classify_many(valid, max_concurrency=concurrency))
+        for name, image, error in chunk:
+            if error is not None:
+                yield {"source": name, "model_id": handler.model_id, "error": error}
+            else:
+                yield build_record(name, handler.model_id, next(predictions))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify fruit images in bulk and write JSONL results")
+    parser.add_argument("source", help="Directory, tar archive or glob pattern of images")
+    parser.add_argument("-o", "--output", required=True, help="JSONL file to append results to")
+    parser.add_argument("-m", "--model", default="ResNet-50",
+                        help="Model name from the app's list or a Hugging Face model ID")
+    parser.add_argument("--api-base-url", default=DEFAULT_API_BASE_URL, help="Inference API base URL")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="Requests in flight")
+    parser.add_argument("--mode", choices=[ImageProcessor.QUALITY, ImageProcessor.FAST],
+                        default=ImageProcessor.QUALITY,
+                        help="Preprocessing mode; fast decodes large JPEGs at reduced scale")
+    parser.add_argument("-w", "--workers", type=int, default=0,
+                        help="Preprocess in this many worker processes (0 = in this process)")
+    parser.add_argument("--near-duplicates", type=int, metavar="DISTANCE",
+                        help="Reuse the prediction of an earlier image whose perceptual hash is "
+                             "within DISTANCE bits (6 is a safe value)")
+    parser.add_argument("--history", metavar="DIR",
+                        help="Also append every prediction to the history store in this directory")
+    parser.add_argument("--rate", type=float,
+                        help="Limit requests to the model to this many per second")
+    parser.add_argument("--progress-every", type=int, default=25,
+                        help="Report progress every N images")
+    parser.add_argument("--metrics-json", help="Write per-stage latency metrics to this JSON file at the end")
+    parser.add_argument("--debug", action="store_true", help="Print per-request debug messages")
+    args = parser.parse_args(argv)
+    if args.debug:
+        metrics.set_debug(True)
+
+    model_id = MODELS.get(args.model, args.model)
+    near_duplicates = None if args.near_duplicates is None else NearDuplicateCache(args.near_duplicates)
+    history = HistoryStore(args.history) if args.history else None
+    handler = APIHandler(model_id=model_id, api_base_url=args.api_base_url,
+                         pool_maxsize=max(args.concurrency, 10), near_duplicates=near_duplicates,
+                         history=history)
+    if not handler.is_configured():
+        print("API token is not configured correctly", file=sys.stderr)
+        return 2
+
+    # Resume: skip sources already classified in a previous run
+    done = load_done(args.output)
+    skipped = 0
+
+    def pending():
+        nonlocal skipped
+        for name, read in iter_sources(args.source):
+            if name in done:
+                skipped += 1
+                continue
+            yield name, read
+
+    processed = errors = 0
+    start = time.perf_counter()
+    pool = ParallelPreprocessor(args.workers, mode=args.mode) if args.workers > 0 else None
+    scheduler = None
+    if args.rate is not None:
+        scheduler = RequestScheduler(max_in_flight=args.concurrency, interactive_reserve=0,
+                                     max_queue_depth=max(args.concurrency, 256), default_rate=args.rate)
+    preprocessed = pool.map(pending()) if pool else preprocess_stream(pending(), args.mode)
+    try:
+        with open(args.output, "a", encoding="utf-8") as out:
+            records = classify_stream(preprocessed, handler, args.concurrency, scheduler)
+            for record in records:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                processed += 1
+                errors += "error" in record
+                if processed % args.progress_every == 0:
+                    rate = processed / (time.perf_counter() - start)
+                    print(f"processed={processed} skipped={skipped} errors={errors} rate={rate:.1f} img/s",
+                          file=sys.stderr)
+    finally:
+        if pool:
+            pool.close()
+        if scheduler:
+            scheduler.close()
+        if history is not None:
+            history.close()
+
+    elapsed = time.perf_counter() - start
+    rate = processed / elapsed if elapsed else 0.0
+    print(f"done: processed={processed} skipped={skipped} errors={errors} "
+          f"elapsed={elapsed:.1f}s rate={rate:.1f} img/s", file=sys.stderr)
+    if args.metrics_json:
+        metrics.registry.to_json(args.metrics_json)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,44 @@
+import os
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+# File the settings are loaded from (see README)
+ENV_FILE = 'env.example'
+
+
+class Settings:
+    """
+    Application settings read from the environment
+    """
+    
+    def __init__(self, api_token):
+        """
+        Args:
+            api_token (str): Hugging Face API token, empty if not set
+        """
+        self.api_token = api_token
+
+
+@lru_cache(maxsize=None)
+def get_settings():
+    """
+    Load the settings once per process
+    
+    Returns:
+        Settings: Cached settings; call reload_settings() after editing the env file
+    """
+    load_dotenv(ENV_FILE)
+    return Settings(api_token=os.getenv("HUGGINGFACE_API_TOKEN", ""))
+
+
+def reload_settings():
+    """
+    Re-read the env file on next access
+    
+    Returns:
+        Settings: Freshly loaded settings
+    """
+    get_settings.cache_clear()
+    load_dotenv(ENV_FILE, override=True)
+    return get_settings()
@@ -0,0 +1,89 @@
+import io
+import base64
+
+# Pillow format names and MIME types for the supported payload encodings
+SUPPORTED_FORMATS = {
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+    "WEBP": "image/webp"
+}
+
+# File extensions used when the payload is sent as a form upload
+FILE_EXTENSIONS = {
+    "JPEG": "jpg",
+    "PNG": "png",
+    "WEBP": "webp"
+}
+
+
+class EncodedImage:
+    """
+    An image encoded once and shared by every upload strategy
+    """
+    
+    def __init__(self, data, image_format="JPEG"):
+        """
+        Wrap already encoded image bytes
+        
+        Args:
+            data (bytes): Encoded image bytes
+            image_format (str): Format of the data (JPEG, PNG or WEBP)
+        """
+        self.data = data
+        self.format = image_format.upper()
+        self._base64 = None
+    
+    @classmethod
+    def from_image(cls, image, image_format="JPEG", quality=75, subsampling=None):
+        """
+        Encode a PIL image
+        
+        Args:
+            image (PIL.Image): The preprocessed image to encode
+            image_format (str): Target format (JPEG, PNG or WEBP)
+            quality (int): Encoder quality for JPEG and WebP (1-100)
+            subsampling (int): JPEG chroma subsampling (0=4:4:4, 1=4:2:2, 2=4:2:0, None=encoder default)
+            
+        Returns:
+            EncodedImage: The encoded payload
+        """
+        image_format = image_format.upper()
+        if image_format not in SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        
+        save_args = {}
+        if image_format == "JPEG":
+            save_args = {"quality": quality}
+            if subsampling is not None:
+                save_args["subsampling"] = subsampling
+        elif image_format == "WEBP":
+            save_args = {"quality": quality}
+        
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, **save_args)
+        return cls(buffer.getvalue(), image_format)
+    
+    @property
+    def base64(self):
+        """Base64 text of the encoded bytes, computed on first access"""
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.data).decode('utf-8')
+        return self._base64
+    
+    @property
+    def view(self):
+        """Zero-copy view of the encoded bytes"""
+        return memoryview(self.data)
+    
+    @property
+    def mime_type(self):
+        """MIME type of the encoded bytes"""
+        return SUPPORTED_FORMATS[self.format]
+    
+    @property
+    def filename(self):
+        """File name used for multipart form uploads"""
+        return f"image.{FILE_EXTENSIONS[self.format]}"
+    
+    def __len__(self):
+        return len(self.data)
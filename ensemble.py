@@ -0,0 +1,239 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from api_handler import APIHandler
+from fruits import match_fruit
+from image_processor import ImageProcessor
+
+
+def fruit_scores(prediction):
+    """
+    Collapse a prediction list into the best score of each matched fruit
+    
+    Args:
+        prediction (list): Results of APIHandler.classify_image
+    
+    Returns:
+        dict: Fruit name -> highest score among its labels
+    """
+    scores = {}
+    for result in prediction:
+        label = result.get("label")
+        if label is None:
+            continue
+        fruit = match_fruit(label)
+        if fruit and result.get("score", 0) > scores.get(fruit, -1):
+            scores[fruit] = result.get("score", 0)
+    return scores
+
+
+class EnsembleClassifier:
+    """
+    Sends one image to several models at once and merges their fruit scores
+    """
+    
+    VOTE = "vote"
+    AVERAGE = "average"
+    
+    def __init__(self, model_ids, api_token=None, weights=None, method=VOTE, min_agreement=None,
+                 latency_budget=None, latency_history=100, input_sizes=None, **handler_kwargs):
+        """
+        Initialize the ensemble
+        
+        Args:
+            model_ids (list): Hugging Face model IDs to query
+            api_token (str): Hugging Face API token
+            weights (dict): Model ID -> weight, 1.0 for models not listed
+            method (str): "vote" (weighted vote on each model's top fruit) or
+                "average" (weighted average of fruit scores)
+            min_agreement (int): Return as soon as this many models agree on the top fruit
+            latency_budget (float): Seconds to wait before ignoring models that have not answered
+            latency_history (int): Latencies remembered per model for latency_report()
+            input_sizes (dict): Model ID -> input size as (width, height). When set,
+                classify_image() takes the original image and resizes it for each
+                model in one pass; otherwise every model gets the same image
+            **handler_kwargs: Extra APIHandler arguments shared by every model
+        """
+        if method not in (self.VOTE, self.AVERAGE):
+            raise ValueError(f"Unknown ensemble method: {method}")
+        
+        self.model_ids = list(model_ids)
+        self.weights = weights or {}
+        self.method = method
+        self.min_agreement = min_agreement
+        self.latency_budget = latency_budget
+        self.input_sizes = input_sizes
+        self.handlers = {
+            model_id: APIHandler(model_id=model_id, api_token=api_token, **handler_kwargs)
+            for model_id in self.model_ids
+        }
+        
+        self._latencies = {model_id: deque(maxlen=latency_history) for model_id in self.model_ids}
+        self._timeouts = {model_id: 0 for model_id in self.model_ids}
+        self._stats_lock = threading.Lock()
+    
+    def is_configured(self):
+        """Check that every model handler is configured"""
+        return all(handler.is_configured() for handler in self.handlers.values())
+    
+    def classify_image(self, image):
+        """
+        Classify an image with every model concurrently
+        
+        Args:
+            image (PIL.Image): The image to classify, preprocessed unless input_sizes is set
+        
+        Returns:
+            dict: "fruits" (merged [{"fruit", "score", "models"}] best first),
+                "models" (per-model status, latency and top fruit) and
+                "early_exit" (True if stragglers were ignored)
+        """
+        payloads = self._encode(image)
+        
+        start = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=len(self.handlers))
+        futures = {
+            executor.submit(self._timed_classify, handler, payloads[model_id]): model_id
+            for model_id, handler in self.handlers.items()
+        }
+        
+        answers = {}
+        pending = set(futures)
+        early_exit = False
+        try:
+            while pending:
+                timeout = None
+                if self.latency_budget is not None:
+                    timeout = max(0.0, self.latency_budget - (time.perf_counter() - start))
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    early_exit = True
+                    break
+                for future in done:
+                    answers[futures[future]] = future.result()
+                if pending and self._enough_agreement(answers):
+                    early_exit = True
+                    break
+        finally:
+            # Do not wait for stragglers; their results are discarded
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+        
+        models = {}
+        for model_id in self.model_ids:
+            if model_id in answers:
+                prediction, latency = answers[model_id]
+                self._record_latency(model_id, latency)
+                if isinstance(prediction, dict) and "error" in prediction:
+                    models[model_id] = {"status": "error", "latency": latency, "error": prediction["error"]}
+                else:
+                    scores = fruit_scores(prediction)
+                    models[model_id] = {
+                        "status": "ok",
+                        "latency": latency,
+                        "scores": scores,
+                        "top_fruit": max(scores, key=scores.get) if scores else None
+                    }
+            else:
+                self._record_timeout(model_id)
+                models[model_id] = {"status": "skipped", "latency": time.perf_counter() - start}
+        
+        return {"fruits": self._merge(models), "models": models, "early_exit": early_exit}
+    
+    def _encode(self, image):
+        """Encode the image once per distinct model input and share the payloads"""
+        encoder = next(iter(self.handlers.values()))
+        if not self.input_sizes:
+            payload = encoder.encode(image)
+            return {model_id: payload for model_id in self.model_ids}
+        
+        variants = ImageProcessor.preprocess_for_models(
+            image, {model_id: self.input_sizes.get(model_id, image.size) for model_id in self.model_ids}
+        )
+        encoded = {}
+        payloads = {}
+        for model_id, variant in variants.items():
+            if id(variant) not in encoded:
+                encoded[id(variant)] = encoder.encode(variant)
+            payloads[model_id] = encoded[id(variant)]
+        return payloads
+    
+    @staticmethod
+    def _timed_classify(handler, payload):
+        start = time.perf_counter()
+        try:
+            prediction = handler.classify_image(payload)
+        except Exception as e:
+            prediction = {"error": f"Classification failed: {str(e)}"}
+        return prediction, time.perf_counter() - start
+    
+    def _enough_agreement(self, answers):
+        """True if at least min_agreement models share the same top fruit"""
+        if not self.min_agreement:
+            return False
+        votes = {}
+        for prediction, _ in answers.values():
+            if isinstance(prediction, dict) and "error" in prediction:
+                continue
+            scores = fruit_scores(prediction)
+            if scores:
+                top = max(scores, key=scores.get)
+                votes[top] = votes.get(top, 0) + 1
+        return any(count >= self.min_agreement for count in votes.values())
+    
+    def _merge(self, models):
+        """Combine per-model fruit scores into one ranked list"""
+        answered = {model_id: info for model_id, info in models.items() if info["status"] == "ok"}
+        total_weight = sum(self.weights.get(model_id, 1.0) for model_id in answered)
+        if not total_weight:
+            return []
+        
+        merged = {}
+        supporters = {}
+        for model_id, info in answered.items():
+            weight = self.weights.get(model_id, 1.0)
+            if self.method == self.VOTE:
+                if info["top_fruit"] is not None:
+                    fruit = info["top_fruit"]
+                    merged[fruit] = merged.get(fruit, 0.0) + weight
+                    supporters.setdefault(fruit, []).append(model_id)
+            else:
+                for fruit, score in info["scores"].items():
+                    merged[fruit] = merged.get(fruit, 0.0) + weight * score
+                    supporters.setdefault(fruit, []).append(model_id)
+        
+        ranked = sorted(merged.items(), key=lambda item: item[1], reverse=True)
+        return [
+            {"fruit": fruit, "score": score / total_weight, "models": supporters[fruit]}
+            for fruit, score in ranked
+        ]
+    
+    def _record_latency(self, model_id, latency):
+        with self._stats_lock:
+            self._latencies[model_id].append(latency)
+    
+    def _record_timeout(self, model_id):
+        with self._stats_lock:
+            self._timeouts[model_id] += 1
+    
+    def latency_report(self):
+        """
+        Get recent latency statistics per model
+        
+        Returns:
+            dict: Model ID -> answered count, skipped count, mean/p50/p95 latency in seconds
+        """
+        report = {}
+        with self._stats_lock:
+            for model_id in self.model_ids:
+                latencies = sorted(self._latencies[model_id])
+                entry = {"answered": len(latencies), "skipped": self._timeouts[model_id]}
+                if latencies:
+                    entry["mean"] = sum(latencies) / len(latencies)
+                    entry["p50"] = latencies[len(latencies) // 2]
+                    entry["p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+                report[model_id] = entry
+        return report
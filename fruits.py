@@ -0,0 +1,164 @@
+# Kullanılabilecek modeller, meyve listesi ve etiket-meyve eşleştirmesi.
+# Streamlit arayüzü ve komut satırı aracı tarafından ortak kullanılır.
+import re
+
+# Kullanılabilecek modeller listesi
+MODELS = {
+    "ResNet-50": "microsoft/resnet-50",
+    "ViT Base": "google/vit-base-patch16-224",
+    "DeiT Base": "facebook/deit-base-distilled-patch16-224",
+    "ConvNeXT": "facebook/convnext-base-224-22k-1k",
+    "CLIP": "openai/clip-vit-base-patch32"
+}
+
+# Meyve listesi - model bu meyveleri tanıyabilir
+MEYVELER = [
+    "apple", "apricot", "avocado", "banana", "bell pepper", "blackberry", "blueberry", 
+    "cantaloupe", "cherry", "coconut", "cucumber", "grape", "grapefruit", "kiwi", 
+    "lemon", "lime", "mango", "orange", "papaya", "peach", "pear", "pineapple", 
+    "plum", "pomegranate", "raspberry", "strawberry", "tomato", "watermelon"
+]
+
+# Meyve alt-türleri için eşleştirme tablosu
+ALT_TURLER = {
+    # Elma türleri
+    "granny smith": "apple", 
+    "red delicious": "apple",
+    "golden delicious": "apple",
+    "honeycrisp": "apple",
+    "mcintosh": "apple",
+    "braeburn": "apple",
+    "gala": "apple",
+    "pink lady": "apple",
+    "fuji": "apple",
+    # Portakal türleri
+    "mandarin": "orange",
+    "tangerine": "orange",
+    "clementine": "orange",
+    "satsuma": "orange",
+    # Üzüm türleri
+    "wine": "grape",
+    "raisin": "grape",
+    "sultana": "grape"
+}
+
+# Meyve Türkçe isim çevirileri
+MEYVE_CEVIRILERI = {
+    "apple": "Elma", "apricot": "Kayısı", "avocado": "Avokado", "banana": "Muz",
+    "bell pepper": "Biber", "blackberry": "Böğürtlen", "blueberry": "Yaban Mersini",
+    "cantaloupe": "Kavun", "cherry": "Kiraz", "coconut": "Hindistan Cevizi",
+    "cucumber": "Salatalık", "grape": "Üzüm", "grapefruit": "Greyfurt",
+    "kiwi": "Kivi", "lemon": "Limon", "lime": "Misket Limonu", "mango": "Mango",
+    "orange": "Portakal", "papaya": "Papaya", "peach": "Şeftali", "pear": "Armut",
+    "pineapple": "Ananas", "plum": "Erik", "pomegranate": "Nar", "raspberry": "Ahududu",
+    "strawberry": "Çilek", "tomato": "Domates", "watermelon": "Karpuz"
+}
+
+
+class FruitMatcher:
+    """
+    Etiketleri önceden derlenmiş bir indeks ile meyvelere eşler
+    
+    Sonuçlar eski üç aşamalı döngüyle aynıdır: önce alt türler (ALT_TURLER
+    sırasıyla), sonra etiket içinde geçen meyve adları (MEYVELER sırasıyla),
+    en son da etiketin kendisi bir meyve adının parçasıysa o meyve.
+    """
+    
+    def __init__(self, fruits=None, subtypes=None, cache_size=65536):
+        """
+        İndeksi oluşturur
+        
+        Args:
+            fruits (list): Meyve adları, öncelik sırasıyla
+            subtypes (dict): Alt tür adı -> meyve eşleştirmesi, öncelik sırasıyla
+            cache_size (int): Hatırlanacak en fazla etiket sayısı
+        """
+        fruits = MEYVELER if fruits is None else fruits
+        subtypes = ALT_TURLER if subtypes is None else subtypes
+        
+        # 1. ve 2. aşama: her ada (öncelik, meyve) ata; alt türler önce gelir
+        priority = {}
+        for rank, (name, fruit) in enumerate(subtypes.items()):
+            priority.setdefault(name, (rank, fruit))
+        for rank, fruit in enumerate(fruits):
+            priority.setdefault(fruit, (len(subtypes) + rank, fruit))
+        
+        # Tek bir birleşik regex: ileriye bakış her konumda oradan başlayan en
+        # uzun adı yakalar; aynı konumdan başlayan daha kısa adlar onun önekidir
+        names = sorted(priority, key=len, reverse=True)
+        self._pattern = re.compile("(?=(" + "|".join(re.escape(name) for name in names) + "))")
+        self._best_prefix = {
+            name: min(priority[other] for other in priority if name.startswith(other))
+            for name in priority
+        }
+        
+        # 3. aşama: bir meyve adının her alt dizesi -> ilk sıradaki meyve
+        self._substrings = {}
+        for fruit in fruits:
+            for start in range(len(fruit) + 1):
+                for end in range(start, len(fruit) + 1):
+                    self._substrings.setdefault(fruit[start:end], fruit)
+        
+        self._cache = {}
+        self._cache_size = cache_size
+    
+    def match(self, label):
+        """
+        Bir model etiketini meyve adına eşler
+        
+        Args:
+            label (str): Modelin döndürdüğü etiket
+            
+        Returns:
+            str: Eşleşen meyvenin İngilizce adı, eşleşme yoksa None
+        """
+        try:
+            return self._cache[label]
+        except KeyError:
+            pass
+        
+        fruit = self._match(label.lower())
+        if len(self._cache) >= self._cache_size:
+            self._cache.clear()
+        self._cache[label] = fruit
+        return fruit
+    
+    def _match(self, label):
+        best = None
+        for found in self._pattern.finditer(label):
+            candidate = self._best_prefix[found.group(1)]
+            if best is None or candidate < best:
+                best = candidate
+        if best is not None:
+            return best[1]
+        return self._substrings.get(label)
+
+
+# Varsayılan eşleştirici; uygulama ve komut satırı aracı tarafından paylaşılır
+default_matcher = FruitMatcher()
+
+
+def match_fruit(label):
+    """
+    Bir model etiketini meyve adına eşler
+    
+    Args:
+        label (str): Modelin döndürdüğü etiket
+        
+    Returns:
+        str: Eşleşen meyvenin İngilizce adı, eşleşme yoksa None
+    """
+    return default_matcher.match(label)
+
+
+def turkish_name(fruit):
+    """
+    Meyvenin Türkçe adını döndürür
+    
+    Args:
+        fruit (str): Meyvenin İngilizce adı
+        
+    Returns:
+        str: Türkçe ad
+    """
+    return MEYVE_CEVIRILERI.get(fruit, fruit.capitalize())
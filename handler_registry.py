@@ -0,0 +1,206 @@
+import threading
+import time
+
+from api_handler import APIHandler, get_session
+from strategy_registry import default_registry
+from metrics import debug
+
+# Input size assumed when a model's preprocessing config cannot be read
+DEFAULT_INPUT_SIZE = (224, 224)
+
+# Raw file URL of a model repository on the Hugging Face Hub
+HUB_FILE_URL = "https://huggingface.co/{model_id}/resolve/main/{filename}"
+
+# Seconds to wait before asking the Hub again after a failed metadata fetch
+MODEL_INFO_RETRY_AFTER = 60.0
+
+# Process-wide handlers and model metadata, reused across Streamlit reruns
+_HANDLERS = {}
+_MODEL_INFO = {}
+_MODEL_INFO_FETCHING = set()
+_MODEL_INFO_FAILED = {}
+_LOCK = threading.Lock()
+
+
+class ModelInfo:
+    """
+    Metadata about a model that does not change between requests
+    """
+    
+    def __init__(self, model_id, labels=None, input_size=DEFAULT_INPUT_SIZE):
+        """
+        Args:
+            model_id (str): The Hugging Face model ID
+            labels (list): Class labels of the model, None if unknown
+            input_size (tuple): Input size as (width, height)
+        """
+        self.model_id = model_id
+        self.labels = labels
+        self.input_size = input_size
+    
+    @property
+    def preferred_strategy(self):
+        """Upload strategy currently known to work for the model, or None"""
+        return default_registry.preferred(self.model_id)
+
+
+def _cache_key(model_id, api_token, options):
+    """Build a hashable key; unhashable option values are keyed by identity"""
+    items = []
+    for name, value in sorted(options.items()):
+        try:
+            hash(value)
+        except TypeError:
+            value = ("id", id(value))
+        items.append((name, value))
+    return (model_id, api_token, tuple(items))
+
+
+def get_handler(model_id, api_token=None, **options):
+    """
+    Get the shared APIHandler for a model, creating it on first use
+    
+    Args:
+        model_id (str): The Hugging Face model ID
+        api_token (str): Hugging Face API token, None to use the configured one
+        **options: Other APIHandler arguments; different values get separate handlers
+    
+    Returns:
+        APIHandler: Handler reused by every caller with the same arguments
+    """
+    key = _cache_key(model_id, api_token, options)
+    with _LOCK:
+        handler = _HANDLERS.get(key)
+        if handler is None:
+            handler = APIHandler(model_id=model_id, api_token=api_token, **options)
+            _HANDLERS[key] = handler
+        return handler
+
+
+def _fetch_json(model_id, filename, timeout):
+    """
+    Download a JSON file from the model repository
+    
+    Returns:
+        dict: The parsed file, None if the repository has no such file
+    
+    Raises:
+        Exception: If the Hub could not be reached or did not answer properly
+    """
+    response = get_session().get(HUB_FILE_URL.format(model_id=model_id, filename=filename), timeout=timeout)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
+
+
+def _input_size(preprocessor_config):
+    """Read the model input size from a preprocessor config"""
+    size = preprocessor_config.get("crop_size") or preprocessor_config.get("size")
+    if isinstance(size, int):
+        return (size, size)
+    if isinstance(size, dict):
+        if "width" in size and "height" in size:
+            return (size["width"], size["height"])
+        if "shortest_edge" in size:
+            return (size["shortest_edge"], size["shortest_edge"])
+    return DEFAULT_INPUT_SIZE
+
+
+def _fetch_model_info(model_id, timeout):
+    """Read labels and input size from the Hub and cache them; None if the Hub failed"""
+    try:
+        config = _fetch_json(model_id, "config.json", timeout)
+        preprocessor_config = _fetch_json(model_id, "preprocessor_config.json", timeout)
+    except Exception as e:
+        debug(f"Could not fetch model info for {model_id}: {str(e)}")
+        with _LOCK:
+            _MODEL_INFO_FAILED[model_id] = time.monotonic()
+        return None
+    
+    labels = None
+    if config and isinstance(config.get("id2label"), dict):
+        id2label = config["id2label"]
+        labels = [id2label[key] for key in sorted(id2label, key=int)]
+    input_size = _input_size(preprocessor_config) if preprocessor_config else DEFAULT_INPUT_SIZE
+    
+    info = ModelInfo(model_id, labels=labels, input_size=input_size)
+    with _LOCK:
+        _MODEL_INFO_FAILED.pop(model_id, None)
+        return _MODEL_INFO.setdefault(model_id, info)
+
+
+def get_model_info(model_id, timeout=(3.0, 10.0)):
+    """
+    Get metadata for a model, fetching it from the Hub until it succeeds once
+    
+    Blocks on the Hub; UI code should use peek_model_info() instead.
+    
+    Args:
+        model_id (str): The Hugging Face model ID
+        timeout (tuple): (connect, read) timeouts for the Hub requests
+    
+    Returns:
+        ModelInfo: Labels and input size; defaults when the Hub is unreachable,
+            which are not cached so the next call asks again
+    """
+    with _LOCK:
+        info = _MODEL_INFO.get(model_id)
+    if info is not None:
+        return info
+    return _fetch_model_info(model_id, timeout) or ModelInfo(model_id)
+
+
+def peek_model_info(model_id, fetch=True, timeout=(3.0, 10.0)):
+    """
+    Get metadata for a model without waiting for the Hub
+    
+    Args:
+        model_id (str): The Hugging Face model ID
+        fetch (bool): Start a background fetch when the metadata is not cached yet;
+            False for models that never talk to the Hub, such as local backends
+        timeout (tuple): (connect, read) timeouts for the Hub requests
+    
+    Returns:
+        ModelInfo: Cached metadata, or defaults until a fetch has succeeded
+    """
+    with _LOCK:
+        info = _MODEL_INFO.get(model_id)
+        if info is not None:
+            return info
+        failed = _MODEL_INFO_FAILED.get(model_id)
+        start = (fetch and model_id not in _MODEL_INFO_FETCHING
+                 and (failed is None or time.monotonic() - failed >= MODEL_INFO_RETRY_AFTER))
+        if start:
+            _MODEL_INFO_FETCHING.add(model_id)
+    
+    if start:
+        def run():
+            try:
+                _fetch_model_info(model_id, timeout)
+            finally:
+                with _LOCK:
+                    _MODEL_INFO_FETCHING.discard(model_id)
+        
+        threading.Thread(target=run, name=f"model-info-{model_id}", daemon=True).start()
+    return ModelInfo(model_id)
+
+
+def invalidate(model_id=None):
+    """
+    Drop cached handlers and metadata so they are rebuilt on next use
+    
+    Args:
+        model_id (str): Model to invalidate, None for all models
+    """
+    with _LOCK:
+        if model_id is None:
+            _HANDLERS.clear()
+            _MODEL_INFO.clear()
+            _MODEL_INFO_FAILED.clear()
+        else:
+            for key in [key for key in _HANDLERS if key[0] == model_id]:
+                del _HANDLERS[key]
+            _MODEL_INFO.pop(model_id, None)
+            _MODEL_INFO_FAILED.pop(model_id, None)
+    default_registry.invalidate(model_id)
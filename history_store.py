@@ -0,0 +1,688 @@
+import atexit
+import json
+import os
+import shutil
+import threading
+import time
+
+import metrics
+from fruits import match_fruit
+from lazy_import import lazy_import
+from metrics import debug
+
+np = lazy_import("numpy")
+
+# Where a prediction came from
+UPSTREAM = 0
+EXACT_CACHE = 1
+NEAR_DUPLICATE = 2
+SOURCES = {UPSTREAM: "upstream", EXACT_CACHE: "cache", NEAR_DUPLICATE: "near_duplicate"}
+
+# Per-stage timings stored with every row, in milliseconds
+STAGES = ("lookup", "classify", "total")
+
+# Labels and scores kept per prediction
+TOP_K = 5
+
+# Column name -> (dtype, values per row)
+COLUMNS = {
+    "time": ("float64", 1),
+    "digest": ("uint64", 1),
+    "model": ("uint16", 1),
+    "source": ("uint8", 1),
+    "fruit": ("int16", 1),
+    "fruit_score": ("float16", 1),
+    "labels": ("int32", TOP_K),
+    "scores": ("float16", TOP_K),
+    "timings": ("float32", len(STAGES))
+}
+
+# Interned string tables
+KINDS = ("model", "label", "fruit")
+
+
+def digest_id(digest):
+    """
+    Shorten a hex content digest to the 64-bit ID stored per row
+    
+    Args:
+        digest (str): Hex digest, e.g. from prediction_cache.image_digest
+    
+    Returns:
+        int: First 64 bits of the digest
+    """
+    return int(digest[:16], 16)
+
+
+class _Segment:
+    """An immutable run of rows stored as one .npy file per column"""
+    
+    def __init__(self, path, zone):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.start, self.end = (int(part) for part in self.name.split("-"))
+        self.zone = zone
+        self._columns = {}
+    
+    @property
+    def rows(self):
+        return self.zone["rows"]
+    
+    def column(self, name):
+        """Memory-mapped column, opened on first use"""
+        array = self._columns.get(name)
+        if array is None:
+            array = self._columns[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return array
+    
+    def span(self, since, until):
+        """Row range [lo, hi) with since <= time < until; times are sorted within a segment"""
+        lo, hi = 0, self.rows
+        if since is not None and since > self.zone["time_min"]:
+            lo = int(np.searchsorted(self.column("time"), since, side="left"))
+        if until is not None and until <= self.zone["time_max"]:
+            hi = int(np.searchsorted(self.column("time"), until, side="left"))
+        return lo, hi
+
+
+class HistoryStore:
+    """
+    Append-only, columnar history of predictions
+    
+    Rows (time, image digest, model, source, top-k label IDs and scores,
+    matched fruit and per-stage timings) are buffered by record() and
+    written by a background thread in immutable segments, one NumPy file
+    per column, with model, label and fruit names interned to small
+    integers. Each segment keeps a zone map (time range and row counts per
+    model and fruit) and its rows are sorted by time, so queries skip
+    segments that cannot match, answer whole-segment counts from the zone
+    map and binary-search time ranges. Segments also index the latest row
+    of each image per model, so confusion() merges small sorted runs
+    instead of sorting every row. Small segments are merged as the history
+    grows.
+    
+    Rows still buffered are not visible to queries until the next flush.
+    They are written by close(), which also runs at interpreter exit;
+    rows buffered when the process is killed are lost. One process writes
+    a store at a time.
+    """
+    
+    def __init__(self, path, flush_rows=4096, flush_interval=1.0, segment_rows=1 << 20, merge_after=16):
+        """
+        Open or create a store
+        
+        Args:
+            path (str): Directory holding the store
+            flush_rows (int): Buffered rows that trigger a write
+            flush_interval (float): Seconds between background writes
+            segment_rows (int): Target size of merged segments
+            merge_after (int): Number of small segments that triggers a merge
+        """
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.segment_rows = segment_rows
+        self.merge_after = merge_after
+        self._segments_dir = os.path.join(path, "segments")
+        os.makedirs(self._segments_dir, exist_ok=True)
+        
+        self._strings = {kind: [] for kind in KINDS}
+        self._ids = {kind: {} for kind in KINDS}
+        strings_path = os.path.join(path, "strings.json")
+        if os.path.exists(strings_path):
+            with open(strings_path, encoding="utf-8") as f:
+                self._strings.update(json.load(f))
+            self._ids = {kind: {name: i for i, name in enumerate(names)} for kind, names in self._strings.items()}
+        self._saved_strings = {kind: len(names) for kind, names in self._strings.items()}
+        self._intern_lock = threading.Lock()
+        
+        self._segments = self._load_segments()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+    
+    # Writing
+    
+    def _load_segments(self):
+        """Open every segment, dropping ones a finished merge left behind"""
+        segments = []
+        for name in sorted(os.listdir(self._segments_dir)):
+            path = os.path.join(self._segments_dir, name)
+            zone_path = os.path.join(path, "zone.json")
+            if name.startswith(".") or not os.path.exists(zone_path):
+                # Unfinished write
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            with open(zone_path, encoding="utf-8") as f:
+                segments.append(_Segment(path, json.load(f)))
+        kept = []
+        for segment in sorted(segments, key=lambda s: (s.start, -s.end)):
+            if kept and segment.end <= kept[-1].end:
+                shutil.rmtree(segment.path, ignore_errors=True)
+                continue
+            kept.append(segment)
+        return kept
+    
+    def intern(self, kind, name):
+        """
+        Get the integer ID of a model, label or fruit name, assigning one if new
+        
+        Args:
+            kind (str): "model", "label" or "fruit"
+            name (str): The name
+        
+        Returns:
+            int: Its ID
+        """
+        ids = self._ids[kind]
+        value = ids.get(name)
+        if value is None:
+            with self._intern_lock:
+                value = ids.get(name)
+                if value is None:
+                    value = ids[name] = len(self._strings[kind])
+                    self._strings[kind].append(name)
+        return value
+    
+    def _lookup(self, kind, name):
+        return self._ids[kind].get(name) if name is not None else None
+    
+    def record(self, digest, model_id, prediction, fruit=None, timings=None, source=UPSTREAM, timestamp=None):
+        """
+        Queue a prediction for the history; returns immediately
+        
+        Args:
+            digest (str): Hex content digest of the preprocessed image
+            model_id (str): The Hugging Face model ID
+            prediction (list): Successful classification result (label/score dicts)
+            fruit (str): Matched fruit, None to use the first label that matches one
+            timings (dict): Stage name -> seconds, for the stages in STAGES
+            source (int): UPSTREAM, EXACT_CACHE or NEAR_DUPLICATE
+            timestamp (float): Unix time of the prediction, now by default
+        """
+        if not isinstance(prediction, list):
+            return
+        row = (timestamp if timestamp is not None else time.time(), digest, model_id, prediction, fruit, timings, source)
+        with self._lock:
+            if self._closed:
+                return
+            self._pending.append(row)
+            full = len(self._pending) >= self.flush_rows
+        if full:
+            self._wakeup.set()
+    
+    def _write_loop(self):
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                debug(f"History write failed: {str(e)}")
+    
+    def _columns(self, rows):
+        """Turn buffered rows into column arrays"""
+        count = len(rows)
+        columns = {name: np.empty((count, width) if width > 1 else count, dtype=dtype)
+                   for name, (dtype, width) in COLUMNS.items()}
+        columns["labels"].fill(-1)
+        columns["scores"].fill(0)
+        columns["timings"].fill(np.nan)
+        for i, (timestamp, digest, model_id, prediction, fruit, timings, source) in enumerate(rows):
+            columns["time"][i] = timestamp
+            columns["digest"][i] = digest_id(digest)
+            columns["model"][i] = self.intern("model", model_id)
+            columns["source"][i] = source
+            fruit_score = 0.0
+            for k, item in enumerate(prediction):
+                label = item.get("label")
+                if label is None:
+                    continue
+                if k < TOP_K:
+                    columns["labels"][i, k] = self.intern("label", label)
+                    columns["scores"][i, k] = item.get("score", 0)
+                if fruit is None:
+                    fruit = match_fruit(label)
+                    if fruit is not None:
+                        fruit_score = item.get("score", 0)
+                elif not fruit_score and match_fruit(label) == fruit:
+                    fruit_score = item.get("score", 0)
+            columns["fruit"][i] = self.intern("fruit", fruit) if fruit is not None else -1
+            columns["fruit_score"][i] = fruit_score
+            for s, stage in enumerate(STAGES):
+                if timings and stage in timings:
+                    columns["timings"][i, s] = timings[stage] * 1000
+        return columns
+    
+    def flush(self):
+        """
+        Write buffered rows as a new segment
+        
+        Returns:
+            int: Number of rows written
+        """
+        with self._write_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+            with metrics.span("history_write"):
+                self._write_segment(self._columns(rows))
+                if sum(1 for s in self._segments if s.rows < self.segment_rows) >= self.merge_after:
+                    self._merge_small()
+            return len(rows)
+    
+    def append_columns(self, columns):
+        """
+        Write already interned column arrays as one segment (bulk import)
+        
+        Args:
+            columns (dict): An array per name in COLUMNS, IDs from intern()
+        """
+        with self._write_lock:
+            self._write_segment({name: np.asarray(columns[name], dtype=dtype) for name, (dtype, _) in COLUMNS.items()})
+    
+    def _write_segment(self, columns, replaces=()):
+        """Sort rows by time and write them atomically; called with the write lock held"""
+        order = np.argsort(columns["time"], kind="stable")
+        if np.any(order[1:] < order[:-1]):
+            columns = {name: array[order] for name, array in columns.items()}
+        rows = len(columns["time"])
+        start = replaces[0].start if replaces else (self._segments[-1].end if self._segments else 0)
+        name = f"{start:012d}-{start + rows:012d}"
+        self._save_strings()
+        
+        tmp = os.path.join(self._segments_dir, f".{name}")
+        os.makedirs(tmp, exist_ok=True)
+        for column, array in columns.items():
+            np.save(os.path.join(tmp, f"{column}.npy"), array)
+        
+        # Latest row of each (model, digest), sorted by model and digest, for
+        # confusion(); rows are time-sorted and lexsort is stable. Digest and
+        # fruit are copied so queries read them sequentially
+        order = np.lexsort((columns["digest"], columns["model"]))
+        models, digests = columns["model"][order], columns["digest"][order]
+        last = np.append((models[1:] != models[:-1]) | (digests[1:] != digests[:-1]), True)
+        latest = order[last]
+        latest_models = models[last]
+        np.save(os.path.join(tmp, "latest_row.npy"), latest.astype(np.uint32))
+        np.save(os.path.join(tmp, "latest_digest.npy"), digests[last])
+        np.save(os.path.join(tmp, "latest_fruit.npy"), columns["fruit"][latest])
+        model_ids = np.unique(latest_models)
+        starts = np.searchsorted(latest_models, model_ids, side="left")
+        ends = np.searchsorted(latest_models, model_ids, side="right")
+        
+        zone = {
+            "rows": rows,
+            "time_min": float(columns["time"][0]),
+            "time_max": float(columns["time"][-1]),
+            "models": self._value_counts(columns["model"]),
+            "fruits": self._value_counts(columns["fruit"]),
+            "latest": {str(int(m)): [int(a), int(b)] for m, a, b in zip(model_ids, starts, ends)}
+        }
+        with open(os.path.join(tmp, "zone.json"), "w", encoding="utf-8") as f:
+            json.dump(zone, f)
+        path = os.path.join(self._segments_dir, name)
+        if os.path.exists(path):
+            # Same range as one being replaced: swap it out before renaming
+            shutil.rmtree(path)
+        os.rename(tmp, path)
+        
+        segment = _Segment(path, zone)
+        with self._lock:
+            self._segments = [s for s in self._segments if s not in replaces] + [segment]
+            self._segments.sort(key=lambda s: s.start)
+        for old in replaces:
+            if old.path != path:
+                shutil.rmtree(old.path, ignore_errors=True)
+        metrics.inc("history_rows_written_total", rows)
+    
+    @staticmethod
+    def _value_counts(values):
+        ids, counts = np.unique(values, return_counts=True)
+        return {str(int(i)): int(c) for i, c in zip(ids, counts)}
+    
+    def _save_strings(self):
+        """Persist new interned names before any segment refers to them"""
+        if all(len(self._strings[kind]) == self._saved_strings[kind] for kind in KINDS):
+            return
+        path = os.path.join(self.path, "strings.json")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self._strings, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+        self._saved_strings = {kind: len(names) for kind, names in self._strings.items()}
+    
+    def _merge_small(self):
+        """Merge runs of adjacent small segments into segments of about segment_rows"""
+        run = []
+        for segment in list(self._segments) + [None]:
+            if segment is not None and segment.rows < self.segment_rows and \
+                    sum(s.rows for s in run) + segment.rows <= self.segment_rows:
+                run.append(segment)
+                continue
+            if len(run) > 1:
+                # Segments written with older column dtypes are converted as they merge
+                columns = {name: np.concatenate([s.column(name) for s in run], dtype=dtype)
+                           for name, (dtype, _) in COLUMNS.items()}
+                self._write_segment(columns, replaces=tuple(run))
+            run = [segment] if segment is not None and segment.rows < self.segment_rows else []
+    
+    def compact(self):
+        """Flush and merge every run of small segments now"""
+        self.flush()
+        with self._write_lock:
+            self._merge_small()
+    
+    def close(self):
+        """Write what is buffered and stop the background writer"""
+        with self._lock:
+            self._closed = True
+        self._wakeup.set()
+        self._writer.join()
+        self.flush()
+        atexit.unregister(self.close)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def __len__(self):
+        with self._lock:
+            return sum(s.rows for s in self._segments)
+    
+    # Queries
+    
+    def _scan(self, model=None, fruit=None, since=None, until=None):
+        """
+        Segments and row ranges that can hold matching rows
+        
+        Yields:
+            tuple: (segment, lo, hi, model ID or None, fruit ID or None)
+        """
+        model_id = self._lookup("model", model)
+        fruit_id = self._lookup("fruit", fruit)
+        if (model is not None and model_id is None) or (fruit is not None and fruit_id is None):
+            return
+        with self._lock:
+            segments = list(self._segments)
+        for segment in segments:
+            zone = segment.zone
+            if since is not None and zone["time_max"] < since:
+                continue
+            if until is not None and zone["time_min"] >= until:
+                continue
+            if model_id is not None and str(model_id) not in zone["models"]:
+                continue
+            if fruit_id is not None and str(fruit_id) not in zone["fruits"]:
+                continue
+            lo, hi = segment.span(since, until)
+            if lo < hi:
+                yield segment, lo, hi, model_id, fruit_id
+    
+    @staticmethod
+    def _bins(ids, known):
+        """
+        Map IDs to bincount bins: 0..known-1 as is, -1 (none) to `known` and
+        IDs interned after the query started to `known` + 1
+        """
+        ids = ids.astype(np.int64)
+        return np.where(ids < 0, known, np.minimum(ids, known + 1))
+    
+    @staticmethod
+    def _mask(segment, lo, hi, model_id, fruit_id):
+        """Boolean row mask for the model and fruit filters, None when there are none"""
+        mask = None
+        if model_id is not None:
+            mask = segment.column("model")[lo:hi] == model_id
+        if fruit_id is not None:
+            matches = segment.column("fruit")[lo:hi] == fruit_id
+            mask = matches if mask is None else mask & matches
+        return mask
+    
+    def count(self, model=None, fruit=None, since=None, until=None):
+        """
+        Count predictions
+        
+        Args:
+            model (str): Only this model
+            fruit (str): Only rows matched to this fruit
+            since (float): Unix time of the first row to include
+            until (float): Unix time after the last row to include
+        
+        Returns:
+            int: Number of matching rows
+        """
+        total = 0
+        for segment, lo, hi, model_id, fruit_id in self._scan(model, fruit, since, until):
+            whole = lo == 0 and hi == segment.rows
+            if whole and (model_id is None or fruit_id is None):
+                # Answer from the zone map without reading the segment
+                if model_id is not None:
+                    total += segment.zone["models"][str(model_id)]
+                elif fruit_id is not None:
+                    total += segment.zone["fruits"][str(fruit_id)]
+                else:
+                    total += segment.rows
+                continue
+            mask = self._mask(segment, lo, hi, model_id, fruit_id)
+            total += hi - lo if mask is None else int(np.count_nonzero(mask))
+        return total
+    
+    def fruit_counts(self, model=None, since=None, until=None):
+        """
+        Count predictions per matched fruit
+        
+        Args:
+            model (str): Only this model
+            since (float): Unix time of the first row to include
+            until (float): Unix time after the last row to include
+        
+        Returns:
+            dict: Fruit name -> count, most frequent first; unmatched rows are left out
+        """
+        fruits = len(self._strings["fruit"])
+        totals = np.zeros(fruits + 2, dtype=np.int64)
+        for segment, lo, hi, model_id, _ in self._scan(model, None, since, until):
+            values = segment.column("fruit")[lo:hi]
+            if model_id is not None:
+                values = values[segment.column("model")[lo:hi] == model_id]
+            totals += np.bincount(self._bins(values, fruits), minlength=fruits + 2)
+        names = self._strings["fruit"]
+        counts = {names[i]: int(totals[i]) for i in range(fruits) if totals[i]}
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+    
+    def model_fruit_counts(self, since=None, until=None):
+        """
+        Count predictions per (model, matched fruit) pair
+        
+        Args:
+            since (float): Unix time of the first row to include
+            until (float): Unix time after the last row to include
+        
+        Returns:
+            dict: Model ID -> {fruit name: count}
+        """
+        models, fruits = len(self._strings["model"]), len(self._strings["fruit"])
+        totals = np.zeros((models + 1) * (fruits + 2), dtype=np.int64)
+        for segment, lo, hi, _, _ in self._scan(None, None, since, until):
+            pairs = np.minimum(segment.column("model")[lo:hi], models).astype(np.int64) * (fruits + 2) + \
+                self._bins(segment.column("fruit")[lo:hi], fruits)
+            totals += np.bincount(pairs, minlength=totals.size)
+        totals = totals.reshape(models + 1, fruits + 2)
+        return {
+            model_id: {self._strings["fruit"][f]: int(totals[m, f]) for f in range(fruits) if totals[m, f]}
+            for m, model_id in enumerate(self._strings["model"][:models])
+        }
+    
+    def label_counts(self, model=None, fruit=None, since=None, until=None, top=10):
+        """
+        Most frequent top-1 labels
+        
+        Args:
+            model (str): Only this model
+            fruit (str): Only rows matched to this fruit
+            since (float): Unix time of the first row to include
+            until (float): Unix time after the last row to include
+            top (int): Number of labels to return
+        
+        Returns:
+            list: (label, count) pairs, most frequent first
+        """
+        labels = len(self._strings["label"])
+        totals = np.zeros(labels + 2, dtype=np.int64)
+        for segment, lo, hi, model_id, fruit_id in self._scan(model, fruit, since, until):
+            values = segment.column("labels")[lo:hi, 0]
+            mask = self._mask(segment, lo, hi, model_id, fruit_id)
+            if mask is not None:
+                values = values[mask]
+            totals += np.bincount(self._bins(values, labels), minlength=labels + 2)
+        best = np.argsort(totals[:labels], kind="stable")[::-1][:top]
+        return [(self._strings["label"][i], int(totals[i])) for i in best if totals[i]]
+    
+    @staticmethod
+    def _latest_rows(segment, lo, hi, model_id):
+        """
+        Latest prediction of each image by a model within rows [lo, hi) of a segment
+        
+        Returns:
+            tuple: (row numbers, digests, fruits), sorted by digest
+        """
+        if lo == 0 and hi == segment.rows and "latest" in segment.zone:
+            start, end = segment.zone["latest"][str(model_id)]
+            return (segment.column("latest_row")[start:end], segment.column("latest_digest")[start:end],
+                    segment.column("latest_fruit")[start:end])
+        rows = lo + np.flatnonzero(segment.column("model")[lo:hi] == model_id)
+        # Rows are time-sorted, so a stable sort leaves the latest last
+        rows = rows[np.argsort(segment.column("digest")[rows], kind="stable")]
+        digests = segment.column("digest")[rows]
+        last = np.append(digests[1:] != digests[:-1], True)
+        rows = rows[last]
+        return rows, digests[last], segment.column("fruit")[rows]
+    
+    def _latest_by_digest(self, model, since, until):
+        """Matched fruit of the latest prediction of each image by a model, sorted by digest"""
+        pieces = [(segment, *self._latest_rows(segment, lo, hi, model_id))
+                  for segment, lo, hi, model_id, _ in self._scan(model, None, since, until)]
+        if not pieces:
+            return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int16)
+        if len(pieces) == 1:
+            return pieces[0][2], pieces[0][3]
+        digests = np.concatenate([piece[2] for piece in pieces])
+        fruits = np.concatenate([piece[3] for piece in pieces])
+        # Each segment's part is already sorted, so this stable sort mostly merges runs
+        order = np.argsort(digests, kind="stable")
+        sorted_digests = digests[order]
+        same = sorted_digests[1:] == sorted_digests[:-1]
+        if same.any():
+            # Images seen in several segments: order their rows by time so the latest comes last
+            dup = np.flatnonzero(np.append(same, False) | np.insert(same, 0, False))
+            positions = order[dup]
+            offsets = np.cumsum([0] + [len(piece[1]) for piece in pieces])
+            owner = np.searchsorted(offsets, positions, side="right") - 1
+            times = np.empty(len(positions))
+            for p in np.unique(owner):
+                segment, rows = pieces[p][0], pieces[p][1]
+                times[owner == p] = segment.column("time")[rows[positions[owner == p] - offsets[p]]]
+            order[dup] = positions[np.lexsort((times, sorted_digests[dup]))]
+        order = order[np.append(~same, True)]
+        return digests[order], fruits[order]
+    
+    def confusion(self, model, reference, since=None, until=None):
+        """
+        Compare the fruits two models matched on the same images
+        
+        For example confusion(vit, resnet)[("papaya", "mango")] is how often
+        ViT said papaya where ResNet said mango.
+        
+        Args:
+            model (str): Model ID whose answers are counted
+            reference (str): Model ID to compare with
+            since (float): Unix time of the first row to include
+            until (float): Unix time after the last row to include
+        
+        Returns:
+            dict: (fruit of model, fruit of reference) -> number of images, None for no fruit
+        """
+        digests_a, fruits_a = self._latest_by_digest(model, since, until)
+        digests_b, fruits_b = self._latest_by_digest(reference, since, until)
+        # Both sides are sorted and unique, so a binary search joins them
+        index_b = np.searchsorted(digests_b, digests_a)
+        index_b[index_b == len(digests_b)] = 0
+        found = digests_b[index_b] == digests_a if len(digests_b) else np.zeros(len(digests_a), dtype=bool)
+        fruits = len(self._strings["fruit"])
+        pairs = self._bins(fruits_a[found], fruits) * (fruits + 2) + self._bins(fruits_b[index_b[found]], fruits)
+        totals = np.bincount(pairs, minlength=(fruits + 2) ** 2).reshape(fruits + 2, fruits + 2)
+        # The last bin holds fruits interned while the query ran
+        names = self._strings["fruit"][:fruits] + [None]
+        return {(names[a], names[b]): int(totals[a, b])
+                for a, b in zip(*np.nonzero(totals[:fruits + 1, :fruits + 1]))}
+    
+    def rows(self, model=None, fruit=None, since=None, until=None, limit=100):
+        """
+        Fetch the most recent matching rows
+        
+        Args:
+            model (str): Only this model
+            fruit (str): Only rows matched to this fruit
+            since (float): Unix time of the first row to include
+            until (float): Unix time after the last row to include
+            limit (int): Maximum number of rows
+        
+        Returns:
+            list: Row dicts, newest first
+        """
+        found = []
+        for segment, lo, hi, model_id, fruit_id in reversed(list(self._scan(model, fruit, since, until))):
+            mask = self._mask(segment, lo, hi, model_id, fruit_id)
+            positions = np.arange(lo, hi) if mask is None else lo + np.flatnonzero(mask)
+            for i in positions[::-1][:limit - len(found)]:
+                found.append(self._row(segment, int(i)))
+            if len(found) >= limit:
+                break
+        return sorted(found, key=lambda row: -row["time"])
+    
+    def _row(self, segment, i):
+        strings = self._strings
+        fruit = int(segment.column("fruit")[i])
+        labels = segment.column("labels")[i]
+        scores = segment.column("scores")[i]
+        timings = segment.column("timings")[i]
+        return {
+            "time": float(segment.column("time")[i]),
+            "digest": f"{int(segment.column('digest')[i]):016x}",
+            "model_id": strings["model"][int(segment.column("model")[i])],
+            "source": SOURCES.get(int(segment.column("source")[i]), "unknown"),
+            "fruit": strings["fruit"][fruit] if fruit >= 0 else None,
+            "fruit_score": float(segment.column("fruit_score")[i]),
+            "predictions": [{"label": strings["label"][int(label)], "score": float(score)}
+                            for label, score in zip(labels, scores) if label >= 0],
+            "timings_ms": {stage: float(value) for stage, value in zip(STAGES, timings) if not np.isnan(value)}
+        }
+    
+    def stats(self):
+        """
+        Get storage statistics
+        
+        Returns:
+            dict: Stored and buffered rows, segments, bytes on disk and interned names
+        """
+        with self._lock:
+            segments = list(self._segments)
+            pending = len(self._pending)
+        size = sum(os.path.getsize(os.path.join(s.path, f)) for s in segments for f in os.listdir(s.path))
+        return {
+            "rows": sum(s.rows for s in segments),
+            "pending": pending,
+            "segments": len(segments),
+            "bytes": size,
+            "models": len(self._strings["model"]),
+            "labels": len(self._strings["label"]),
+            "fruits": len(self._strings["fruit"])
+        }
@@ -1,12 +1,60 @@
 from PIL import Image
-import numpy as np
 import io
+import os
+import metrics
+from lazy_import import lazy_import
+from metrics import debug
+
+# Only the shared-buffer and batch paths need NumPy
+np = lazy_import("numpy")
+
+# Upload limits checked from the file header, before any pixel is decoded.
+# 50 megapixels covers current phone cameras with room to spare
+MAX_IMAGE_PIXELS = 50_000_000
+MAX_IMAGE_SIDE = 16384
+MAX_IMAGE_BYTES = 32 * 1024 * 1024
+
+# Magic bytes of the accepted formats; anything else is rejected without
+# letting Pillow probe every plugin it knows
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"BM", "BMP")
+)
+
+
+class InvalidImageError(ValueError):
+    """Raised when an upload is not a usable image or exceeds the size limits"""
+
+
+def sniff_format(head):
+    """
+    Identify an image format from the first bytes of a file
+    
+    Args:
+        head (bytes): At least the first 12 bytes of the file
+        
+    Returns:
+        str: Pillow format name, or None if the format is not accepted
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    for signature, image_format in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    return None
+
 
 class ImageProcessor:
     """
     Class for handling image preprocessing operations
     """
     
+    # Preprocessing modes: full-resolution decode with LANCZOS, or reduced-scale
+    # decode followed by a cheap bilinear resize
+    QUALITY = "quality"
+    FAST = "fast"
+    
     @staticmethod
     def resize_image(image, target_size=(224, 224)):
         """
@@ -22,10 +70,56 @@ class ImageProcessor:
         try:
             return image.resize(target_size, Image.LANCZOS)
         except Exception as e:
-            print(f"Error resizing image: {str(e)}")
+            debug(f"Error resizing image: {str(e)}")
             # Fallback to a simpler resize method
             return image.resize(target_size)
     
+    @staticmethod
+    def draft_image(image, target_size=(224, 224)):
+        """
+        Ask the decoder to load the image at a reduced scale
+        
+        JPEG decoders can scale by 1/2, 1/4 or 1/8 while decoding, which skips
+        most of the work for large photos. Must be called before pixel data is
+        loaded; other formats and already loaded images are left unchanged.
+        
+        Args:
+            image (PIL.Image): The freshly opened input image
+            target_size (tuple): Target size as (width, height)
+            
+        Returns:
+            PIL.Image: The same image, set up for reduced-scale decoding
+        """
+        if image.format == "JPEG":
+            try:
+                # Picks the smallest scale that is still at least target_size
+                image.draft("RGB", target_size)
+            except Exception as e:
+                debug(f"Draft decoding not available: {str(e)}")
+        return image
+    
+    @staticmethod
+    def fast_resize(image, target_size=(224, 224)):
+        """
+        Resize an image using integer reduction and a bilinear final pass
+        
+        Args:
+            image (PIL.Image): The input image
+            target_size (tuple): Target size as (width, height)
+            
+        Returns:
+            PIL.Image: Resized image
+        """
+        # Box-reduce by an integer factor while staying at least twice the
+        # target size, so the final bilinear pass still has detail to sample
+        factor = min(image.size[0] // target_size[0], image.size[1] // target_size[1]) // 2
+        # reduce() and bilinear resizing do not work on palette, bilevel or 16-bit images
+        if image.mode in ("P", "1") or image.mode.startswith("I;16"):
+            image = ImageProcessor.convert_to_rgb(image)
+        if factor > 1:
+            image = image.reduce(factor)
+        return image.resize(target_size, Image.BILINEAR)
+    
     @staticmethod
     def convert_to_rgb(image):
         """
@@ -56,11 +150,97 @@ class ImageProcessor:
         # but we ensure the image has reasonable values
         return image
     
+    @staticmethod
+    def load_image(source, target_size=None, mode=QUALITY, max_pixels=MAX_IMAGE_PIXELS,
+                   max_side=MAX_IMAGE_SIDE, max_bytes=MAX_IMAGE_BYTES):
+        """
+        Validate and decode an image in a single pass
+        
+        The format is identified from its magic bytes and the dimensions are
+        read from the header, so files that are not images, are too large or
+        claim huge dimensions (decompression bombs) are rejected before any
+        pixel data is decoded. Valid images are decoded exactly once and
+        returned ready for preprocess().
+        
+        Args:
+            source: Raw bytes, a binary file object or a file path
+            target_size (tuple): Final size as (width, height); in fast mode
+                JPEGs are decoded at the smallest scale still covering it
+            mode (str): ImageProcessor.QUALITY or ImageProcessor.FAST
+            max_pixels (int): Largest accepted width * height
+            max_side (int): Largest accepted width or height
+            max_bytes (int): Largest accepted file size, when it can be known
+            
+        Returns:
+            PIL.Image: Fully decoded image
+            
+        Raises:
+            InvalidImageError: If the data is not an accepted image or is too large
+        """
+        with metrics.span("validate", mode=mode):
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                if len(source) > max_bytes:
+                    raise InvalidImageError(f"Image file is too large ({len(source)} bytes)")
+                fp = io.BytesIO(source)
+            elif hasattr(source, "read"):
+                fp = source
+                if fp.seekable():
+                    start = fp.tell()
+                    size = fp.seek(0, io.SEEK_END) - start
+                    fp.seek(start)
+                    if size > max_bytes:
+                        raise InvalidImageError(f"Image file is too large ({size} bytes)")
+                else:
+                    fp = io.BytesIO(fp.read(max_bytes + 1))
+                    if len(fp.getbuffer()) > max_bytes:
+                        raise InvalidImageError("Image file is too large")
+            else:
+                # Pillow opens paths itself and closes the file once decoded
+                fp = source
+                if os.path.getsize(source) > max_bytes:
+                    raise InvalidImageError(f"Image file is too large: {source}")
+            
+            if isinstance(fp, (str, os.PathLike)):
+                with open(fp, "rb") as f:
+                    head = f.read(12)
+            else:
+                start = fp.tell()
+                head = fp.read(12)
+                fp.seek(start)
+            image_format = sniff_format(head)
+            if image_format is None:
+                raise InvalidImageError("Unsupported or unrecognized image format")
+            
+            # Only the header is parsed here
+            try:
+                image = Image.open(fp, formats=[image_format])
+            except (Image.DecompressionBombError, OSError, SyntaxError, ValueError) as e:
+                raise InvalidImageError(f"Invalid image header: {str(e)}") from e
+            
+            width, height = image.size
+            if width <= 0 or height <= 0:
+                raise InvalidImageError(f"Invalid image dimensions: {width}x{height}")
+            if width > max_side or height > max_side or width * height > max_pixels:
+                raise InvalidImageError(f"Image dimensions too large: {width}x{height}")
+        
+        with metrics.span("decode", mode=mode):
+            if mode == ImageProcessor.FAST and target_size is not None:
+                image = ImageProcessor.draft_image(image, target_size)
+            try:
+                image.load()
+            except (OSError, SyntaxError, ValueError) as e:
+                # Truncated or corrupt pixel data
+                raise InvalidImageError(f"Corrupt image data: {str(e)}") from e
+        return image
+    
     @staticmethod
     def verify_image(image):
         """
         Verify that the image is valid and can be processed
         
+        Unlike Image.verify(), this leaves the image usable: its pixels are
+        decoded (a no-op for images that are already loaded) and checked.
+        
         Args:
             image (PIL.Image): The input image
             
@@ -68,56 +248,143 @@ class ImageProcessor:
             bool: True if image is valid, False otherwise
         """
         try:
-            # Check if image data is accessible
-            image.verify()
-            return True
-        except:
-            try:
-                # If verify fails (it's destructive), try to access pixel data
-                image.load()
-                return True
-            except Exception as e:
-                print(f"Invalid image: {str(e)}")
-                return False
+            image.load()
+            return image.size[0] > 0 and image.size[1] > 0
+        except Exception as e:
+            debug(f"Invalid image: {str(e)}")
+            return False
     
     @staticmethod
-    def preprocess(image, target_size=(224, 224)):
+    def preprocess(image, target_size=(224, 224), mode=QUALITY):
         """
         Apply all preprocessing steps to prepare image for model
         
         Args:
             image (PIL.Image): The input image
             target_size (tuple): Target size as (width, height)
+            mode (str): ImageProcessor.QUALITY or ImageProcessor.FAST
             
         Returns:
             PIL.Image: Preprocessed image
         """
-        # Verify the image is valid
-        if not ImageProcessor.verify_image(image):
+        if mode not in (ImageProcessor.QUALITY, ImageProcessor.FAST):
+            raise ValueError(f"Unknown preprocessing mode: {mode}")
+        
+        # Decode large JPEGs at a reduced scale in fast mode; images from
+        # load_image() are already decoded and left as they are
+        if mode == ImageProcessor.FAST:
+            image = ImageProcessor.draft_image(image, target_size)
+        
+        # Verify the image is valid (decodes it if that has not happened yet)
+        with metrics.span("verify", mode=mode):
+            valid = ImageProcessor.verify_image(image)
+        if not valid:
             raise ValueError("Invalid image provided")
             
         # Check image dimensions and resize if needed
         if image.size != target_size:
-            print(f"Resizing image from {image.size} to {target_size}")
-            image = ImageProcessor.resize_image(image, target_size)
+            debug(f"Resizing image from {image.size} to {target_size}")
+            with metrics.span("resize", mode=mode):
+                if mode == ImageProcessor.FAST:
+                    image = ImageProcessor.fast_resize(image, target_size)
+                else:
+                    image = ImageProcessor.resize_image(image, target_size)
         
         # Convert to RGB
-        image = ImageProcessor.convert_to_rgb(image)
-        
-        # Normalize if needed
-        image = ImageProcessor.normalize_image(image)
+        with metrics.span("convert", mode=mode):
+            image = ImageProcessor.convert_to_rgb(image)
+            
+            # Normalize if needed
+            image = ImageProcessor.normalize_image(image)
         
-        print(f"Preprocessed image: size={image.size}, mode={image.mode}")
+        debug(f"Preprocessed image: size={image.size}, mode={image.mode}")
         return image
         
     @staticmethod
-    def preprocess_standard_sizes(image):
+    def preprocess_sizes(image, sizes, mode=QUALITY, shared_buffer=False):
+        """
+        Preprocess an image for several target sizes at once
+        
+        The image is verified and decoded once, and identical sizes are only
+        computed once. Every size is resized from the smallest already
+        computed downscale of the source that covers it, so each step works
+        on a small image instead of the full-resolution source. Sizes larger
+        than the source on either axis are resized from the source directly,
+        and the source size itself is the source converted to RGB.
+        
+        Args:
+            image (PIL.Image): The input image
+            sizes (iterable): Target sizes as (width, height)
+            mode (str): ImageProcessor.QUALITY or ImageProcessor.FAST
+            shared_buffer (bool): Return uint8 RGB arrays of shape (height, width, 3)
+                that are views into one contiguous buffer instead of PIL images
+            
+        Returns:
+            dict: (width, height) -> preprocessed PIL.Image or numpy.ndarray
+        """
+        if mode not in (ImageProcessor.QUALITY, ImageProcessor.FAST):
+            raise ValueError(f"Unknown preprocessing mode: {mode}")
+        
+        # Largest first; each level becomes the source of the smaller ones
+        unique_sizes = sorted(set(tuple(size) for size in sizes), key=lambda s: s[0] * s[1], reverse=True)
+        if not unique_sizes:
+            return {}
+        
+        if mode == ImageProcessor.FAST:
+            width = max(size[0] for size in unique_sizes)
+            height = max(size[1] for size in unique_sizes)
+            image = ImageProcessor.draft_image(image, (width, height))
+        with metrics.span("verify", mode=mode):
+            valid = ImageProcessor.verify_image(image)
+        if not valid:
+            raise ValueError("Invalid image provided")
+        
+        # Palette and bilevel images can only be resized with NEAREST, so
+        # convert them up front; other modes are converted at the first level
+        if image.mode in ("P", "1"):
+            image = ImageProcessor.convert_to_rgb(image)
+        
+        levels = {}
+        with metrics.span("resize", mode=mode, levels=len(unique_sizes)):
+            for size in unique_sizes:
+                # Only downscaled levels may feed smaller ones; chaining from an
+                # upscaled level would blur sizes the source could give directly
+                source = image
+                for level_size, level in levels.items():
+                    if (level_size[0] >= size[0] and level_size[1] >= size[1]
+                            and level_size[0] <= image.size[0] and level_size[1] <= image.size[1]):
+                        source = level
+                if source.size == size:
+                    resized = source
+                elif mode == ImageProcessor.FAST:
+                    resized = ImageProcessor.fast_resize(source, size)
+                else:
+                    resized = ImageProcessor.resize_image(source, size)
+                levels[size] = ImageProcessor.convert_to_rgb(resized)
+        
+        if not shared_buffer:
+            return levels
+        
+        # Copy every level into one allocation and hand out views of it
+        offsets = np.cumsum([0] + [w * h * 3 for w, h in unique_sizes])
+        buffer = np.empty(offsets[-1], dtype=np.uint8)
+        arrays = {}
+        for (width, height), start, end in zip(unique_sizes, offsets[:-1], offsets[1:]):
+            view = buffer[start:end].reshape(height, width, 3)
+            view[...] = levels[(width, height)]
+            arrays[(width, height)] = view
+        return arrays
+    
+    @staticmethod
+    def preprocess_standard_sizes(image, mode=QUALITY, shared_buffer=False):
         """
         Preprocess image with multiple standard sizes and return all versions
         Useful for troubleshooting model compatibility issues
         
         Args:
             image (PIL.Image): The input image
+            mode (str): ImageProcessor.QUALITY or ImageProcessor.FAST
+            shared_buffer (bool): Return views into one buffer, see preprocess_sizes
             
         Returns:
             dict: Different sized versions of the preprocessed image
@@ -130,15 +397,157 @@ class ImageProcessor:
             "original": image.size  # Original size
         }
         
-        result = {}
-        for name, size in standard_sizes.items():
-            try:
-                if name == "original":
-                    # For original, just convert to RGB but don't resize
-                    result[name] = ImageProcessor.convert_to_rgb(image)
-                else:
-                    result[name] = ImageProcessor.preprocess(image, size)
-            except Exception as e:
-                print(f"Error preprocessing {name} size: {e}")
-                
-        return result 
\ No newline at end of file
+        try:
+            # "small" and "clip" share one result; "original" is only converted
+            variants = ImageProcessor.preprocess_sizes(image, standard_sizes.values(), mode, shared_buffer)
+        except Exception as e:
+            debug(f"Error preprocessing standard sizes: {e}")
+            return {}
+        return {name: variants[size] for name, size in standard_sizes.items()}
+    
+    @staticmethod
+    def preprocess_for_models(image, input_sizes, mode=QUALITY):
+        """
+        Preprocess an image once for several models
+        
+        Args:
+            image (PIL.Image): The input image
+            input_sizes (dict): Model ID -> input size as (width, height)
+            mode (str): ImageProcessor.QUALITY or ImageProcessor.FAST
+            
+        Returns:
+            dict: Model ID -> preprocessed PIL.Image; models with the same input
+                size share the same image object
+        """
+        variants = ImageProcessor.preprocess_sizes(image, input_sizes.values(), mode)
+        return {model_id: variants[tuple(size)] for model_id, size in input_sizes.items()}
+
+
+# Per-model RGB normalization constants (mean, std) on the 0-1 pixel scale
+IMAGENET_NORMALIZATION = ((0.485, 0.456, 0.406), (0.229, 0.224, 0.225))
+HALF_NORMALIZATION = ((0.5, 0.5, 0.5), (0.5, 0.5, 0.5))
+CLIP_NORMALIZATION = ((0.48145466, 0.4578275, 0.40821073), (0.26862954, 0.26130258, 0.27577711))
+
+MODEL_NORMALIZATION = {
+    "microsoft/resnet-50": IMAGENET_NORMALIZATION,
+    "google/vit-base-patch16-224": HALF_NORMALIZATION,
+    "facebook/deit-base-distilled-patch16-224": IMAGENET_NORMALIZATION,
+    "facebook/convnext-base-224-22k-1k": IMAGENET_NORMALIZATION,
+    "openai/clip-vit-base-patch32": CLIP_NORMALIZATION
+}
+
+
+class BatchPreprocessor:
+    """
+    Turns batches of images into one contiguous model-ready array
+    
+    Output buffers are allocated once and reused, so the array returned by a
+    call stays valid only until the next call.
+    """
+    
+    def __init__(self, batch_size, target_size=(224, 224), layout="NCHW", dtype="float32",
+                 mean=None, std=None, mode=ImageProcessor.QUALITY):
+        """
+        Initialize the batch preprocessor
+        
+        Args:
+            batch_size (int): Maximum number of images per batch
+            target_size (tuple): Target size as (width, height)
+            layout (str): "NCHW" or "NHWC"
+            dtype (str): "float32" (normalized) or "uint8" (raw pixels)
+            mean (tuple): Per-channel RGB mean on the 0-1 scale, float32 only
+            std (tuple): Per-channel RGB std on the 0-1 scale, float32 only
+            mode (str): ImageProcessor.QUALITY or ImageProcessor.FAST resizing
+        """
+        if layout not in ("NCHW", "NHWC"):
+            raise ValueError(f"Unknown layout: {layout}")
+        if dtype not in ("float32", "uint8"):
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        
+        self.batch_size = batch_size
+        self.target_size = target_size
+        self.layout = layout
+        self.dtype = np.dtype(dtype)
+        self.mode = mode
+        
+        width, height = target_size
+        # Staging area for raw RGB pixels, always NHWC like PIL's memory layout
+        self._pixels = np.empty((batch_size, height, width, 3), dtype=np.uint8)
+        
+        if layout == "NHWC" and self.dtype == np.uint8:
+            # Raw NHWC output is the staging buffer itself
+            self._output = self._pixels
+        elif layout == "NCHW":
+            self._output = np.empty((batch_size, 3, height, width), dtype=self.dtype)
+        else:
+            self._output = np.empty((batch_size, height, width, 3), dtype=self.dtype)
+        
+        # (x / 255 - mean) / std folded into one multiply and one subtract
+        mean = np.asarray(mean if mean is not None else (0.0, 0.0, 0.0), dtype=np.float32)
+        std = np.asarray(std if std is not None else (1.0, 1.0, 1.0), dtype=np.float32)
+        self._scale = (1.0 / (255.0 * std)).astype(np.float32)
+        self._offset = (mean / std).astype(np.float32)
+    
+    @classmethod
+    def for_model(cls, model_id, batch_size, **kwargs):
+        """
+        Create a preprocessor with the normalization a model was trained with
+        
+        Args:
+            model_id (str): The Hugging Face model ID
+            batch_size (int): Maximum number of images per batch
+            **kwargs: Other BatchPreprocessor arguments
+            
+        Returns:
+            BatchPreprocessor: Configured preprocessor
+        """
+        mean, std = MODEL_NORMALIZATION.get(model_id, IMAGENET_NORMALIZATION)
+        return cls(batch_size, mean=mean, std=std, **kwargs)
+    
+    def _load(self, index, image):
+        """
+        Resize and convert one image into its staging slot
+        
+        Pillow exposes pixels only as a copy (tobytes, which numpy's array
+        interface goes through), so each image still makes one bytes copy
+        before it lands in the slot; no other per-image arrays are made.
+        """
+        if image.size != self.target_size:
+            if self.mode == ImageProcessor.FAST:
+                image = ImageProcessor.fast_resize(image, self.target_size)
+            else:
+                image = ImageProcessor.resize_image(image, self.target_size)
+        image = ImageProcessor.convert_to_rgb(image)
+        self._pixels[index] = image
+    
+    def __call__(self, images):
+        """
+        Preprocess a batch of images
+        
+        Args:
+            images (list): Up to batch_size PIL images
+            
+        Returns:
+            numpy.ndarray: View of the shared output buffer with one row per image
+        """
+        count = len(images)
+        if count > self.batch_size:
+            raise ValueError(f"Batch of {count} images exceeds batch size {self.batch_size}")
+        
+        for index, image in enumerate(images):
+            self._load(index, image)
+        
+        pixels = self._pixels[:count]
+        if self._output is self._pixels:
+            return pixels
+        output = self._output[:count]
+        
+        # Write through an NHWC view so the transpose happens inside the
+        # vectorized operations instead of in a separate copy
+        target = output.transpose(0, 2, 3, 1) if self.layout == "NCHW" else output
+        if self.dtype == np.uint8:
+            np.copyto(target, pixels)
+        else:
+            np.multiply(pixels, self._scale, out=target)
+            np.subtract(target, self._offset, out=target)
+        return output
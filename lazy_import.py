@@ -0,0 +1,65 @@
+import importlib
+import importlib.util
+import sys
+import threading
+import types
+
+_LOCK = threading.Lock()
+
+
+class _LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is imported on first attribute access
+    
+    The real import runs through importlib under a lock, so concurrent first
+    accesses from several threads all see the fully initialized module. The
+    stand-in is never put in sys.modules; submodules are imported normally
+    and bound on their parent package.
+    """
+    
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_lazy_lock"] = threading.Lock()
+        self.__dict__["_lazy_module"] = None
+    
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with self.__dict__["_lazy_lock"]:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    # Later reads of existing attributes skip __getattr__
+                    for key, value in module.__dict__.items():
+                        self.__dict__.setdefault(key, value)
+                    self.__dict__["_lazy_module"] = module
+        return module
+    
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+def lazy_import(name):
+    """
+    Import a module on first attribute access instead of immediately
+    
+    Heavy dependencies (NumPy, requests, asyncio, ...) are only paid for by
+    code paths that use them, so short-lived workers and the CLI start fast.
+    
+    Args:
+        name (str): Absolute top-level module name, e.g. "numpy"
+    
+    Returns:
+        module: The module if it is already imported, otherwise a lazy module
+            that runs its import the first time one of its attributes is read
+    
+    Raises:
+        ModuleNotFoundError: If the module is not installed
+    """
+    with _LOCK:
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        if importlib.util.find_spec(name) is None:
+            raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+        return _LazyModule(name)
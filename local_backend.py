@@ -0,0 +1,226 @@
+import io
+import os
+import queue
+import threading
+
+from PIL import Image
+
+from fruits import MEYVELER
+from image_processor import BatchPreprocessor, IMAGENET_NORMALIZATION, MODEL_NORMALIZATION
+from lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+# Directory holding downloaded model weights (Hugging Face cache layout)
+DEFAULT_MODEL_DIR = os.path.join(".cache", "models")
+
+# Warm backends shared by every caller in the process, keyed by (model_id, model_dir)
+_BACKENDS = {}
+_BACKENDS_LOCK = threading.Lock()
+
+
+def download_model(model_id, model_dir=DEFAULT_MODEL_DIR):
+    """
+    Download model weights so the local backend can run offline
+    
+    Args:
+        model_id (str): The Hugging Face model ID
+        model_dir (str): Directory to store the weights in
+    
+    Returns:
+        str: Local path of the downloaded snapshot
+    """
+    from huggingface_hub import snapshot_download
+    return snapshot_download(repo_id=model_id, cache_dir=model_dir)
+
+
+def get_local_backend(model_id, model_dir=DEFAULT_MODEL_DIR, **kwargs):
+    """
+    Get the process-wide local backend for a model, creating it on first use
+    
+    Args:
+        model_id (str): The Hugging Face model ID
+        model_dir (str): Directory holding the downloaded weights
+        **kwargs: Other LocalBackend arguments, used only on creation
+    
+    Returns:
+        LocalBackend: Backend that stays warm across Streamlit reruns
+    """
+    key = (model_id, os.path.abspath(model_dir))
+    with _BACKENDS_LOCK:
+        backend = _BACKENDS.get(key)
+        if backend is None:
+            backend = LocalBackend(model_id, model_dir, **kwargs)
+            _BACKENDS[key] = backend
+        return backend
+
+
+class LocalBackend:
+    """
+    Runs image classification models in-process on CPU
+    
+    Backends plug into APIHandler through two methods, classify_image(image)
+    and is_configured(). Concurrent classify_image calls are gathered into
+    micro-batches and run through the model in one forward pass. Requires
+    the optional torch and transformers packages.
+    """
+    
+    def __init__(self, model_id, model_dir=DEFAULT_MODEL_DIR, top_k=5, max_batch_size=8,
+                 batch_window=0.005, candidate_labels=None):
+        """
+        Initialize the local backend; weights are loaded on first use
+        
+        Args:
+            model_id (str): The Hugging Face model ID
+            model_dir (str): Directory holding the downloaded weights
+            top_k (int): Number of predictions returned per image
+            max_batch_size (int): Maximum images per forward pass
+            batch_window (float): Seconds to wait for more requests to join a batch
+            candidate_labels (list): Labels for zero-shot models such as CLIP
+        """
+        self.model_id = model_id
+        self.model_dir = model_dir
+        self.top_k = top_k
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.candidate_labels = candidate_labels or list(MEYVELER)
+        
+        self._load_lock = threading.Lock()
+        self._model = None
+        self._labels = None
+        self._text_features = None
+        self._preprocessor = None
+        self._torch = None
+        
+        self._requests = queue.Queue()
+        self._worker = None
+        self._available = False
+    
+    @property
+    def is_zero_shot(self):
+        """CLIP models score images against text labels instead of a fixed head"""
+        return "clip" in self.model_id.lower()
+    
+    def is_configured(self):
+        """
+        Check whether the model weights are available on disk
+        
+        Returns:
+            bool: True if the model can be loaded without network access
+        """
+        if self._available:
+            return True
+        try:
+            from huggingface_hub import snapshot_download
+            snapshot_download(repo_id=self.model_id, cache_dir=self.model_dir, local_files_only=True)
+            self._available = True
+        except Exception:
+            self._available = False
+        return self._available
+    
+    def _ensure_loaded(self):
+        """Load the model and start the batching worker once"""
+        if self._model is not None:
+            return
+        with self._load_lock:
+            if self._model is not None:
+                return
+            
+            import torch
+            import transformers
+            
+            options = {"cache_dir": self.model_dir, "local_files_only": True}
+            try:
+                hf_processor = transformers.AutoImageProcessor.from_pretrained(self.model_id, **options)
+                mean, std = hf_processor.image_mean, hf_processor.image_std
+            except Exception:
+                mean, std = MODEL_NORMALIZATION.get(self.model_id, IMAGENET_NORMALIZATION)
+            
+            if self.is_zero_shot:
+                model = transformers.CLIPModel.from_pretrained(self.model_id, **options)
+                tokenizer = transformers.AutoTokenizer.from_pretrained(self.model_id, **options)
+                prompts = [f"a photo of a {label}" for label in self.candidate_labels]
+                with torch.inference_mode():
+                    tokens = tokenizer(prompts, padding=True, return_tensors="pt")
+                    text_features = model.get_text_features(**tokens)
+                    self._text_features = text_features / text_features.norm(dim=-1, keepdim=True)
+                self._labels = list(self.candidate_labels)
+            else:
+                model = transformers.AutoModelForImageClassification.from_pretrained(self.model_id, **options)
+                self._labels = [model.config.id2label[i] for i in range(len(model.config.id2label))]
+            
+            model.eval()
+            self._torch = torch
+            self._preprocessor = BatchPreprocessor(self.max_batch_size, mean=mean, std=std)
+            self._model = model
+            
+            self._worker = threading.Thread(target=self._run_batches, daemon=True)
+            self._worker.start()
+    
+    def classify_image(self, image):
+        """
+        Classify an image with the local model
+        
+        Args:
+            image (PIL.Image or EncodedImage): The preprocessed image to classify
+        
+        Returns:
+            list: Predictions as [{"label": str, "score": float}], or an error dict
+        """
+        try:
+            self._ensure_loaded()
+        except Exception as e:
+            return {"error": f"Local model could not be loaded: {str(e)}"}
+        
+        if not hasattr(image, "mode"):
+            # Encoded payloads are decoded back into pixels
+            image = Image.open(io.BytesIO(image.data))
+        
+        done = threading.Event()
+        slot = {}
+        self._requests.put((image, slot, done))
+        done.wait()
+        return slot["result"]
+    
+    def _next_batch(self):
+        """Block for one request, then gather more until the window closes"""
+        batch = [self._requests.get()]
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._requests.get(timeout=self.batch_window))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run_batches(self):
+        """Worker loop running one forward pass per micro-batch"""
+        while True:
+            batch = self._next_batch()
+            try:
+                results = self._predict([image for image, _, _ in batch])
+            except Exception as e:
+                results = [{"error": f"Local inference failed: {str(e)}"}] * len(batch)
+            for (_, slot, done), result in zip(batch, results):
+                slot["result"] = result
+                done.set()
+    
+    def _predict(self, images):
+        """Run the model on a batch and format results like the remote API"""
+        torch = self._torch
+        pixel_values = torch.from_numpy(self._preprocessor(images))
+        
+        with torch.inference_mode():
+            if self.is_zero_shot:
+                image_features = self._model.get_image_features(pixel_values=pixel_values)
+                image_features = image_features / image_features.norm(dim=-1, keepdim=True)
+                logits = self._model.logit_scale.exp() * image_features @ self._text_features.T
+            else:
+                logits = self._model(pixel_values=pixel_values).logits
+            probabilities = logits.softmax(dim=-1).numpy()
+        
+        top_k = min(self.top_k, probabilities.shape[1])
+        results = []
+        for row in probabilities:
+            indices = np.argsort(row)[::-1][:top_k]
+            results.append([{"label": self._labels[i], "score": float(row[i])} for i in indices])
+        return results
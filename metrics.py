@@ -0,0 +1,274 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Latency histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Progress messages are only printed when debugging is enabled
+_debug_enabled = os.getenv("FRUIT_DEBUG", "") not in ("", "0", "false")
+
+
+def set_debug(enabled):
+    """
+    Turn the debug print sink on or off
+    
+    Args:
+        enabled (bool): Print debug messages to stdout
+    """
+    global _debug_enabled
+    _debug_enabled = enabled
+
+
+def debug(message):
+    """
+    Print a debug message if debugging is enabled (FRUIT_DEBUG=1 or set_debug(True))
+    
+    Args:
+        message (str): Message to print
+    """
+    if _debug_enabled:
+        print(message)
+
+
+class Histogram:
+    """
+    Cumulative latency histogram with fixed buckets
+    """
+    
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        """Record one observation"""
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += value
+        self.count += 1
+    
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket containing it"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters and latency histograms
+    
+    Every metric is identified by a name and a set of labels such as
+    model="microsoft/resnet-50" or strategy="binary".
+    """
+    
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(name, labels):
+        return (name, tuple(sorted((key, str(value)) for key, value in labels.items())))
+    
+    def inc(self, name, value=1, **labels):
+        """
+        Increase a counter
+        
+        Args:
+            name (str): Counter name
+            value (float): Amount to add
+            **labels: Metric labels
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def observe(self, name, seconds, **labels):
+        """
+        Record a duration in a histogram
+        
+        Args:
+            name (str): Histogram name
+            seconds (float): Observed duration
+            **labels: Metric labels
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+    
+    @contextmanager
+    def span(self, stage, **labels):
+        """
+        Time a block of code as a pipeline stage
+        
+        Durations go to the "stage_seconds" histogram labelled with the stage
+        name; failed blocks are also counted in "stage_errors_total".
+        
+        Args:
+            stage (str): Stage name (decode, verify, resize, encode, upload, ...)
+            **labels: Extra labels such as model or strategy
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.inc("stage_errors_total", stage=stage, **labels)
+            raise
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+    
+    def reset(self):
+        """Drop every recorded value"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+    
+    def to_dict(self):
+        """
+        Export all metrics as plain data
+        
+        Returns:
+            dict: "counters" and "histograms" lists with labels and values
+        """
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.total,
+                    "p50": histogram.quantile(0.5),
+                    "p95": histogram.quantile(0.95),
+                    "p99": histogram.quantile(0.99),
+                    "buckets": dict(zip([str(b) for b in histogram.buckets] + ["+Inf"], histogram.counts))
+                }
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+        return {"counters": counters, "histograms": histograms}
+    
+    def to_json(self, path=None):
+        """
+        Export all metrics as JSON
+        
+        Args:
+            path (str): File to write to, None to only return the text
+        
+        Returns:
+            str: JSON document
+        """
+        text = json.dumps(self.to_dict(), indent=2)
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return text
+    
+    def to_prometheus(self):
+        """
+        Export all metrics in the Prometheus text exposition format
+        
+        Returns:
+            str: Exposition text
+        """
+        def format_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+        
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE fruit_{name} counter")
+                for (counter_name, labels), value in sorted(self._counters.items()):
+                    if counter_name == name:
+                        lines.append(f"fruit_{name}{format_labels(labels)} {value}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE fruit_{name} histogram")
+                for (histogram_name, labels), histogram in sorted(self._histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(list(histogram.buckets) + ["+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f"fruit_{name}_bucket{format_labels(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"fruit_{name}_sum{format_labels(labels)} {histogram.total}")
+                    lines.append(f"fruit_{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+# Registry shared by the whole process, with module-level shortcuts
+registry = Metrics()
+inc = registry.inc
+observe = registry.observe
+span = registry.span
+
+
+@lru_cache(maxsize=None)
+def _metrics_handler():
+    """Request handler class, built on first use so http.server loads lazily"""
+    import http.server
+    
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        """Serves /metrics (Prometheus) and /metrics.json"""
+        
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = registry.to_prometheus(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = registry.to_json(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        
+        def log_message(self, format, *args):
+            pass
+    
+    return MetricsHandler
+
+
+def serve_metrics(port=9108, host="127.0.0.1"):
+    """
+    Expose the registry over HTTP on a background thread
+    
+    Args:
+        port (int): Port to listen on
+        host (str): Interface to bind, localhost by default
+    
+    Returns:
+        ThreadingHTTPServer: The running server; call shutdown() to stop it
+    """
+    # Only needed once the metrics endpoint is started
+    import http.server
+    
+    server = http.server.ThreadingHTTPServer((host, port), _metrics_handler())
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
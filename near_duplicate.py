@@ -0,0 +1,329 @@
+import copy
+import io
+import threading
+from functools import lru_cache
+
+from PIL import Image
+
+import metrics
+from lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+# Multi-index hashing splits 64-bit hashes into four 16-bit chunks
+CHUNKS = 4
+CHUNK_BITS = 16
+
+
+def _grayscale(image, size):
+    """Downscale an image to a size x size float grayscale array by area averaging"""
+    if isinstance(image, np.ndarray):
+        pixels = image.astype(np.float32)
+    else:
+        if not hasattr(image, "mode"):
+            # EncodedImage: hash the decoded payload
+            image = Image.open(io.BytesIO(image.data))
+        pixels = np.asarray(image.convert("RGB"), dtype=np.float32)
+    if pixels.ndim == 3:
+        pixels = pixels[..., :3] @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    
+    # Mean over a grid of near-equal blocks (exact blocks when the side divides evenly)
+    rows = np.linspace(0, pixels.shape[0], size + 1).astype(int)[:-1]
+    cols = np.linspace(0, pixels.shape[1], size + 1).astype(int)[:-1]
+    sums = np.add.reduceat(np.add.reduceat(pixels, rows, axis=0), cols, axis=1)
+    counts = np.outer(np.diff(np.append(rows, pixels.shape[0])), np.diff(np.append(cols, pixels.shape[1])))
+    return sums / counts
+
+
+@lru_cache(maxsize=None)
+def _popcount():
+    """Bits set in every byte value, for vectorized popcounts"""
+    return np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _pack(bits):
+    """Pack 64 booleans into an unsigned 64-bit integer"""
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def dhash(image, hash_size=8):
+    """
+    Difference hash: signs of horizontal brightness gradients
+    
+    Args:
+        image: Preprocessed PIL.Image, EncodedImage or HxW(x3) array
+        hash_size (int): Hash side length; 8 gives a 64-bit hash
+    
+    Returns:
+        int: 64-bit hash
+    """
+    gray = _grayscale(image, hash_size + 1)[:hash_size]
+    return _pack(gray[:, 1:] > gray[:, :-1])
+
+
+@lru_cache(maxsize=None)
+def _dct_matrix(size):
+    """Orthonormal DCT-II basis as a size x size matrix"""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    basis = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2.0 / size)
+    basis[0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+
+
+def phash(image, hash_size=8):
+    """
+    Perceptual hash: signs of the lowest DCT frequencies around their median
+    
+    The image is reduced to 32x32 (exact 7x7 blocks for a 224x224 input), so
+    recompression and small crops or color shifts barely change the hash.
+    
+    Args:
+        image: Preprocessed PIL.Image, EncodedImage or HxW(x3) array
+        hash_size (int): Frequencies kept per axis; 8 gives a 64-bit hash
+    
+    Returns:
+        int: 64-bit hash
+    """
+    gray = _grayscale(image, 32)
+    dct = _dct_matrix(32)
+    frequencies = (dct @ gray @ dct.T)[:hash_size, :hash_size]
+    # The DC term only encodes overall brightness
+    return _pack(frequencies > np.median(frequencies.ravel()[1:]))
+
+
+HASHES = {"phash": phash, "dhash": dhash}
+
+
+def hamming(a, b):
+    """Number of differing bits between two 64-bit hashes"""
+    return bin(a ^ b).count("1")
+
+
+class HammingIndex:
+    """
+    Multi-index hash table for Hamming-distance search over 64-bit hashes
+    
+    Every hash is split into four 16-bit chunks. Two hashes within distance r
+    share at least one chunk within distance r // 4 (pigeonhole), so a search
+    only verifies the hashes found in the neighbouring buckets of each chunk.
+    Buckets are kept as sorted NumPy arrays; new hashes go to a small tail
+    that is scanned directly and merged into the buckets once it grows.
+    """
+    
+    def __init__(self, merge_every=4096):
+        """
+        Initialize the index
+        
+        Args:
+            merge_every (int): Tail size at which new hashes are merged into the buckets
+        """
+        self.merge_every = merge_every
+        self._hashes = np.empty(1024, dtype=np.uint64)
+        self._size = 0
+        self._indexed = 0
+        # Per chunk: hash positions sorted by chunk value, and bucket offsets
+        self._order = [np.empty(0, dtype=np.int64) for _ in range(CHUNKS)]
+        self._offsets = [np.zeros(2 ** CHUNK_BITS + 1, dtype=np.int64) for _ in range(CHUNKS)]
+        self._neighbours = {}
+    
+    def __len__(self):
+        return self._size
+    
+    def add(self, value):
+        """
+        Store a hash
+        
+        Args:
+            value (int): 64-bit hash
+        
+        Returns:
+            int: Position of the hash, used as its ID
+        """
+        if self._size == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.empty_like(self._hashes)])
+        self._hashes[self._size] = value
+        self._size += 1
+        if self._size - self._indexed >= self.merge_every:
+            self._merge()
+        return self._size - 1
+    
+    def add_many(self, values):
+        """Store many hashes at once and index them; returns the first new ID"""
+        values = np.asarray(values, dtype=np.uint64)
+        first = self._size
+        needed = self._size + len(values)
+        if needed > len(self._hashes):
+            grown = np.empty(max(needed, 2 * len(self._hashes)), dtype=np.uint64)
+            grown[:self._size] = self._hashes[:self._size]
+            self._hashes = grown
+        self._hashes[self._size:needed] = values
+        self._size = needed
+        self._merge()
+        return first
+    
+    def _merge(self):
+        """Rebuild the chunk buckets to cover every stored hash"""
+        hashes = self._hashes[:self._size]
+        for chunk in range(CHUNKS):
+            values = self._chunk(hashes, chunk)
+            order = np.argsort(values, kind="stable")
+            self._order[chunk] = order
+            self._offsets[chunk] = np.searchsorted(values[order], np.arange(2 ** CHUNK_BITS + 1))
+        self._indexed = self._size
+    
+    @staticmethod
+    def _chunk(values, chunk):
+        shift = np.uint64(CHUNK_BITS * chunk)
+        return ((values >> shift) & np.uint64(2 ** CHUNK_BITS - 1)).astype(np.int64)
+    
+    def _flips(self, radius):
+        """XOR masks of every 16-bit value within `radius` bits of zero"""
+        masks = self._neighbours.get(radius)
+        if masks is None:
+            values = np.arange(2 ** CHUNK_BITS)
+            popcount = _popcount()
+            weights = popcount[values & 0xFF] + popcount[values >> 8]
+            masks = values[weights <= radius]
+            self._neighbours[radius] = masks
+        return masks
+    
+    @staticmethod
+    def _distances(hashes, value):
+        """Hamming distances from `value` to each of `hashes`"""
+        diff = (hashes ^ np.uint64(value)).view(np.uint8).reshape(-1, 8)
+        return _popcount()[diff].sum(axis=1)
+    
+    def search(self, value, max_distance):
+        """
+        Find the stored hash closest to `value` within `max_distance` bits
+        
+        Args:
+            value (int): 64-bit query hash
+            max_distance (int): Largest accepted Hamming distance
+        
+        Returns:
+            tuple: (ID, distance) of the nearest match, or None
+        """
+        value = int(value)
+        radius = max_distance // CHUNKS
+        candidates = []
+        for chunk in range(CHUNKS):
+            key = (value >> (CHUNK_BITS * chunk)) & (2 ** CHUNK_BITS - 1)
+            buckets = self._flips(radius) ^ key
+            offsets = self._offsets[chunk]
+            starts, ends = offsets[buckets], offsets[buckets + 1]
+            filled = starts < ends
+            order = self._order[chunk]
+            candidates.extend(order[start:end] for start, end in zip(starts[filled], ends[filled]))
+        # Hashes added since the last merge are checked directly
+        if self._indexed < self._size:
+            candidates.append(np.arange(self._indexed, self._size))
+        if not candidates:
+            return None
+        
+        ids = np.unique(np.concatenate(candidates))
+        distances = self._distances(self._hashes[ids], value)
+        best = int(np.argmin(distances))
+        if distances[best] > max_distance:
+            return None
+        return int(ids[best]), int(distances[best])
+
+
+class NearDuplicateCache:
+    """
+    Reuses predictions of perceptually near-identical images
+    
+    Keeps one HammingIndex per model with the prediction made for each
+    stored image, so recompressed, slightly cropped or re-uploaded photos of
+    the same scene skip inference.
+    """
+    
+    def __init__(self, max_distance=6, method="phash", max_entries=100000):
+        """
+        Initialize the cache
+        
+        Args:
+            max_distance (int): Largest Hamming distance (of 64 bits) treated as the same image
+            method (str): "phash" or "dhash"
+            max_entries (int): Predictions kept per model; the index is reset when full
+        """
+        if method not in HASHES:
+            raise ValueError(f"Unknown hash method: {method}")
+        self.max_distance = max_distance
+        self.method = method
+        self.max_entries = max_entries
+        self._models = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def fingerprint(self, image):
+        """
+        Compute the perceptual hash of a preprocessed image
+        
+        Args:
+            image (PIL.Image or EncodedImage): The preprocessed image
+        
+        Returns:
+            int: 64-bit hash
+        """
+        with metrics.span("fingerprint", method=self.method):
+            return HASHES[self.method](image)
+    
+    def get(self, model_id, fingerprint):
+        """
+        Look up the prediction of a near-identical image
+        
+        Args:
+            model_id (str): The Hugging Face model ID
+            fingerprint (int): Hash from fingerprint()
+        
+        Returns:
+            list: Copy of the stored prediction, or None
+        """
+        with self._lock:
+            entry = self._models.get(model_id)
+            match = entry[0].search(fingerprint, self.max_distance) if entry else None
+            if match is None:
+                self.misses += 1
+                metrics.inc("near_duplicate_lookups_total", model=model_id, result="miss")
+                return None
+            self.hits += 1
+            metrics.inc("near_duplicate_lookups_total", model=model_id, result="hit")
+            return copy.deepcopy(entry[1][match[0]])
+    
+    def put(self, model_id, fingerprint, result):
+        """
+        Remember a successful prediction
+        
+        Args:
+            model_id (str): The Hugging Face model ID
+            fingerprint (int): Hash from fingerprint()
+            result (list): Prediction to reuse for near-identical images
+        """
+        if not isinstance(result, list):
+            return
+        with self._lock:
+            entry = self._models.get(model_id)
+            if entry is None or len(entry[0]) >= self.max_entries:
+                entry = self._models[model_id] = (HammingIndex(), [])
+            entry[0].add(fingerprint)
+            entry[1].append(copy.deepcopy(result))
+    
+    def stats(self):
+        """
+        Get lookup statistics
+        
+        Returns:
+            dict: Stored hashes per model, hits, misses and hit ratio
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": {model_id: len(entry[0]) for model_id, entry in self._models.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
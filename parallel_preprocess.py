@@ -0,0 +1,196 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from PIL import Image
+
+from image_processor import ImageProcessor, InvalidImageError, MAX_IMAGE_BYTES
+from lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+# Smallest input segment; segments grow in powers of two when a file is larger
+MIN_INPUT_SEGMENT = 1024 * 1024
+
+# Shared memory segments attached in a worker process, by slot index
+_attached = {}
+
+
+def _attach(slot, kind, name):
+    """Attach a slot's segment in a worker, reusing the mapping across tasks"""
+    key = (slot, kind)
+    segment = _attached.get(key)
+    if segment is None or segment.name != name:
+        if segment is not None:
+            # The parent replaced the segment with a larger one
+            segment.close()
+        segment = shared_memory.SharedMemory(name=name)
+        _attached[key] = segment
+    return segment
+
+
+def _preprocess_slot(slot, input_name, input_size, output_name, target_size, mode):
+    """
+    Decode and preprocess the image in a slot's input segment (runs in a worker)
+    
+    Returns:
+        str: Error message, or None once the pixels are in the output segment
+    """
+    try:
+        data = _attach(slot, "input", input_name).buf[:input_size]
+        try:
+            image = ImageProcessor.load_image(data, target_size=target_size, mode=mode)
+        finally:
+            data.release()
+        image = ImageProcessor.preprocess(image, target_size, mode)
+        width, height = target_size
+        output = np.ndarray((height, width, 3), dtype=np.uint8, buffer=_attach(slot, "output", output_name).buf)
+        output[...] = image
+        return None
+    except InvalidImageError as e:
+        return f"Invalid image: {str(e)}"
+    except Exception as e:
+        return f"Preprocessing failed: {str(e)}"
+
+
+class _Slot:
+    """Input and output shared memory for one image in flight"""
+    
+    def __init__(self, index, output_bytes):
+        self.index = index
+        self.input = None
+        self.output = shared_memory.SharedMemory(create=True, size=output_bytes)
+    
+    def load(self, data):
+        """Copy encoded image bytes into the input segment, growing it if needed"""
+        if self.input is None or self.input.size < len(data):
+            self._release_input()
+            size = MIN_INPUT_SEGMENT
+            while size < len(data):
+                size *= 2
+            self.input = shared_memory.SharedMemory(create=True, size=size)
+        self.input.buf[:len(data)] = data
+    
+    def _release_input(self):
+        if self.input is not None:
+            self.input.close()
+            self.input.unlink()
+            self.input = None
+    
+    def close(self):
+        self._release_input()
+        self.output.close()
+        self.output.unlink()
+
+
+class ParallelPreprocessor:
+    """
+    Spreads decoding and preprocessing of many images over worker processes
+    
+    Encoded image bytes go to the workers and RGB pixels come back through
+    shared memory slots, so only small task descriptions are pickled. Results
+    are yielded in input order, and the source is read only as slots become
+    free, so at most `max_pending` images are held in memory at once.
+    """
+    
+    def __init__(self, workers=None, target_size=(224, 224), mode=ImageProcessor.QUALITY,
+                 max_pending=None, max_input_bytes=MAX_IMAGE_BYTES):
+        """
+        Initialize the pool
+        
+        Args:
+            workers (int): Worker processes, defaults to the number of CPUs
+            target_size (tuple): Target size as (width, height)
+            mode (str): ImageProcessor.QUALITY or ImageProcessor.FAST
+            max_pending (int): Images in flight at once, defaults to twice the workers
+            max_input_bytes (int): Largest accepted encoded image
+        """
+        if mode not in (ImageProcessor.QUALITY, ImageProcessor.FAST):
+            raise ValueError(f"Unknown preprocessing mode: {mode}")
+        
+        self.workers = workers or os.cpu_count() or 1
+        self.target_size = tuple(target_size)
+        self.mode = mode
+        self.max_pending = max_pending or 2 * self.workers
+        self.max_input_bytes = max_input_bytes
+        
+        width, height = self.target_size
+        self._slots = [_Slot(index, width * height * 3) for index in range(self.max_pending)]
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+    
+    def map(self, entries, as_array=False):
+        """
+        Preprocess images in parallel, keeping their order
+        
+        Args:
+            entries (iterable): (name, read) pairs, where read() returns the
+                encoded image bytes (as produced by cli.iter_sources)
+            as_array (bool): Yield uint8 (height, width, 3) arrays instead of PIL images
+        
+        Yields:
+            tuple: (name, preprocessed image or None, error message or None)
+        """
+        free = deque(self._slots)
+        pending = deque()
+        entries = iter(entries)
+        exhausted = False
+        
+        while True:
+            # Fill free slots; the source is not read further while all are busy
+            while free and not exhausted:
+                entry = next(entries, None)
+                if entry is None:
+                    exhausted = True
+                    break
+                name, read = entry
+                try:
+                    data = read()
+                    if len(data) > self.max_input_bytes:
+                        raise InvalidImageError(f"Image file is too large ({len(data)} bytes)")
+                except InvalidImageError as e:
+                    pending.append((name, None, None, f"Invalid image: {str(e)}"))
+                    continue
+                except Exception as e:
+                    pending.append((name, None, None, f"Preprocessing failed: {str(e)}"))
+                    continue
+                slot = free.popleft()
+                slot.load(data)
+                future = self._executor.submit(
+                    _preprocess_slot, slot.index, slot.input.name, len(data), slot.output.name,
+                    self.target_size, self.mode
+                )
+                pending.append((name, slot, future, None))
+            
+            if not pending:
+                return
+            
+            name, slot, future, error = pending.popleft()
+            if slot is None:
+                # Read errors are reported in order; no work was submitted
+                yield name, None, error
+                continue
+            
+            error = future.result()
+            if error is None:
+                width, height = self.target_size
+                # Copy out so the slot can be reused right away
+                pixels = np.ndarray((height, width, 3), dtype=np.uint8, buffer=slot.output.buf).copy()
+                free.append(slot)
+                yield name, pixels if as_array else Image.fromarray(pixels), None
+            else:
+                free.append(slot)
+                yield name, None, error
+    
+    def close(self):
+        """Stop the workers and release the shared memory"""
+        self._executor.shutdown(wait=True)
+        for slot in self._slots:
+            slot.close()
+        self._slots = []
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,183 @@
+import copy
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def image_digest(image):
+    """
+    Compute a content hash of a preprocessed image
+    
+    Args:
+        image (PIL.Image or EncodedImage): The preprocessed image
+        
+    Returns:
+        str: SHA-256 hex digest of the pixel bytes (or encoded bytes)
+    """
+    digest = hashlib.sha256()
+    if hasattr(image, "tobytes"):
+        # Include mode and size so identical bytes with a different shape differ
+        digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode("utf-8"))
+        digest.update(image.tobytes())
+    else:
+        digest.update(f"{image.format}:".encode("utf-8"))
+        digest.update(image.data)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    Two-tier cache of successful classification results
+    
+    An in-memory LRU tier with size and TTL eviction sits in front of an
+    optional SQLite tier that survives restarts.
+    """
+    
+    def __init__(self, max_entries=1024, ttl=24 * 3600, disk_path=None):
+        """
+        Initialize the cache
+        
+        Args:
+            max_entries (int): Maximum number of results kept in memory
+            ttl (float): Seconds before a cached result expires
+            disk_path (str): SQLite file for the persistent tier, None to disable it
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+        
+        self._db = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions "
+                "(key TEXT PRIMARY KEY, result TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+    
+    @staticmethod
+    def make_key(model_id, digest, params=None):
+        """
+        Build a cache key
+        
+        Args:
+            model_id (str): The Hugging Face model ID
+            digest (str): Content hash of the preprocessed image
+            params (dict): Preprocessing and encoding parameters
+            
+        Returns:
+            str: Cache key
+        """
+        params_text = json.dumps(params or {}, sort_keys=True)
+        return f"{model_id}|{digest}|{params_text}"
+    
+    def get(self, key):
+        """
+        Look up a cached result
+        
+        Args:
+            key (str): Key built with make_key
+            
+        Returns:
+            list: Cached classification results, or None on a miss
+        """
+        start = time.perf_counter()
+        now = time.time()
+        try:
+            with self._lock:
+                entry = self._memory.get(key)
+                if entry is not None:
+                    created, result = entry
+                    if now - created <= self.ttl:
+                        self._memory.move_to_end(key)
+                        self.hits += 1
+                        return copy.deepcopy(result)
+                    del self._memory[key]
+                
+                if self._db is not None:
+                    row = self._db.execute(
+                        "SELECT result, created FROM predictions WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        if now - row[1] <= self.ttl:
+                            result = json.loads(row[0])
+                            self._store_memory(key, result, row[1])
+                            self.hits += 1
+                            self.disk_hits += 1
+                            return copy.deepcopy(result)
+                        self._db.execute("DELETE FROM predictions WHERE key = ?", (key,))
+                        self._db.commit()
+                
+                self.misses += 1
+                return None
+        finally:
+            with self._lock:
+                self.lookup_seconds += time.perf_counter() - start
+    
+    def put(self, key, result):
+        """
+        Store a successful result; error results are ignored
+        
+        Args:
+            key (str): Key built with make_key
+            result (list): Classification results from APIHandler
+        """
+        if not result or (isinstance(result, dict) and "error" in result):
+            return
+        
+        created = time.time()
+        result = copy.deepcopy(result)
+        with self._lock:
+            self._store_memory(key, result, created)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO predictions (key, result, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(result), created)
+                )
+                self._db.commit()
+    
+    def _store_memory(self, key, result, created):
+        """Insert into the LRU tier, evicting the oldest entries (lock held)"""
+        self._memory[key] = (created, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    def clear(self):
+        """Remove every cached result from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions")
+                self._db.commit()
+    
+    def stats(self):
+        """
+        Get cache statistics
+        
+        Returns:
+            dict: Hit ratio, tier sizes and mean lookup latency
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            disk_entries = 0
+            if self._db is not None:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "mean_lookup_ms": 1000 * self.lookup_seconds / lookups if lookups else 0.0
+            }
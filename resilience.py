@@ -0,0 +1,234 @@
+import random
+import threading
+import time
+
+# HTTP status codes worth retrying: rate limits, overload and cold starts
+TRANSIENT_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def is_transient_status(status_code):
+    """
+    Check whether an HTTP status describes a temporary failure
+
+    Args:
+        status_code (int): HTTP status code of the response
+
+    Returns:
+        bool: True if the same request may succeed later
+    """
+    return status_code in TRANSIENT_STATUS_CODES
+
+
+def parse_retry_after(headers, body):
+    """
+    Extract how long the server asked us to wait
+
+    Args:
+        headers (dict): Response headers
+        body: Decoded JSON body, if any
+
+    Returns:
+        float: Seconds to wait, or None if the server gave no hint
+    """
+    value = headers.get("Retry-After") if headers else None
+    if value is not None:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+    # Cold models answer 503 with {"error": "... is currently loading", "estimated_time": 20.0}
+    if isinstance(body, dict) and isinstance(body.get("estimated_time"), (int, float)):
+        return max(0.0, float(body["estimated_time"]))
+    return None
+
+
+class RetryPolicy:
+    """
+    Jittered exponential backoff for transient failures
+    """
+
+    def __init__(self, max_retries=3, base_delay=0.5, max_delay=30.0, jitter=0.5, sleep=time.sleep):
+        """
+        Initialize the policy
+
+        Args:
+            max_retries (int): Retries after the first attempt
+            base_delay (float): Delay before the first retry, doubled on each retry
+            max_delay (float): Upper bound for any single delay, including server hints
+            jitter (float): Fraction of each delay that is randomized (0-1)
+            sleep (callable): Function used to wait, replaceable for testing
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.sleep = sleep
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Compute the wait before the next retry
+
+        Args:
+            attempt (int): Number of the attempt that just failed, starting at 0
+            retry_after (float): Server-provided wait (Retry-After or estimated_time)
+
+        Returns:
+            float: Seconds to wait
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
+
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker
+
+    After `failure_threshold` consecutive transient failures the circuit opens
+    and calls fail fast until `reset_timeout` (or the server's wait hint) has
+    passed. Then a single trial call is let through; its outcome closes or
+    reopens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        """
+        Initialize the breaker
+
+        Args:
+            failure_threshold (int): Consecutive failures that open the circuit
+            reset_timeout (float): Seconds the circuit stays open by default
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_until = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Check whether a call may go through
+
+        Returns:
+            bool: False while the circuit is open
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() >= self.opened_until:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def retry_in(self):
+        """Seconds until the circuit lets a trial call through"""
+        with self._lock:
+            return max(0.0, self.opened_until - time.monotonic())
+
+    def record_success(self):
+        """Close the circuit after a successful call"""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self, open_for=None):
+        """
+        Count a transient failure, opening the circuit when needed
+
+        Args:
+            open_for (float): Seconds to stay open, overriding reset_timeout
+        """
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_until = time.monotonic() + (open_for if open_for is not None else self.reset_timeout)
+            self._trial_running = False
+
+    def release(self):
+        """End a trial call whose outcome says nothing about model health"""
+        with self._lock:
+            self._trial_running = False
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter
+
+    Tokens refill continuously at `rate` per second up to `burst`; each call
+    takes one token, so short bursts pass immediately while the long-run
+    rate stays at `rate`.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        """
+        Initialize the bucket, full
+
+        Args:
+            rate (float): Tokens added per second
+            burst (float): Bucket capacity, defaults to one second of tokens (at least 1)
+            clock (callable): Monotonic time source, replaceable for testing
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = float(burst) if burst is not None else max(1.0, self.rate)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, tokens=1.0):
+        """
+        Take tokens if they are available
+
+        Args:
+            tokens (float): Tokens needed
+
+        Returns:
+            float: 0.0 if the tokens were taken, otherwise the seconds until they will be available
+        """
+        with self._lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+
+# Breakers shared by every handler in the process, one per model
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(model_id, **kwargs):
+    """
+    Get the process-wide circuit breaker of a model
+
+    Args:
+        model_id (str): The Hugging Face model ID
+        **kwargs: CircuitBreaker arguments, used only on creation
+
+    Returns:
+        CircuitBreaker: Breaker shared by all callers of the model
+    """
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(model_id)
+        if breaker is None:
+            breaker = CircuitBreaker(**kwargs)
+            _BREAKERS[model_id] = breaker
+        return breaker
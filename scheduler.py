@@ -0,0 +1,330 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import metrics
+from metrics import debug
+from resilience import TokenBucket
+
+# Request priorities, most urgent first
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+# "status" of results for requests the scheduler did not run
+SHED = "shed"
+EXPIRED = "expired"
+CLOSED = "closed"
+
+
+class _Request:
+    """One queued classification"""
+    
+    __slots__ = ("handler", "image", "priority", "max_wait", "future", "enqueued", "expires")
+    
+    def __init__(self, handler, image, priority, max_wait):
+        self.handler = handler
+        self.image = image
+        self.priority = priority
+        self.max_wait = max_wait
+        self.future = Future()
+        self.enqueued = time.monotonic()
+        self.expires = None
+
+
+class RequestScheduler:
+    """
+    Priority micro-batching scheduler in front of APIHandler.classify_image
+    
+    Requests wait in one FIFO queue per priority. A dispatcher thread starts
+    them in micro-batches: once the oldest request has waited `batch_window`
+    (or a full batch is queued) it takes up to `max_batch_size` requests,
+    interactive ones first, and runs them on a pool of `max_in_flight`
+    threads. Bulk requests may not use the last `interactive_reserve` slots,
+    so a click never waits behind a long bulk job. Models can have a
+    token-bucket rate limit; requests over the limit stay queued until
+    tokens refill.
+    
+    When the queue is full, bulk requests are rejected (or their caller
+    waits for space, see submit) and interactive requests displace the
+    newest queued bulk request. Requests that are not run resolve to an
+    error dict whose "status" is SHED, EXPIRED or CLOSED.
+    """
+    
+    def __init__(self, max_batch_size=8, batch_window=0.005, max_in_flight=16, interactive_reserve=2,
+                 max_queue_depth=256, rate_limits=None, default_rate=None, max_wait=None):
+        """
+        Initialize the scheduler and start its dispatcher
+        
+        Args:
+            max_batch_size (int): Requests started together at most
+            batch_window (float): Seconds the oldest request waits for a batch to fill
+            max_in_flight (int): Requests running upstream at once
+            interactive_reserve (int): In-flight slots bulk requests may not use
+            max_queue_depth (int): Queued requests at most, over all priorities
+            rate_limits (dict): Model ID -> requests per second, (rate, burst) or TokenBucket
+            default_rate (float): Requests per second for other models, None for no limit
+            max_wait (float): Seconds a request may stay queued before it expires, None for no limit
+        """
+        if interactive_reserve >= max_in_flight:
+            raise ValueError("interactive_reserve must leave bulk requests at least one slot")
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.max_in_flight = max_in_flight
+        self.interactive_reserve = interactive_reserve
+        self.max_queue_depth = max_queue_depth
+        self.default_rate = default_rate
+        self.max_wait = max_wait
+        self._buckets = {model_id: self._bucket(limit) for model_id, limit in (rate_limits or {}).items()}
+        
+        self._queues = {INTERACTIVE: deque(), BULK: deque()}
+        self._in_flight = {INTERACTIVE: 0, BULK: 0}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="scheduler")
+        
+        # Totals for stats()
+        self.batches = 0
+        self.dispatched = 0
+        self.rejected = {SHED: 0, EXPIRED: 0, CLOSED: 0}
+        self._queue_wait = {INTERACTIVE: 0.0, BULK: 0.0}
+        self._started = {INTERACTIVE: 0, BULK: 0}
+        
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="scheduler-dispatch", daemon=True)
+        self._dispatcher.start()
+    
+    @staticmethod
+    def _bucket(limit):
+        if isinstance(limit, TokenBucket):
+            return limit
+        if isinstance(limit, tuple):
+            return TokenBucket(*limit)
+        return TokenBucket(limit)
+    
+    def _bucket_for(self, model_id):
+        bucket = self._buckets.get(model_id)
+        if bucket is None and self.default_rate is not None:
+            bucket = self._buckets[model_id] = TokenBucket(self.default_rate)
+        return bucket
+    
+    def submit(self, handler, image, priority=INTERACTIVE, defer=0.0, max_wait=None):
+        """
+        Queue an image for classification
+        
+        Args:
+            handler (APIHandler): Handler of the model to use
+            image (PIL.Image or EncodedImage): The preprocessed image
+            priority (int): INTERACTIVE or BULK
+            defer (float): Seconds to wait for queue space when the queue is full,
+                instead of rejecting the request right away
+            max_wait (float): Seconds the request may stay queued, overriding the scheduler default
+        
+        Returns:
+            Future: Resolves to the classification result or an error dict
+        """
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority: {priority}")
+        request = _Request(handler, image, priority, max_wait if max_wait is not None else self.max_wait)
+        displaced = None
+        with self._cond:
+            if not self._closed and self._depth() >= self.max_queue_depth:
+                if priority == INTERACTIVE and self._queues[BULK]:
+                    displaced = self._queues[BULK].pop()
+                elif defer > 0:
+                    deadline = time.monotonic() + defer
+                    while not self._closed and self._depth() >= self.max_queue_depth:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+            if self._closed:
+                status = CLOSED
+            elif self._depth() >= self.max_queue_depth:
+                status = SHED
+            else:
+                status = None
+                request.enqueued = time.monotonic()
+                if request.max_wait is not None:
+                    request.expires = request.enqueued + request.max_wait
+                self._queues[priority].append(request)
+                self._cond.notify_all()
+        
+        if displaced is not None:
+            self._reject(displaced, SHED)
+        if status is not None:
+            self._reject(request, status)
+        return request.future
+    
+    def classify(self, handler, image, priority=INTERACTIVE, defer=0.0, max_wait=None):
+        """
+        Classify an image through the scheduler and wait for the result
+        
+        Args:
+            handler (APIHandler): Handler of the model to use
+            image (PIL.Image or EncodedImage): The preprocessed image
+            priority (int): INTERACTIVE or BULK
+            defer (float): Seconds to wait for queue space when the queue is full
+            max_wait (float): Seconds the request may stay queued
+        
+        Returns:
+            list or dict: Classification results or error message
+        """
+        return self.submit(handler, image, priority, defer, max_wait).result()
+    
+    def _depth(self):
+        return len(self._queues[INTERACTIVE]) + len(self._queues[BULK])
+    
+    def _reject(self, request, status):
+        """Resolve a request that will not run with an error dict carrying its status"""
+        name = PRIORITY_NAMES[request.priority]
+        with self._cond:
+            self.rejected[status] += 1
+        metrics.inc("scheduler_rejected_total", priority=name, status=status)
+        if status == SHED:
+            message = f"Server is busy: the request queue is full ({self.max_queue_depth} waiting), try again shortly"
+        elif status == EXPIRED:
+            message = f"Request waited {time.monotonic() - request.enqueued:.1f} s in the queue and was dropped"
+        else:
+            message = "Scheduler is closed"
+        debug(f"Scheduler {status} {name} request for {request.handler.model_id}")
+        request.future.set_result({"error": message, "status": status, "transient": status != CLOSED})
+    
+    def _collect(self, now):
+        """
+        Take the next batch off the queues; called with the lock held
+        
+        Returns:
+            tuple: (requests to start, expired requests, seconds to sleep before
+                trying again or None to wait for a notification)
+        """
+        depth = self._depth()
+        if not depth:
+            return [], [], None
+        free = self.max_in_flight - self._in_flight[INTERACTIVE] - self._in_flight[BULK]
+        if free <= 0:
+            return [], [], None
+        size = min(self.max_batch_size, free)
+        oldest = min(queue[0].enqueued for queue in self._queues.values() if queue)
+        if depth < size and now - oldest < self.batch_window:
+            return [], [], oldest + self.batch_window - now
+        
+        batch, expired, blocked = [], [], {}
+        bulk_free = self.max_in_flight - self.interactive_reserve - self._in_flight[BULK] - self._in_flight[INTERACTIVE]
+        for priority in (INTERACTIVE, BULK):
+            queue = self._queues[priority]
+            kept = deque()
+            while queue:
+                request = queue.popleft()
+                if request.expires is not None and now >= request.expires:
+                    expired.append(request)
+                    continue
+                full = len(batch) >= size or (priority == BULK and len(batch) >= bulk_free)
+                model_id = request.handler.model_id
+                if full or model_id in blocked:
+                    kept.append(request)
+                    continue
+                bucket = self._bucket_for(model_id)
+                wait = bucket.try_take() if bucket is not None else 0.0
+                if wait > 0:
+                    # Over the model's rate: later requests for it stay queued too
+                    blocked[model_id] = wait
+                    kept.append(request)
+                    continue
+                batch.append(request)
+            self._queues[priority] = kept
+        if not batch and blocked:
+            return [], expired, min(blocked.values())
+        return batch, expired, None
+    
+    def _dispatch_loop(self):
+        while True:
+            leftover = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        leftover = list(self._queues[INTERACTIVE]) + list(self._queues[BULK])
+                        self._queues[INTERACTIVE].clear()
+                        self._queues[BULK].clear()
+                        break
+                    now = time.monotonic()
+                    batch, expired, sleep = self._collect(now)
+                    if batch or expired:
+                        for request in batch:
+                            self._in_flight[request.priority] += 1
+                            self._queue_wait[request.priority] += now - request.enqueued
+                            self._started[request.priority] += 1
+                        if batch:
+                            self.batches += 1
+                            self.dispatched += len(batch)
+                        # Deferred submitters may now have room
+                        self._cond.notify_all()
+                        break
+                    self._cond.wait(sleep)
+            
+            if leftover is not None:
+                for request in leftover:
+                    self._reject(request, CLOSED)
+                return
+            for request in expired:
+                self._reject(request, EXPIRED)
+            if batch:
+                metrics.inc("scheduler_batches_total")
+                metrics.inc("scheduler_batch_requests_total", len(batch))
+                metrics.inc("scheduler_batch_slots_total", self.max_batch_size)
+                for request in batch:
+                    metrics.observe("scheduler_queue_wait_seconds", now - request.enqueued,
+                                    priority=PRIORITY_NAMES[request.priority])
+                    self._executor.submit(self._run, request)
+    
+    def _run(self, request):
+        try:
+            result = request.handler.classify_image(request.image)
+        except Exception as e:
+            result = {"error": f"Classification failed: {str(e)}"}
+        finally:
+            with self._cond:
+                self._in_flight[request.priority] -= 1
+                self._cond.notify_all()
+        request.future.set_result(result)
+    
+    def stats(self):
+        """
+        Get queue statistics
+        
+        Returns:
+            dict: Queue depth and in-flight requests per priority, batches,
+                batch fill ratio, mean queue wait per priority and rejected requests per status
+        """
+        with self._cond:
+            return {
+                "queued": {PRIORITY_NAMES[p]: len(queue) for p, queue in self._queues.items()},
+                "in_flight": {PRIORITY_NAMES[p]: count for p, count in self._in_flight.items()},
+                "batches": self.batches,
+                "dispatched": self.dispatched,
+                "batch_fill_ratio": self.dispatched / (self.batches * self.max_batch_size) if self.batches else 0.0,
+                "mean_queue_wait_ms": {
+                    PRIORITY_NAMES[p]: 1000 * self._queue_wait[p] / self._started[p] if self._started[p] else 0.0
+                    for p in self._queue_wait
+                },
+                "rejected": dict(self.rejected)
+            }
+    
+    def close(self, wait=True):
+        """
+        Stop the dispatcher; queued requests resolve with status CLOSED
+        
+        Args:
+            wait (bool): Wait for running requests to finish
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=wait)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
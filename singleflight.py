@@ -0,0 +1,111 @@
+import copy
+import threading
+from concurrent.futures import Future
+
+from lazy_import import lazy_import
+
+# Only the asyncio entry points need the event loop machinery
+asyncio = lazy_import("asyncio")
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution
+    
+    The first caller for a key runs the work; callers arriving while it is
+    in flight wait for it and receive a copy of its result. Threaded and
+    asyncio callers share the same in-flight calls.
+    """
+    
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.executed = 0
+        self.deduplicated = 0
+    
+    def _join(self, key):
+        """Register a caller; returns (future, is_leader)"""
+        with self._lock:
+            self.calls += 1
+            future = self._calls.get(key)
+            if future is not None:
+                self.deduplicated += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self.executed += 1
+            return future, True
+    
+    def _finish(self, key, future, result=None, error=None):
+        """Publish the leader's outcome and release the key"""
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    
+    def do(self, key, fn):
+        """
+        Run fn once for all concurrent callers with the same key
+        
+        Args:
+            key: Hashable identity of the work
+            fn (callable): Work to run when no identical call is in flight
+            
+        Returns:
+            The result of fn, shared with concurrent callers
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return copy.deepcopy(future.result())
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+    
+    async def do_async(self, key, coroutine_fn):
+        """
+        Await coroutine_fn once for all concurrent callers with the same key
+        
+        Args:
+            key: Hashable identity of the work
+            coroutine_fn (callable): Returns the awaitable to run when no identical
+                call is in flight
+                
+        Returns:
+            The awaited result, shared with concurrent callers
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return copy.deepcopy(await asyncio.wrap_future(future))
+        try:
+            result = await coroutine_fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+    
+    def stats(self):
+        """
+        Get deduplication counters
+        
+        Returns:
+            dict: Calls received, upstream executions, deduplicated calls and in-flight keys
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executed": self.executed,
+                "deduplicated": self.deduplicated,
+                "in_flight": len(self._calls)
+            }
+
+
+# Coalescer shared by all APIHandler instances in the process
+default_coalescer = SingleFlight()
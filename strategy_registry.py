@@ -0,0 +1,157 @@
+import time
+import threading
+
+
+class StrategyRecord:
+    """
+    Success and failure history of one upload strategy for one model
+    """
+    
+    def __init__(self):
+        self.successes = 0
+        self.failures = 0
+        self.last_success = None
+        self.last_failure = None
+    
+    def is_known_good(self, now, ttl):
+        """The strategy succeeded within the TTL and has not failed since"""
+        if self.last_success is None or now - self.last_success > ttl:
+            return False
+        return self.last_failure is None or self.last_failure < self.last_success
+    
+    def is_known_bad(self, now, ttl):
+        """The strategy failed within the TTL and has not succeeded since"""
+        if self.last_failure is None or now - self.last_failure > ttl:
+            return False
+        return self.last_success is None or self.last_success < self.last_failure
+
+
+class StrategyRegistry:
+    """
+    Remembers which upload strategy each model accepts
+    
+    Strategies that recently worked for a model are tried first, strategies that
+    recently failed are tried last, and everything is re-probed once its record
+    is older than the TTL.
+    """
+    
+    def __init__(self, ttl=600.0):
+        """
+        Initialize the registry
+        
+        Args:
+            ttl (float): Seconds before a success or failure record expires
+        """
+        self.ttl = ttl
+        self._records = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.wasted_attempts = 0
+    
+    def _record(self, model_id, strategy):
+        return self._records.setdefault(model_id, {}).setdefault(strategy, StrategyRecord())
+    
+    def preferred(self, model_id):
+        """
+        Get the known-good strategy for a model
+        
+        Args:
+            model_id (str): The Hugging Face model ID
+            
+        Returns:
+            str: Name of the strategy with the most successes, or None
+        """
+        now = time.monotonic()
+        with self._lock:
+            records = self._records.get(model_id, {})
+            good = [(record.successes, name) for name, record in records.items()
+                    if record.is_known_good(now, self.ttl)]
+        if not good:
+            return None
+        return max(good)[1]
+    
+    def order(self, model_id, strategies):
+        """
+        Order strategy names so the most promising is tried first
+        
+        Args:
+            model_id (str): The Hugging Face model ID
+            strategies (list): Strategy names in their default order
+            
+        Returns:
+            list: Known-good strategy, then unprobed ones, then recently failed ones
+        """
+        now = time.monotonic()
+        preferred = self.preferred(model_id)
+        with self._lock:
+            records = self._records.get(model_id, {})
+            bad = {name for name, record in records.items() if record.is_known_bad(now, self.ttl)}
+        
+        first = [preferred] if preferred in strategies else []
+        middle = [name for name in strategies if name not in bad and name != preferred]
+        last = [name for name in strategies if name in bad and name != preferred]
+        return first + middle + last
+    
+    def record_success(self, model_id, strategy):
+        """Record that a strategy was accepted by the model"""
+        with self._lock:
+            record = self._record(model_id, strategy)
+            record.successes += 1
+            record.last_success = time.monotonic()
+    
+    def record_failure(self, model_id, strategy):
+        """Record that a strategy was rejected by the model"""
+        with self._lock:
+            record = self._record(model_id, strategy)
+            record.failures += 1
+            record.last_failure = time.monotonic()
+            self.wasted_attempts += 1
+    
+    def record_lookup(self, hit):
+        """
+        Count one classification against the registry
+        
+        Args:
+            hit (bool): The first strategy tried succeeded
+        """
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+    
+    def invalidate(self, model_id=None):
+        """Forget the records of one model, or of all models"""
+        with self._lock:
+            if model_id is None:
+                self._records.clear()
+            else:
+                self._records.pop(model_id, None)
+    
+    def stats(self):
+        """
+        Get registry counters
+        
+        Returns:
+            dict: Hits, misses, hit ratio, failed attempts and per-model records
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "wasted_attempts": self.wasted_attempts,
+                "models": {
+                    model_id: {
+                        name: {"successes": record.successes, "failures": record.failures}
+                        for name, record in records.items()
+                    }
+                    for model_id, records in self._records.items()
+                }
+            }
+
+
+# Registry shared by all APIHandler instances in the process
+default_registry = StrategyRegistry()